@@ -0,0 +1,86 @@
+#benchmarks/ann_index.py
+
+"""Recall vs. latency of the pgvector ANN index against exact search on a synthetic corpus.
+
+Needs the docker-compose Postgres (DB_URL). Writes to a separate "ann_benchmark"
+collection and deletes it afterwards.
+
+Run: python -m benchmarks.ann_index [rows] [queries]
+"""
+
+import statistics
+import sys
+import time
+import numpy as np
+from sqlalchemy import text
+from langchain_postgres import PGVector
+from benchmarks.fakes import FakeEmbeddings, synthetic_corpus
+from server.database import EMBEDDING_DIMENSIONS, ensure_vector_index, get_sync_engine
+from server.vector_quantization import compact_expression
+
+COLLECTION = "ann_benchmark"
+K = 3
+
+def search(conn, collection_id, query, settings):
+    for statement in settings:
+        conn.execute(text(statement))
+    start = time.perf_counter()
+    rows = conn.execute(
+        text(
+            "SELECT id FROM langchain_pg_embedding WHERE collection_id = CAST(:cid AS uuid) "
+            # The expression the partial index covers, so the planner can use it
+            f"ORDER BY {compact_expression('none', EMBEDDING_DIMENSIONS)} <=> CAST(:q AS vector) LIMIT :k"
+        ),
+        {"cid": collection_id, "q": "[" + ",".join(map(str, query)) + "]", "k": K}
+    ).scalars().all()
+    return rows, (time.perf_counter() - start) * 1000
+
+def run(conn, collection_id, queries, settings):
+    results, timings = [], []
+    for query in queries:
+        ids, ms = search(conn, collection_id, query, settings)
+        results.append(set(ids))
+        timings.append(ms)
+    return results, statistics.median(timings), float(np.percentile(timings, 95))
+
+def main(rows: int = 20000, query_count: int = 100):
+    engine = get_sync_engine()
+    store = PGVector(
+        embeddings=FakeEmbeddings(latency=0),
+        connection=engine,
+        collection_name=COLLECTION,
+        embedding_length=EMBEDDING_DIMENSIONS,
+        pre_delete_collection=True
+    )
+    corpus = synthetic_corpus(rows + query_count, EMBEDDING_DIMENSIONS)
+    vectors, queries = corpus[:rows], corpus[rows:]
+    for start in range(0, rows, 1000):
+        block = vectors[start:start + 1000]
+        store.add_embeddings(
+            texts=[f"doc {start + i}" for i in range(len(block))],
+            embeddings=block.tolist(),
+            ids=[f"ann-{start + i}" for i in range(len(block))]
+        )
+
+    try:
+        with engine.connect() as conn:
+            collection_id = str(conn.execute(
+                text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"), {"name": COLLECTION}
+            ).scalar_one())
+            exact, p50, p95 = run(conn, collection_id, queries, ["SET enable_indexscan = off"])
+            print(f"{'mode':<24}{'recall@3':>10}{'p50 ms':>10}{'p95 ms':>10}")
+            print(f"{'exact':<24}{1.0:>10.3f}{p50:>10.2f}{p95:>10.2f}")
+
+        for method, knob, values in (("hnsw", "hnsw.ef_search", (10, 40, 100)), ("ivfflat", "ivfflat.probes", (1, 10, 30))):
+            ensure_vector_index(method, rebuild=True, collection_name=COLLECTION)
+            with engine.connect() as conn:
+                for value in values:
+                    found, p50, p95 = run(conn, collection_id, queries, ["SET enable_indexscan = on", f"SET {knob} = {value}"])
+                    recall = statistics.mean(len(a & e) / K for a, e in zip(found, exact))
+                    print(f"{f'{method} {knob.split(chr(46))[1]}={value}':<24}{recall:>10.3f}{p50:>10.2f}{p95:>10.2f}")
+    finally:
+        ensure_vector_index("none", collection_name=COLLECTION)
+        store.delete_collection()
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,212 @@
+#benchmarks/calendar.py
+
+"""CalendarService against a local stub of the Google Calendar REST API.
+
+The stub serves events.insert, the batch endpoint and freeBusy with a fixed
+latency per HTTP request and rejects expired bearer tokens with 401. Stub
+credentials block for a while on refresh, like google-auth does. A probe task
+measures how long the event loop stalls while all of this runs.
+
+Run: python -m benchmarks.calendar [concurrent_requests]
+"""
+
+import os
+import sys
+
+# Add project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import re
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from aiohttp import web
+from server.http_client import close_http_client
+from server.services import CalendarConflictError, CalendarService
+
+LATENCY = 0.08
+REFRESH_SECONDS = 0.3
+DAY = datetime(2030, 1, 7, tzinfo=timezone.utc)
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class StubCredentials:
+    """google-auth style credentials whose refresh blocks the calling thread."""
+
+    def __init__(self, server, ttl: float):
+        self.server = server
+        self.ttl = ttl
+        self.refresh_token = "stub-refresh"
+        self.token = None
+        self.expiry = utcnow()
+
+    def refresh(self, request):
+        time.sleep(REFRESH_SECONDS)
+        self.token = self.server.issue_token(self.ttl)
+        self.expiry = utcnow() + timedelta(seconds=self.ttl)
+
+class StubCalendarApi:
+    def __init__(self, latency: float = LATENCY):
+        self.latency = latency
+        self.tokens = {}
+        self.events = []
+        self.requests = {"insert": 0, "batch": 0, "freeBusy": 0, "401": 0}
+        self.app = web.Application()
+        self.app.router.add_post("/calendar/v3/calendars/{calendar}/events", self.insert)
+        self.app.router.add_post("/batch/calendar/v3", self.batch)
+        self.app.router.add_post("/calendar/v3/freeBusy", self.free_busy)
+
+    def issue_token(self, ttl: float) -> str:
+        token = uuid.uuid4().hex
+        self.tokens[token] = time.monotonic() + ttl
+        return token
+
+    def authorized(self, request) -> bool:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if self.tokens.get(token, 0) > time.monotonic():
+            return True
+        self.requests["401"] += 1
+        return False
+
+    def store(self, event: dict) -> dict:
+        event = {**event, "id": uuid.uuid4().hex}
+        event["htmlLink"] = f"https://calendar.example/event/{event['id']}"
+        self.events.append(event)
+        return event
+
+    async def insert(self, request):
+        await asyncio.sleep(self.latency)
+        if not self.authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        self.requests["insert"] += 1
+        return web.json_response(self.store(await request.json()))
+
+    async def batch(self, request):
+        await asyncio.sleep(self.latency)
+        if not self.authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        self.requests["batch"] += 1
+        body = (await request.text()).replace("\r\n", "\n")
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        delimiter = body.lstrip().split("\n", 1)[0].strip()
+        for part in body.split(delimiter)[1:]:
+            if part.startswith("--"):
+                break
+            item = re.search(r"Content-ID:\s*<item(\d+)>", part).group(1)
+            payload = part.strip().split("\n\n")[-1]
+            event = self.store(json.loads(payload))
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-item{item}>\r\n\r\n"
+                f"HTTP/1.1 200 OK\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(event)}\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n")
+        return web.Response(text="".join(parts), headers={"Content-Type": f"multipart/mixed; boundary={boundary}"})
+
+    async def free_busy(self, request):
+        await asyncio.sleep(self.latency)
+        if not self.authorized(request):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        self.requests["freeBusy"] += 1
+        query = await request.json()
+        low, high = (datetime.fromisoformat(query[k]) for k in ("timeMin", "timeMax"))
+        busy = [
+            {"start": e["start"]["dateTime"], "end": e["end"]["dateTime"]}
+            for e in self.events
+            if datetime.fromisoformat(e["start"]["dateTime"]) < high and low < datetime.fromisoformat(e["end"]["dateTime"])
+        ]
+        return web.json_response({"calendars": {query["items"][0]["id"]: {"busy": busy}}})
+
+class LoopLagProbe:
+    """Largest delay between asking to wake after `interval` and actually waking."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.max_lag = max(self.max_lag, time.perf_counter() - start - self.interval)
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+async def schedule(service, slots) -> dict:
+    outcomes = {"ok": 0, "conflict": 0, "error": 0}
+
+    async def one(slot):
+        try:
+            await service.create_event("Benchmark", (DAY + timedelta(minutes=30 * slot)).isoformat(), 30)
+            outcomes["ok"] += 1
+        except CalendarConflictError:
+            outcomes["conflict"] += 1
+        except Exception:
+            outcomes["error"] += 1
+
+    await asyncio.gather(*(one(slot) for slot in slots))
+    return outcomes
+
+async def main(requests: int = 40):
+    api = StubCalendarApi()
+    runner = web.AppRunner(api.app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    def build(ttl: float = 3600, **kwargs):
+        return CalendarService(creds=StubCredentials(api, ttl), base_url=base_url, **kwargs)
+
+    print(f"stub Calendar API, {LATENCY * 1000:.0f}ms per HTTP request, token refresh blocks {REFRESH_SECONDS * 1000:.0f}ms")
+    print(f"{'scenario':<34}{'elapsed s':>10}{'HTTP calls':>12}{'ok':>5}{'conflict':>10}{'error':>7}"
+          f"{'401s':>6}{'refreshes':>11}{'max loop lag ms':>17}")
+
+    async def scenario(name, service, slots, spacing: float = 0.0):
+        before = dict(api.requests)
+        with LoopLagProbe() as probe:
+            start = time.perf_counter()
+            if spacing:
+                outcomes = {"ok": 0, "conflict": 0, "error": 0}
+                for slot in slots:
+                    for key, value in (await schedule(service, [slot])).items():
+                        outcomes[key] += value
+                    await asyncio.sleep(spacing)
+            else:
+                outcomes = await schedule(service, slots)
+            elapsed = time.perf_counter() - start
+        calls = sum(api.requests[k] - before[k] for k in ("insert", "batch", "freeBusy"))
+        print(f"{name:<34}{elapsed:>10.2f}{calls:>12}{outcomes['ok']:>5}{outcomes['conflict']:>10}"
+              f"{outcomes['error']:>7}{api.requests['401'] - before['401']:>6}{service.refreshes:>11}"
+              f"{probe.max_lag * 1000:>17.1f}")
+        await service.close()
+
+    # Each scenario books a different day so free/busy views don't carry over
+    global DAY
+    await scenario("unbatched, no conflict check", build(batch_size=1), range(requests))
+    DAY += timedelta(days=1)
+    await scenario("unbatched, conflict check", build(batch_size=1, check_conflicts=True), range(requests))
+    DAY += timedelta(days=1)
+    await scenario("batched, conflict check", build(check_conflicts=True), range(requests))
+    DAY += timedelta(days=1)
+    await scenario("same slot requested 10 times", build(check_conflicts=True), [0] * 10)
+    DAY += timedelta(days=1)
+    # Tokens live 2s and are refreshed 1s ahead, while requests keep arriving
+    await scenario("token refresh under load", build(ttl=2, refresh_margin=1, check_conflicts=True), range(30), spacing=0.15)
+
+    booked = {(e["start"]["dateTime"], e["end"]["dateTime"]) for e in api.events}
+    print(f"\nevents on the stub calendar: {len(api.events)}, double bookings: {len(api.events) - len(booked)}")
+    await close_http_client()
+    await runner.cleanup()
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 40))
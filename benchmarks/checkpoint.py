@@ -0,0 +1,247 @@
+#benchmarks/checkpoint.py
+
+"""Cost of checkpointing every workflow node, and what resuming a failed run saves.
+
+Runs the corpus sequentially through the workflow with near-zero latency fakes,
+so the time added per node is the checkpointer's: no checkpoints, an
+in-memory saver (serialization only) and, when DB_URL is reachable, the Postgres
+saver, each with sync and async durability. Then fails generate_response once
+on a schedule_event request and counts what a retry repeats with and without
+checkpoints, checks that a run failing every attempt still gets the apology and
+that a streamed retry doesn't repeat tokens in the Slack draft, and with
+Postgres, resumes a run whose worker was cancelled in generate_response and
+checks that one cancelled while booking is apologised for, not booked twice.
+
+Run: python -m benchmarks.checkpoint [corpus.jsonl] [--requests=200]
+"""
+
+import os
+
+# Tool results would otherwise be served from cache after the first request
+os.environ.setdefault("TOOL_CACHE_TTL_GET_WEATHER", "0")
+os.environ.setdefault("TOOL_CACHE_TTL_WEB_SEARCH", "0")
+
+import asyncio
+import json
+import sys
+import time
+import uuid
+import numpy as np
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from benchmarks.fakes import ANSWER, FakeCalendarService, FakeChatModel, FakeEmbeddings, build_agent
+from benchmarks.workflow import CORPUS_PATH, load_corpus
+from server.answer_cache import SemanticAnswerCache
+from server.checkpointer import PostgresCheckpointSaver, ResumableWorkflow
+from server.services import get_service, service_registry
+from server.slack_streaming import SlackMessageStreamer
+
+SCHEDULE = {"action": "tool", "tool_name": "schedule_event",
+            "tool_args": {"title": "Sync", "start_time": "2026-10-17T10:00:00", "duration": 30}}
+
+class MemorySaver(InMemorySaver):
+    """InMemorySaver with the Postgres saver's integer channel versions, so snapshots are the same size"""
+
+    get_next_version = BaseCheckpointSaver.get_next_version
+
+class FlakyChatModel(FakeChatModel):
+    """Classifies every query as schedule_event and fails the first answer generation"""
+
+    def __init__(self, latency: float = 0.0, failures: int = 1):
+        super().__init__(latency)
+        self.intent_calls = 0
+        self.failures_left = failures
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        if "Analyze the query" in messages.to_messages()[0].content:
+            self.intent_calls += 1
+            return AIMessage(content=json.dumps(SCHEDULE))
+        if self.failures_left:
+            self.failures_left -= 1
+            raise RuntimeError("OpenAI returned 500")
+        return await super().ainvoke(messages, *args, **kwargs)
+
+    async def astream(self, messages, *args, **kwargs):
+        # Fails part-way through the answer, after some tokens have reached the draft
+        failing = self.failures_left > 0
+        self.failures_left -= failing
+        count = 0
+        async for chunk in super().astream(messages, *args, **kwargs):
+            if failing and count == 3:
+                raise RuntimeError("OpenAI stream dropped")
+            count += 1
+            yield chunk
+
+class DraftClient:
+    """Slack client stub that keeps the placeholder's latest text"""
+
+    def __init__(self):
+        self.text = ""
+
+    async def chat_update(self, channel: str, ts: str, text: str):
+        self.text = text
+
+class CountingCalendar(FakeCalendarService):
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.created = 0
+
+    async def create_event(self, title: str, start_time: str, duration: int):
+        self.created += 1
+        return await super().create_event(title, start_time, duration)
+
+async def postgres_saver():
+    """The Postgres saver when DB_URL is reachable, else None"""
+    saver = PostgresCheckpointSaver.from_env()
+    try:
+        await asyncio.wait_for(saver._ensure_schema(), timeout=5)
+        return saver
+    except Exception as e:
+        print(f"Postgres unavailable ({type(e).__name__}), skipping the Postgres saver")
+        return None
+
+async def run_requests(workflow, queries, requests: int) -> tuple:
+    """(ms per request, nodes per request) over `requests` sequential runs"""
+    timings, nodes = [], 0
+    for i in range(requests):
+        state = {"query": queries[i % len(queries)], "user_id": "U_BENCH", "trace_id": uuid.uuid4().hex}
+        start = time.perf_counter()
+        async for _ in workflow.astream(state, None, stream_mode="updates"):
+            nodes += 1
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.mean(timings)), nodes / requests
+
+async def overhead(queries, requests: int, postgres):
+    agent, _ = build_agent(llm_latency=0.0, retrieval_latency=0.0)
+    for name in ("weather", "web_search", "calendar"):
+        get_service(name).latency = 0.0
+    savers = [("memory", MemorySaver())] + ([("postgres", postgres)] if postgres else [])
+    modes = [("none", agent.compile())] + [
+        (f"{name} {durability}", ResumableWorkflow(agent.compile(checkpointer=saver), durability=durability))
+        for name, saver in savers for durability in ("sync", "async")
+    ]
+
+    # Warm up imports, prompt templates and the connection pool before measuring
+    for _, workflow in modes:
+        await run_requests(workflow, queries, 5)
+
+    print(f"\n{requests} sequential requests, zero-latency fakes")
+    print(f"{'checkpointer':<18}{'ms/request':>12}{'nodes':>7}{'ms/node added':>15}")
+    baseline = None
+    for name, workflow in modes:
+        ms, nodes = await run_requests(workflow, queries, requests)
+        baseline = ms if baseline is None else baseline
+        print(f"{name:<18}{ms:>12.2f}{nodes:>7.1f}{(ms - baseline) / nodes:>15.3f}")
+
+    # Size of a snapshot once a run reaches generate_response
+    saver = MemorySaver()
+    graph = agent.compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": "size"}}
+    await graph.ainvoke({"query": queries[0], "user_id": "U_BENCH"}, config, interrupt_before=["generate_response"])
+    checkpoint = (await saver.aget_tuple(config)).checkpoint
+    _, blob = saver.serde.dumps_typed(checkpoint)
+    print(f"snapshot before generate_response: {len(blob)} bytes msgpack, "
+          f"{len(json.dumps(checkpoint['channel_values'], default=str))} bytes of state as JSON")
+
+async def resume(postgres):
+    """schedule_event bookings and intent calls when generate_response fails once"""
+    print("\ngenerate_response fails once on a schedule_event request, then the request is retried")
+    print(f"{'mode':<34}{'bookings':>9}{'intent calls':>14}{'answered':>10}")
+    savers = [("resume from checkpoint (memory)", MemorySaver())]
+    if postgres:
+        savers.append(("resume from checkpoint (postgres)", postgres))
+    for name, saver in [("restart from init", None)] + savers:
+        agent, _ = build_agent(llm_latency=0.0, retrieval_latency=0.0)
+        calendar = CountingCalendar()
+        service_registry.register("calendar", lambda: calendar)
+        agent.llm = FlakyChatModel()
+        state = {"query": "Book a sync tomorrow at 10", "user_id": "U_BENCH", "trace_id": uuid.uuid4().hex}
+        if saver is None:
+            graph = agent.compile()
+            try:
+                # What ResumableWorkflow passes while a retry is left: the failure is raised, not apologised for
+                await graph.ainvoke(state, {"configurable": {"retry_pending": True}})
+            except RuntimeError:
+                pass
+            result = await graph.ainvoke(state)
+        else:
+            result = await ResumableWorkflow(agent.compile(checkpointer=saver)).ainvoke(state)
+        print(f"{name:<34}{calendar.created:>9}{agent.llm.intent_calls:>14}{str(result['response'] != ''):>10}")
+
+async def failures(postgres):
+    """Answers when every generation fails, and the Slack draft when a streamed one fails once"""
+    saver = postgres or MemorySaver()
+    agent, _ = build_agent(llm_latency=0.0, retrieval_latency=0.0)
+    agent.llm = FlakyChatModel(failures=2)
+    result = await ResumableWorkflow(agent.compile(checkpointer=saver)).ainvoke(
+        {"query": "Book a sync tomorrow at 10", "user_id": "U_BENCH", "trace_id": uuid.uuid4().hex})
+    print(f"\ngenerate_response fails on every attempt: answered {result['response']!r}")
+
+    agent.llm = FlakyChatModel(failures=1)
+    agent.stream_responses = True
+    cache = SemanticAnswerCache(ResumableWorkflow(agent.compile(checkpointer=saver)), FakeEmbeddings(latency=0.0))
+    client = DraftClient()
+    streamer = SlackMessageStreamer(client, "C_BENCH", "1.0", min_interval=0, min_tokens=1, max_updates=1000)
+    await cache.ainvoke({"query": "Book a sync tomorrow at 10", "user_id": "U_BENCH", "trace_id": uuid.uuid4().hex},
+                        on_token=streamer.add, on_reset=streamer.reset)
+    print(f"streamed answer retried after a dropped stream: draft shows the answer "
+          f"{client.text.count(ANSWER.split(' ')[0])} time(s) ({client.text!r})")
+    agent.stream_responses = False
+
+async def recover(postgres):
+    """A run cancelled in generate_response (its worker died) is finished by recover()"""
+    agent, _ = build_agent(llm_latency=0.5, retrieval_latency=0.0)
+    workflow = ResumableWorkflow(agent.compile(checkpointer=postgres), resume_after=0.1)
+    state = {"query": "How do I sell on Amazon?", "user_id": "U_BENCH", "trace_id": uuid.uuid4().hex}
+    run = asyncio.create_task(workflow.ainvoke(state, {"metadata": {"channel": "C_BENCH"}}))
+    # The intent call takes 0.5s; cancel half-way through the answer that follows it
+    await asyncio.sleep(0.75)
+    run.cancel()
+    await asyncio.gather(run, return_exceptions=True)
+    calls_before = agent.llm.calls
+    await asyncio.sleep(0.2)
+    delivered = []
+
+    async def on_result(result, metadata):
+        delivered.append((metadata.get("channel"), result["response"]))
+
+    start = time.perf_counter()
+    await workflow.recover(on_result)
+    print(f"\nrecovered interrupted run in {(time.perf_counter() - start) * 1000:.0f} ms: "
+          f"delivered to {[channel for channel, _ in delivered]}, "
+          f"{agent.llm.calls - calls_before} LLM call(s) after the interruption")
+
+    # A worker dying inside execute_tools leaves no checkpoint saying whether the booking ran
+    agent, _ = build_agent(llm_latency=0.0, retrieval_latency=0.0)
+    calendar = CountingCalendar(latency=0.5)
+    service_registry.register("calendar", lambda: calendar)
+    agent.llm = FlakyChatModel(failures=0)
+    workflow = ResumableWorkflow(agent.compile(checkpointer=postgres), resume_after=0.1)
+    state = {"query": "Book a sync tomorrow at 10", "user_id": "U_BENCH", "trace_id": uuid.uuid4().hex}
+    run = asyncio.create_task(workflow.ainvoke(state, {"metadata": {"channel": "C_BENCH"}}))
+    await asyncio.sleep(0.25)
+    run.cancel()
+    await asyncio.gather(run, return_exceptions=True)
+    # The booking itself is shielded and completes in the background
+    await asyncio.sleep(0.5)
+    delivered.clear()
+    await workflow.recover(on_result)
+    print(f"run interrupted while booking: {calendar.created} booking(s) after recover(), "
+          f"delivered {[response[:40] for _, response in delivered]}")
+
+async def main(corpus_path: str, requests: int):
+    queries = load_corpus(corpus_path)
+    postgres = await postgres_saver()
+    await overhead(queries, requests, postgres)
+    await resume(postgres)
+    await failures(postgres)
+    if postgres:
+        await recover(postgres)
+        await postgres.prune()
+        await postgres.engine.dispose()
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    options = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    asyncio.run(main(args[0] if args else CORPUS_PATH, int(options.get("requests", "200"))))
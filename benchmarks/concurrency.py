@@ -0,0 +1,78 @@
+#benchmarks/concurrency.py
+
+"""Concurrent Slack mentions against a stubbed chat model.
+
+Sends one mention, then N at once, through slack_handler.handle_message (dedup,
+ingress pool, answer cache, workflow) with a fake chat model that takes a
+fixed time per call. Because the LLM nodes await the model instead of blocking
+the event loop, N mentions should finish in roughly the time of one. Exits
+non-zero when they take more than --max-ratio times as long.
+
+Run: python -m benchmarks.concurrency [mentions] [--llm-latency=0.3] [--max-ratio=2]
+"""
+
+import os
+
+os.environ.setdefault("SLACK_BOT_TOKEN", "xoxb-benchmark")
+os.environ.setdefault("METRICS_PORT", "0")
+
+import asyncio
+import logging
+import sys
+import time
+from benchmarks.fakes import FakeEmbeddings, build_agent
+
+async def send(handler, mentions: int, offset: int) -> float:
+    """Seconds until every one of `mentions` distinct mentions has been answered"""
+    replies = []
+    done = asyncio.Event()
+
+    async def say(text):
+        replies.append(text)
+        if len(replies) == mentions:
+            done.set()
+
+    start = time.perf_counter()
+    for i in range(offset, offset + mentions):
+        body = {"event_id": f"EvConc{i}", "event": {"text": f"<@U_BOT> How do I sell product {i} on Amazon?",
+                                                    "user": f"U{i:04d}", "ts": f"{i}.0", "channel": "C_BENCH"}}
+        await handler.handle_message(body, body["event"], say)
+    await asyncio.wait_for(done.wait(), timeout=120)
+    return time.perf_counter() - start
+
+async def main(mentions: int, llm_latency: float, max_ratio: float) -> bool:
+    # Enough pool workers that every mention can be in flight at once
+    os.environ["INGRESS_WORKERS"] = str(max(mentions, 8))
+    os.environ["INGRESS_QUEUE_SIZE"] = str(max(mentions * 2, 100))
+    agent, _ = build_agent(llm_latency=llm_latency, retrieval_latency=0.05)
+    import core.agents as agents
+    agents.agent.llm = agent.llm
+    import server.slack_handler as handler
+    logging.getLogger().setLevel(logging.WARNING)
+    handler.answer_cache.embeddings = FakeEmbeddings(latency=0.005)
+    handler.answer_cache.version_fn = None
+    handler.bot_user_id = "U_BOT"
+    handler.ingress.start()
+    try:
+        one = await send(handler, 1, 0)
+        many = await send(handler, mentions, 1)
+    finally:
+        await handler.ingress.stop()
+    ratio = many / one
+    print(f"stub chat model {llm_latency:.2f}s per call")
+    print(f"{'mentions':>9}{'seconds':>9}")
+    print(f"{1:>9}{one:>9.2f}")
+    print(f"{mentions:>9}{many:>9.2f}")
+    print(f"{mentions} concurrent mentions took {ratio:.2f}x the time of one (limit {max_ratio:.1f}x): "
+          f"{'ok' if ratio <= max_ratio else 'FAILED'}")
+    return ratio <= max_ratio
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    options = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    ok = asyncio.run(main(
+        int(args[0]) if args else 20,
+        float(options.get("llm-latency", "0.3")),
+        float(options.get("max-ratio", "2")),
+    ))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,50 @@
+#benchmarks/deadline.py
+
+"""Workflow behaviour under a request deadline when a dependency is slow.
+
+Each scenario slows one stand-in well past the deadline and checks that the
+workflow still answers within it, reporting which stages were cut short.
+
+Run: python -m benchmarks.deadline [deadline_seconds]
+"""
+
+import os
+
+os.environ.setdefault("DEADLINE_GENERATION_RESERVE", "0.8")
+
+import asyncio
+import sys
+import time
+from benchmarks.fakes import build_agent
+from core.deadline import new_deadline
+from server.metrics import metrics
+
+SCENARIOS = {
+    # name: (query, llm latency, retrieval latency, tool latency)
+    "healthy": ("How do I sell on Amazon?", 0.2, 0.1, 0.1),
+    "slow retrieval": ("How do I sell on Amazon?", 0.2, 10, 0.1),
+    "slow tool": ("What's the weather in Lahore", 0.2, 0.1, 10),
+    "slow llm": ("How do I sell on Amazon?", 10, 0.1, 0.1),
+}
+
+def misses() -> dict:
+    return {dict(labels)["stage"]: value for (name, labels), value in metrics.counters.items() if name == "deadline_miss_total"}
+
+async def main(deadline: float = 2.0):
+    print(f"deadline {deadline:.1f}s")
+    print(f"{'scenario':<16}{'elapsed s':>10}  {'missed stages':<36}response")
+    for name, (query, llm_latency, retrieval_latency, tool_latency) in SCENARIOS.items():
+        agent, _ = build_agent(llm_latency=llm_latency, retrieval_latency=retrieval_latency)
+        from server.services import get_service
+        get_service("weather").latency = tool_latency
+        workflow = agent.workflow.compile()
+        before = misses()
+        start = time.perf_counter()
+        state = await workflow.ainvoke({"query": query, "user_id": "U_BENCH", "deadline": new_deadline(deadline)})
+        elapsed = time.perf_counter() - start
+        missed = [stage for stage, count in misses().items() if count > before.get(stage, 0)]
+        response = state["response"].replace("\n", " ")[:60]
+        print(f"{name:<16}{elapsed:>10.2f}  {', '.join(missed) or '-':<36}{response}")
+
+if __name__ == "__main__":
+    asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else 2.0))
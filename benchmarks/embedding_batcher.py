@@ -0,0 +1,73 @@
+#benchmarks/embedding_batcher.py
+
+"""Query-embedding throughput and added latency with and without micro-batching.
+
+A stub embeddings client charges a fixed latency per request plus a small cost
+per text, and the provider allows a limited number of requests in flight, as
+the OpenAI rate limiter does in production.
+
+Run: python -m benchmarks.embedding_batcher [burst_size]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+from benchmarks.fakes import FakeEmbeddings
+from server.embedding_cache import CachedEmbeddings, EmbeddingCache
+from server.rate_limiter import ProviderLimiter
+
+REQUEST_LATENCY = 0.05
+PER_TEXT_LATENCY = 0.0002
+CONCURRENCY = 8
+
+class StubEmbeddings(FakeEmbeddings):
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        await asyncio.sleep(REQUEST_LATENCY + PER_TEXT_LATENCY * len(texts))
+        return [self.vector(t) for t in texts]
+
+def build(batch_size: int, batch_wait: float):
+    stub = StubEmbeddings(dimensions=256)
+    limiter = ProviderLimiter("stub", max_concurrency=CONCURRENCY)
+    embeddings = CachedEmbeddings(stub, EmbeddingCache(max_entries=0), model="stub", limiter=limiter,
+                                  batch_size=batch_size, batch_wait=batch_wait)
+    return stub, embeddings
+
+async def burst(batch_size: int, batch_wait: float, size: int) -> dict:
+    stub, embeddings = build(batch_size, batch_wait)
+    latencies = []
+
+    async def one(i):
+        start = time.perf_counter()
+        await embeddings.aembed_query(f"burst query {i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(size)))
+    elapsed = time.perf_counter() - start
+    return {"qps": size / elapsed, "requests": stub.calls, "p50": statistics.median(latencies), "max": max(latencies)}
+
+async def sequential(batch_size: int, batch_wait: float, count: int = 20) -> float:
+    """Median latency when queries arrive one at a time, so batching can only add delay."""
+    _, embeddings = build(batch_size, batch_wait)
+    latencies = []
+    for i in range(count):
+        start = time.perf_counter()
+        await embeddings.aembed_query(f"lone query {i}")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+async def main(size: int = 200):
+    configs = [("unbatched", 1, 0.0), ("batch 64 / 2ms", 64, 0.002), ("batch 64 / 5ms", 64, 0.005)]
+    print(f"burst of {size} concurrent queries, {CONCURRENCY} provider requests in flight, "
+          f"{REQUEST_LATENCY * 1000:.0f}ms per request")
+    print(f"{'config':<18}{'queries/s':>11}{'requests':>10}{'p50 ms':>9}{'max ms':>9}{'lone query ms':>15}")
+    for name, batch_size, batch_wait in configs:
+        result = await burst(batch_size, batch_wait, size)
+        lone = await sequential(batch_size, batch_wait)
+        print(f"{name:<18}{result['qps']:>11.0f}{result['requests']:>10}{result['p50']:>9.1f}"
+              f"{result['max']:>9.1f}{lone:>15.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -0,0 +1,163 @@
+#benchmarks/fakes.py
+
+"""Deterministic local stand-ins for OpenAI, pgvector and the external services."""
+
+import sys
+import os
+
+# Add project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import hashlib
+import json
+import time
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+# Keep the LLM classifier on the measured path unless a benchmark opts in to the router
+os.environ.setdefault("INTENT_ROUTER_ENABLED", "false")
+# Fakes have no provider quota; benchmarks that exercise the limiter configure it themselves
+os.environ.setdefault("RATE_LIMIT_OPENAI_RPM", "0")
+os.environ.setdefault("RATE_LIMIT_OPENAI_TPM", "0")
+os.environ.setdefault("RATE_LIMIT_OPENAI_EMBEDDINGS_RPM", "0")
+os.environ.setdefault("RATE_LIMIT_OPENAI_EMBEDDINGS_TPM", "0")
+
+ANSWER = "Here is a friendly, reasonably detailed answer to your question 😊"
+
+def classify(query: str) -> dict:
+    """Keyword intent rules standing in for the intent prompt."""
+    q = query.lower()
+    if "weather" in q:
+        return {"action": "tool", "tool_name": "get_weather", "tool_args": {"city": q.split()[-1]}}
+    if "search" in q:
+        return {"action": "tool", "tool_name": "web_search", "tool_args": {"query": query, "max_results": 3}}
+    if "human" in q or "refund" in q:
+        return {"action": "escalate", "reason": "Customer asked for a human"}
+    if "order" in q or "sell" in q or "amazon" in q:
+        return {"action": "rag", "context_needed": True}
+    return {"action": "direct", "response": "Hi there! 👋"}
+
+class FakeChatModel:
+    """Async chat model with a fixed latency and keyword-driven answers."""
+
+    def __init__(self, latency: float = 0.3):
+        self.latency = latency
+        self.calls = 0
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        prompt = messages.to_messages()
+        user = prompt[-1].content
+        if "Analyze the query" in prompt[0].content:
+            return AIMessage(content=json.dumps(classify(user.replace("Query:", "", 1).strip())))
+        return AIMessage(content=ANSWER)
+
+    async def astream(self, messages, *args, **kwargs):
+        self.calls += 1
+        words = ANSWER.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield AIMessageChunk(content=word if i == 0 else " " + word)
+
+def synthetic_corpus(rows: int, dimensions: int = 1536, clusters: int = 50, seed: int = 7):
+    """Clustered unit vectors, closer to real embedding distributions than uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimensions))
+    vectors = centers[rng.integers(0, clusters, rows)] + 0.6 * rng.standard_normal((rows, dimensions))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+class FakeEmbeddings:
+    """Deterministic hash-seeded unit vectors with a fixed latency per request."""
+
+    def __init__(self, latency: float = 0.05, dimensions: int = 1536):
+        self.latency = latency
+        self.dimensions = dimensions
+        self.calls = 0
+
+    def vector(self, text: str):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        values = np.random.default_rng(seed).standard_normal(self.dimensions)
+        return (values / np.linalg.norm(values)).tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self.vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [self.vector(t) for t in texts]
+
+    async def aembed_query(self, text):
+        return (await self.aembed_documents([text]))[0]
+
+class FakeVectorStore:
+    """Async vector store returning canned documents after a fixed latency."""
+
+    def __init__(self, latency: float = 0.15):
+        self.latency = latency
+        self.calls = 0
+
+    async def asimilarity_search(self, query: str, k: int = 3):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [
+            Document(page_content=f"Knowledge chunk {i} for: {query}", metadata={"source": "fake.pdf"})
+            for i in range(k)
+        ]
+
+class FakeWeatherService:
+    def __init__(self, latency: float = 0.1):
+        self.latency = latency
+
+    async def get_weather(self, city: str):
+        await asyncio.sleep(self.latency)
+        return {
+            "main": {"temp": 25, "feels_like": 26, "humidity": 40},
+            "weather": [{"description": "clear sky"}]
+        }
+
+class FakeCalendarService:
+    def __init__(self, latency: float = 0.1):
+        self.latency = latency
+
+    async def create_event(self, title: str, start_time: str, duration: int):
+        await asyncio.sleep(self.latency)
+        return {"htmlLink": "https://calendar.example/event"}
+
+class FakeWebSearchService:
+    def __init__(self, latency: float = 0.3):
+        self.latency = latency
+
+    async def search(self, query: str, max_results: int = 3, search_depth="basic"):
+        await asyncio.sleep(self.latency)
+        return {"results": [
+            {"title": f"Result {i}", "url": f"https://example.com/{i}", "content": query}
+            for i in range(max_results)
+        ]}
+
+def install_stub_services():
+    """Register stand-ins for the real service clients, dropping any already built."""
+    from server.services import service_registry
+    service_registry.register("weather", FakeWeatherService)
+    service_registry.register("calendar", FakeCalendarService)
+    service_registry.register("web_search", FakeWebSearchService)
+
+def build_agent(llm_latency: float = 0.3, retrieval_latency: float = 0.15, **agent_kwargs):
+    """Build a SupportAgent wired to the fakes; returns (agent, vector_store)."""
+    install_stub_services()
+    import core.agents as agents
+
+    store = FakeVectorStore(retrieval_latency)
+    agents.get_async_vector_store = lambda: store
+    agent = agents.SupportAgent(**agent_kwargs)
+    agent.llm = FakeChatModel(llm_latency)
+    return agent, store
@@ -0,0 +1,58 @@
+#benchmarks/ingest_pipeline.py
+
+"""Throughput of the ingestion pipeline over copies of the bundled PDF.
+
+Uses a fake embedding client and an in-memory writer, so it measures parsing,
+chunking and batching rather than OpenAI or Postgres.
+
+Run: python -m benchmarks.ingest_pipeline [copies]
+"""
+
+import asyncio
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from benchmarks.fakes import FakeEmbeddings
+from data.ingest import IngestPipeline
+
+SOURCE_PDF = os.path.join("data", "knowledge", "Guidelines-for-Selling-on-Amazon.pdf")
+
+class MemoryWriter:
+    def __init__(self):
+        self.rows = 0
+
+    def upsert(self, rows):
+        self.rows += len(rows)
+
+    def delete(self, ids):
+        pass
+
+def main(copies: int = 8):
+    workdir = tempfile.mkdtemp(prefix="ingest-bench-")
+    try:
+        paths = []
+        for i in range(copies):
+            path = os.path.join(workdir, f"copy-{i}.pdf")
+            shutil.copy(SOURCE_PDF, path)
+            paths.append(path)
+
+        for workers in sorted({1, os.cpu_count() or 1}):
+            pipeline = IngestPipeline(FakeEmbeddings(latency=0.05), MemoryWriter(), workers=workers)
+            start = time.perf_counter()
+            asyncio.run(pipeline.run(paths, {}))
+            elapsed = time.perf_counter() - start
+            stats = pipeline.stats
+            print(
+                f"workers={workers}: {elapsed:.2f}s, {stats['pages'] / elapsed:.1f} pages/s, "
+                f"{stats['chunks'] / elapsed:.1f} chunks/s ({stats['pages']} pages, {stats['chunks']} chunks)"
+            )
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"peak RSS: {peak_mb:.0f} MB")
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 8)
@@ -0,0 +1,51 @@
+#benchmarks/multi_tool.py
+
+"""Wall time of execute_tools for stub tools of varying latency, serial vs. concurrent.
+
+Run: python -m benchmarks.multi_tool
+"""
+
+import asyncio
+import time
+from pydantic import BaseModel, Field
+from langchain_core.tools import StructuredTool
+from benchmarks.fakes import build_agent
+
+class StubInput(BaseModel):
+    query: str = Field(..., description="Anything")
+
+def stub_tool(name: str, latency: float) -> StructuredTool:
+    async def run(query: str) -> str:
+        await asyncio.sleep(latency)
+        return f"{name} done in {latency}s"
+    return StructuredTool.from_function(coroutine=run, name=name, description=name, args_schema=StubInput)
+
+LATENCIES = {"fast": 0.1, "medium": 0.3, "slow": 0.6, "hung": 30}
+
+async def main():
+    agent, _ = build_agent()
+    from core.tools import ToolExecutor
+    agent.tool_executor = ToolExecutor(
+        [stub_tool(name, latency) for name, latency in LATENCIES.items()],
+        timeouts={"hung": 1.0}
+    )
+    agent.tool_executor.default_timeout = 5
+    state = {"tool_calls": [{"name": name, "args": {"query": "x"}} for name in LATENCIES]}
+
+    start = time.perf_counter()
+    for call in state["tool_calls"]:
+        await agent.tool_executor.execute(call["name"], call["args"])
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    result = await agent.execute_tools(state)
+    concurrent = time.perf_counter() - start
+
+    print(f"tool latencies: {LATENCIES} (hung has a 1.0s deadline)")
+    print(f"serial:     {serial:.2f}s")
+    print(f"concurrent: {concurrent:.2f}s")
+    for output in result["tool_outputs"]:
+        print(f"  {output}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
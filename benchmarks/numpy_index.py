@@ -0,0 +1,85 @@
+#benchmarks/numpy_index.py
+
+"""Query latency of the memory-mapped NumPy retrieval backend.
+
+Writes a synthetic index with the same writer data/ingest.py uses, then times
+single and batched top-k searches and checks them against a brute-force scan.
+Then sends concurrent asimilarity_search calls, which the store coalesces into
+shared scans, and re-exports the index under a loaded store to check that
+searches keep returning documents that match their vectors.
+
+Run: python -m benchmarks.numpy_index [rows]
+"""
+
+import asyncio
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from benchmarks.fakes import FakeEmbeddings, synthetic_corpus
+from server.numpy_index import NumpyVectorStore, write_numpy_index
+
+K = 3
+QUERIES = 64
+
+async def concurrent(path: str, rows: int, corpus: np.ndarray):
+    embeddings = FakeEmbeddings(latency=0.0)
+    texts = [f"query {i}" for i in range(QUERIES)]
+    store = NumpyVectorStore(path, embeddings, block_rows=8192)
+    start = time.perf_counter()
+    for text in texts:
+        await store.asimilarity_search(text, K)
+    sequential_ms = (time.perf_counter() - start) * 1000
+    store = NumpyVectorStore(path, embeddings, block_rows=8192)
+    start = time.perf_counter()
+    await asyncio.gather(*(store.asimilarity_search(text, K) for text in texts))
+    concurrent_ms = (time.perf_counter() - start) * 1000
+    stats = store.stats()
+    print(f"{QUERIES} asimilarity_search calls: {sequential_ms:.0f} ms one at a time, {concurrent_ms:.0f} ms concurrently "
+          f"({stats['batches']} scans, {stats['avg_batch']:.1f} queries/scan)")
+
+    # Re-export with different documents while the store still maps the old generation
+    reversed_rows = ((str(i), f"chunk {rows - 1 - i}", {"row": rows - 1 - i}, corpus[rows - 1 - i]) for i in range(rows))
+    store.reload_interval = 0
+    pending = [asyncio.create_task(store.asimilarity_search(text, K)) for text in texts]
+    await asyncio.sleep(0.001)
+    write_numpy_index(path, reversed_rows, rows, corpus.shape[1])
+    results = await asyncio.gather(*pending) + [await store.asimilarity_search(text, K) for text in texts]
+    queries = np.asarray([embeddings.vector(text) for text in texts * 2], dtype=np.float32)
+    expected = np.argsort(-(queries @ corpus.T), axis=1)[:, :K]
+    # Every document must be one whose vector was scored, in either export
+    consistent = all({d.metadata["row"] for d in documents} == set(rows_) for documents, rows_ in zip(results, expected))
+    print(f"searches across a re-export returned the scored documents: {consistent}")
+
+def main(rows: int = 20000):
+    workdir = tempfile.mkdtemp(prefix="numpy-index-bench-")
+    try:
+        corpus = synthetic_corpus(rows)
+        path = f"{workdir}/index"
+        start = time.perf_counter()
+        write_numpy_index(path, ((str(i), f"chunk {i}", {"row": i}, v) for i, v in enumerate(corpus)), rows, corpus.shape[1])
+        print(f"rows={rows}: export {time.perf_counter() - start:.2f}s, {corpus.nbytes / 2**20:.0f} MB of vectors")
+
+        store = NumpyVectorStore(path, embeddings=None, block_rows=8192)
+        queries = corpus[np.random.default_rng(1).integers(0, rows, QUERIES)] + 0.05
+        expected = np.argsort(-(queries @ corpus.T), axis=1)[:, :K]
+
+        start = time.perf_counter()
+        single = np.concatenate([store.search_by_vectors(q, K)[0] for q in queries])
+        single_ms = (time.perf_counter() - start) * 1000 / QUERIES
+        start = time.perf_counter()
+        batched, _ = store.search_by_vectors(queries, K)
+        batched_ms = (time.perf_counter() - start) * 1000 / QUERIES
+        start = time.perf_counter()
+        store.get_documents(batched[0])
+        fetch_ms = (time.perf_counter() - start) * 1000
+
+        print(f"single query: {single_ms:.2f} ms, batched: {batched_ms:.2f} ms/query, fetch {K} docs: {fetch_ms:.2f} ms")
+        print(f"matches brute force: {np.array_equal(single, expected) and np.array_equal(batched, expected)}")
+        asyncio.run(concurrent(path, rows, corpus))
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
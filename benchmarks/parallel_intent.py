@@ -0,0 +1,42 @@
+#benchmarks/parallel_intent.py
+
+"""Per-intent workflow latency with serial vs. speculative parallel retrieval.
+
+Run: python -m benchmarks.parallel_intent
+"""
+
+import asyncio
+import statistics
+import time
+from benchmarks.fakes import build_agent
+
+QUERIES = {
+    "rag": "How do I track my order on Amazon?",
+    "get_weather": "What's the weather in Lahore",
+    "escalate": "I want a refund from a human",
+    "direct": "Hello, how are you doing today?",
+}
+
+async def measure(parallel_intent: bool, runs: int) -> dict:
+    agent, store = build_agent(parallel_intent=parallel_intent)
+    workflow = agent.workflow.compile()
+    results = {}
+    for intent, query in QUERIES.items():
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            await workflow.ainvoke({"query": query, "user_id": "U_BENCH"})
+            timings.append((time.perf_counter() - start) * 1000)
+        results[intent] = statistics.median(timings)
+    return results
+
+async def main(runs: int = 5):
+    serial = await measure(False, runs)
+    parallel = await measure(True, runs)
+    print(f"{'intent':<14}{'serial ms':>12}{'parallel ms':>14}{'saved':>10}")
+    for intent in QUERIES:
+        saved = serial[intent] - parallel[intent]
+        print(f"{intent:<14}{serial[intent]:>12.1f}{parallel[intent]:>14.1f}{saved:>10.1f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+#benchmarks/quantization.py
+
+"""Index bytes per chunk and recall@3 of the compact vector modes, emulated in NumPy.
+
+Mirrors the two-stage search in server/vector_quantization.py: shortlist on
+the compact representation, then re-rank the candidates with full vectors.
+The sizes are what the ANN index stores per chunk. The table keeps the full
+float32 vector for re-ranking in every mode, so storage per chunk only
+shrinks by the index's share. The synthetic corpus is not Matryoshka-trained,
+so truncation recall here is a pessimistic bound compared with real
+text-embedding-3 vectors.
+
+Run: python -m benchmarks.quantization [rows] [queries]
+"""
+
+import sys
+import numpy as np
+from benchmarks.fakes import synthetic_corpus
+
+K = 3
+CANDIDATES = 40
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    idx = np.argpartition(-scores, k, axis=1)[:, :k]
+    order = np.take_along_axis(scores, idx, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(idx, order, axis=1)
+
+def truncate(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    prefix = vectors[:, :dimensions]
+    return prefix / np.linalg.norm(prefix, axis=1, keepdims=True)
+
+def int8_quantize(vectors: np.ndarray) -> np.ndarray:
+    scale = np.abs(vectors).max(axis=1, keepdims=True) / 127
+    return np.round(vectors / scale).astype(np.int8), scale
+
+def hamming_scores(query_bits: np.ndarray, corpus_bits: np.ndarray) -> np.ndarray:
+    # Higher is closer: negate the number of differing bits; one query at a time bounds memory
+    return np.stack([
+        -np.unpackbits(np.bitwise_xor(q, corpus_bits), axis=1).sum(axis=1).astype(np.float32)
+        for q in query_bits
+    ])
+
+def rerank(candidates: np.ndarray, queries: np.ndarray, corpus: np.ndarray) -> np.ndarray:
+    scores = np.einsum("qd,qcd->qc", queries, corpus[candidates])
+    return np.take_along_axis(candidates, top_k(scores, K), axis=1)
+
+def recall(found: np.ndarray, exact: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(e)) / K for f, e in zip(found, exact)]))
+
+def main(rows: int = 20000, query_count: int = 200):
+    dims = 1536
+    data = synthetic_corpus(rows + query_count, dims)
+    corpus, queries = data[:rows], data[rows:]
+    exact = top_k(queries @ corpus.T, K)
+    results = [("float32 (baseline)", dims * 4, 1.0)]
+
+    half = corpus.astype(np.float16)
+    results.append(("halfvec", dims * 2, recall(top_k(queries.astype(np.float16) @ half.T, K), exact)))
+
+    codes, scale = int8_quantize(corpus)
+    results.append(("int8", dims + 4, recall(top_k(queries @ (codes * scale).T, K), exact)))
+
+    for d in (768, 512, 256):
+        compact = truncate(corpus, d).astype(np.float16)
+        shortlist = top_k(truncate(queries, d).astype(np.float16) @ compact.T, CANDIDATES)
+        results.append((f"halfvec({d}) + rerank", d * 2, recall(rerank(shortlist, queries, corpus), exact)))
+
+    for d in (1536, 512):
+        corpus_bits = np.packbits(corpus[:, :d] > 0, axis=1)
+        query_bits = np.packbits(queries[:, :d] > 0, axis=1)
+        shortlist = top_k(hamming_scores(query_bits, corpus_bits), CANDIDATES)
+        results.append((f"binary({d}) + rerank", d // 8, recall(rerank(shortlist, queries, corpus), exact)))
+
+    print(f"{rows} chunks, {query_count} queries, recall@{K}, {CANDIDATES} re-rank candidates")
+    print(f"vector bytes per chunk; the table keeps {dims * 4} bytes of float32 per chunk in every mode")
+    print(f"{'mode':<24}{'index':>8}{'smaller':>9}{'index+table':>13}{'smaller':>9}{'recall':>9}")
+    for name, size, r in results:
+        # The baseline row is the table's own vectors plus a full-precision index over them
+        total = dims * 4 + size
+        print(f"{name:<24}{size:>8}{dims * 4 / size:>8.1f}x{total:>13}{dims * 8 / total:>8.1f}x{r:>9.3f}")
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
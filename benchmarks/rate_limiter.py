@@ -0,0 +1,102 @@
+#benchmarks/rate_limiter.py
+
+"""Burst load against a simulated rate-limited provider, with and without the limiter.
+
+The provider enforces a requests-per-second quota with a one-second bucket and
+answers over-quota calls with 429 and Retry-After, like OpenAI and Tavily.
+Interactive and background callers arrive together at several times the quota.
+
+Run: python -m benchmarks.rate_limiter [quota_rps] [requests]
+"""
+
+import asyncio
+import sys
+import time
+import numpy as np
+from server.rate_limiter import BACKGROUND, INTERACTIVE, ProviderLimiter, TokenBucket
+
+class ProviderThrottled(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after: float):
+        super().__init__("429 Too Many Requests")
+        self.response = type("Response", (), {"headers": {"retry-after": str(retry_after)}})()
+
+class SimulatedProvider:
+    """Quota-enforcing upstream whose latency grows with the number of calls in flight."""
+
+    def __init__(self, quota_rps: float, latency: float = 0.05):
+        self.bucket = TokenBucket(quota_rps * 60, burst_seconds=1)
+        self.latency = latency
+        self.in_flight = 0
+        self.served = 0
+        self.rejected = 0
+
+    async def call(self):
+        if self.bucket.wait_time(1) > 0:
+            self.rejected += 1
+            raise ProviderThrottled(retry_after=1)
+        self.bucket.take(1)
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.latency * (1 + self.in_flight / 20))
+            self.served += 1
+        finally:
+            self.in_flight -= 1
+
+async def run(quota_rps: float, requests: int, limiter_rps: float = None, burst_seconds: float = 1):
+    provider = SimulatedProvider(quota_rps)
+    limiter = None
+    if limiter_rps is not None:
+        limiter = ProviderLimiter("simulated", requests_per_minute=limiter_rps * 60, max_concurrency=32,
+                                  burst_seconds=burst_seconds, max_retries=5)
+    latencies = {INTERACTIVE: [], BACKGROUND: []}
+    errors = 0
+
+    async def one(priority):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            if limiter is None:
+                await provider.call()
+            else:
+                await limiter.call(provider.call, priority=priority)
+            latencies[priority].append(time.perf_counter() - start)
+        except ProviderThrottled:
+            errors += 1
+
+    start = time.perf_counter()
+    # Everything arrives within one second: a burst of several times the quota
+    tasks = []
+    for i in range(requests):
+        tasks.append(asyncio.create_task(one(BACKGROUND if i % 3 == 0 else INTERACTIVE)))
+        await asyncio.sleep(1 / requests)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    p95 = {p: float(np.percentile(v, 95)) if v else 0.0 for p, v in latencies.items()}
+    return {
+        "served/s": provider.served / elapsed,
+        "errors": errors,
+        "429s": provider.rejected,
+        "interactive p95 s": p95[INTERACTIVE],
+        "background p95 s": p95[BACKGROUND],
+    }
+
+async def main(quota_rps: float = 20, requests: int = 200):
+    scenarios = [
+        ("no limiter", None, 1),
+        ("limiter at 95% of quota", quota_rps * 0.95, 1),
+        ("limiter over quota (Retry-After)", quota_rps * 1.5, 10),
+    ]
+    print(f"provider quota {quota_rps} req/s, {requests} requests in a 1s burst (1/3 background)")
+    print(f"{'scenario':<34}{'served/s':>10}{'errors':>8}{'429s':>6}{'interactive p95 s':>19}{'background p95 s':>18}")
+    for name, limiter_rps, burst in scenarios:
+        r = await run(quota_rps, requests, limiter_rps, burst)
+        print(f"{name:<34}{r['served/s']:>10.1f}{r['errors']:>8}{r['429s']:>6}"
+              f"{r['interactive p95 s']:>19.2f}{r['background p95 s']:>18.2f}")
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        float(sys.argv[1]) if len(sys.argv) > 1 else 20,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+    ))
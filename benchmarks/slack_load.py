@@ -0,0 +1,275 @@
+#benchmarks/slack_load.py
+
+"""Replay synthetic app_mention events through the Slack handler at a chosen arrival pattern.
+
+Events go through the real Bolt app in server/slack_handler.py (dispatch,
+authorization, dedup, ingress queue, answer cache, workflow) as socket-mode
+requests. The app's Web API client points at a local stand-in for slack.com
+that records auth.test, chat.postMessage and chat.update instead of sending
+them. OpenAI and pgvector are replaced by the local fakes.
+
+Arrival patterns, all averaging --rate events per second:
+  steady   one event every 1/rate seconds
+  poisson  exponentially distributed gaps (independent users)
+  bursty   --burst events at once, every burst/rate seconds
+
+Each event mentions the bot in its own channel, so every Slack call can be tied
+back to the event that caused it. --ramp doubles the rate until p95 latency
+exceeds --slo or more than 1% of events fail, and reports the highest rate that
+held as the maximum sustainable events per second.
+
+Run: python -m benchmarks.slack_load [--pattern steady|poisson|bursty] [--rate 10] [--duration 10]
+                                     [--burst 20] [--llm-latency 0.3] [--slack-latency 0.02]
+                                     [--stream] [--ramp] [--slo 5]
+"""
+
+import os
+import sys
+
+# Add project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+import numpy as np
+from aiohttp import web
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "intent_examples.jsonl")
+
+# Replies the handler sends instead of an answer
+FAILURE_REPLIES = {
+    "rejected": "I'm handling a lot of requests right now",
+    "deadline": "couldn't get to your message in time",
+    "error": "An error occurred while processing your request",
+}
+
+class FakeSlackApi:
+    """Records Web API calls per channel and answers them like slack.com would."""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.calls = Counter()
+        self.messages = defaultdict(list)  # channel -> [(method, perf_counter, text)]
+        self._ts = itertools.count(1)
+        self.app = web.Application()
+        self.app.router.add_post("/api/{method}", self.handle)
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        if request.content_type == "application/json":
+            args = await request.json()
+        else:
+            args = dict(await request.post())
+        await asyncio.sleep(self.latency)
+        self.calls[method] += 1
+        if method == "auth.test":
+            return web.json_response({"ok": True, "url": "https://bench.slack.com/", "team": "Bench",
+                                      "user": "support-bot", "team_id": "T_BENCH", "user_id": "U_BOT",
+                                      "bot_id": "B_BOT"})
+        if method in ("chat.postMessage", "chat.update"):
+            channel = args.get("channel")
+            ts = args.get("ts") or f"{time.time():.6f}{next(self._ts) % 1000:03d}"
+            self.messages[channel].append((method, time.perf_counter(), args.get("text", "")))
+            return web.json_response({"ok": True, "channel": channel, "ts": ts, "message": {"text": args.get("text", "")}})
+        return web.json_response({"ok": False, "error": "unknown_method"})
+
+def arrivals(pattern: str, rate: float, duration: float, burst: int, rng: random.Random):
+    """Offsets in seconds from the start of the run at which events arrive"""
+    count = int(rate * duration)
+    if pattern == "steady":
+        return [i / rate for i in range(count)]
+    if pattern == "poisson":
+        return list(itertools.accumulate(rng.expovariate(rate) for _ in range(count)))
+    if pattern == "bursty":
+        return [(i // burst) * burst / rate for i in range(count)]
+    raise ValueError(f"Unknown arrival pattern {pattern!r}")
+
+def event_body(i: int, query: str) -> dict:
+    channel = f"C{i:07d}"
+    return {
+        "type": "event_callback",
+        "team_id": "T_BENCH",
+        "api_app_id": "A_BENCH",
+        "event_id": f"Ev{i:08d}",
+        "event_time": int(time.time()),
+        "event": {
+            "type": "app_mention",
+            "user": f"U{i % 200:04d}",
+            # A per-event suffix keeps the answer cache from short-circuiting the workflow
+            "text": f"<@U_BOT> {query} (ticket {i})",
+            "channel": channel,
+            "ts": f"{time.time():.6f}",
+            "event_ts": f"{time.time():.6f}",
+        },
+    }
+
+def outcome(messages) -> str:
+    if not messages:
+        return "missing"
+    final = messages[-1][2]
+    for name, marker in FAILURE_REPLIES.items():
+        if marker in final:
+            return name
+    return "ok"
+
+def percentiles(values) -> dict:
+    if not values:
+        return {k: float("nan") for k in ("p50", "p90", "p95", "p99", "max")}
+    return {
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p95": float(np.percentile(values, 95)),
+        "p99": float(np.percentile(values, 99)),
+        "max": max(values),
+    }
+
+async def run_load(handler, slack: FakeSlackApi, started: dict, pattern: str, rate: float, duration: float,
+                   burst: int, queries, offset: int, seed: int = 7) -> dict:
+    """Drive one run and collect per-event timings; `started` is filled by the process_message probe"""
+    from slack_bolt.request.async_request import AsyncBoltRequest
+
+    rng = random.Random(seed)
+    schedule = arrivals(pattern, rate, duration, burst, rng)
+    sent = {}
+    start = time.perf_counter()
+    for n, at in enumerate(schedule):
+        delay = start + at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        i = offset + n
+        body = event_body(i, queries[rng.randrange(len(queries))])
+        sent[body["event"]["channel"]] = time.perf_counter()
+        await handler.app.async_dispatch(AsyncBoltRequest(body=json.dumps(body), mode="socket_mode"))
+    arrival_span = time.perf_counter() - start
+
+    # Wait for the ingress queue to drain, bounded by the request deadline
+    from core.deadline import REQUEST_DEADLINE
+    give_up = time.perf_counter() + REQUEST_DEADLINE + 10
+    ingress = handler.ingress
+    while time.perf_counter() < give_up:
+        m = ingress.metrics()
+        idle = m["depth"] == 0 and m["processed"] + m["failed"] == m["submitted"]
+        if idle and all(channel in slack.messages for channel in sent):
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    latencies, first_replies, queueing = [], [], []
+    outcomes = Counter()
+    for channel, sent_at in sent.items():
+        messages = slack.messages.get(channel, [])
+        result = outcome(messages)
+        outcomes[result] += 1
+        if channel in started:
+            queueing.append(started[channel] - sent_at)
+        if result == "ok":
+            latencies.append(messages[-1][1] - sent_at)
+            first_replies.append(messages[0][1] - sent_at)
+    failed = sum(count for name, count in outcomes.items() if name != "ok")
+    return {
+        "rate": rate,
+        "events": len(sent),
+        "offered/s": len(sent) / arrival_span if arrival_span else float("inf"),
+        "completed/s": outcomes["ok"] / elapsed,
+        "latency": percentiles(latencies),
+        "first_reply": percentiles(first_replies),
+        "queueing": percentiles(queueing),
+        "outcomes": outcomes,
+        "error_rate": failed / len(sent) if sent else 0.0,
+    }
+
+def print_report(result: dict, slack: FakeSlackApi):
+    print(f"\n{result['events']} events offered at {result['offered/s']:.1f}/s, completed {result['completed/s']:.1f}/s")
+    print(f"{'seconds':<22}{'p50':>8}{'p90':>8}{'p95':>8}{'p99':>8}{'max':>8}")
+    for label, key in (("end-to-end", "latency"), ("first reply", "first_reply"), ("queueing delay", "queueing")):
+        p = result[key]
+        print(f"{label:<22}{p['p50']:>8.2f}{p['p90']:>8.2f}{p['p95']:>8.2f}{p['p99']:>8.2f}{p['max']:>8.2f}")
+    outcomes = ", ".join(f"{name} {count}" for name, count in sorted(result["outcomes"].items()))
+    print(f"outcomes: {outcomes}; error rate {result['error_rate']:.1%}")
+    print(f"Slack API calls: {dict(slack.calls)}")
+
+async def main(args):
+    os.environ["STREAM_RESPONSES"] = "true" if args.stream else "false"
+    os.environ.setdefault("SLACK_BOT_TOKEN", "xoxb-benchmark")
+    os.environ.setdefault("METRICS_PORT", "0")
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore, install_stub_services
+    install_stub_services()
+    import core.agents as agents
+    import server.slack_handler as handler
+    logging.getLogger().setLevel(logging.ERROR)
+
+    store = FakeVectorStore(latency=args.retrieval_latency)
+    agents.get_async_vector_store = lambda: store
+    agents.agent.llm = FakeChatModel(latency=args.llm_latency)
+    handler.answer_cache.embeddings = FakeEmbeddings(latency=0.01)
+    handler.answer_cache.version_fn = None
+
+    slack = FakeSlackApi(latency=args.slack_latency)
+    runner = web.AppRunner(slack.app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    handler.app.client.base_url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/api/"
+
+    # Queueing delay ends when a worker picks the event up and process_message starts
+    started = {}
+    process_message = handler.process_message
+
+    async def probed(event, say, deadline=None):
+        started[event["channel"]] = time.perf_counter()
+        await process_message(event, say, deadline)
+
+    handler.process_message = probed
+
+    with open(CORPUS) as f:
+        queries = [json.loads(line)["query"] for line in f if line.strip()]
+    handler.ingress.start()
+    print(f"pattern {args.pattern}, LLM {args.llm_latency * 1000:.0f}ms, Slack API {args.slack_latency * 1000:.0f}ms, "
+          f"ingress {handler.ingress.workers} workers / {handler.ingress.max_size} queued, "
+          f"streaming {'on' if args.stream else 'off'}")
+    try:
+        if not args.ramp:
+            result = await run_load(handler, slack, started, args.pattern, args.rate, args.duration, args.burst, queries, 0)
+            print_report(result, slack)
+            return
+
+        print(f"\n{'rate/s':>8}{'completed/s':>13}{'p50 s':>8}{'p95 s':>8}{'queue p95 s':>13}{'error rate':>12}")
+        rate, offset, sustainable = args.rate, 0, None
+        while rate <= args.max_rate:
+            result = await run_load(handler, slack, started, args.pattern, rate, args.duration, args.burst, queries, offset)
+            offset += result["events"]
+            held = result["latency"]["p95"] <= args.slo and result["error_rate"] <= 0.01
+            print(f"{rate:>8.1f}{result['completed/s']:>13.1f}{result['latency']['p50']:>8.2f}{result['latency']['p95']:>8.2f}"
+                  f"{result['queueing']['p95']:>13.2f}{result['error_rate']:>12.1%}{'' if held else '  <- over SLO'}")
+            if not held:
+                break
+            sustainable = rate
+            rate *= 2
+        if sustainable is None:
+            print(f"\nno tested rate met p95 <= {args.slo:.1f}s with <= 1% errors")
+        else:
+            print(f"\nmax sustainable: {sustainable:.1f} events/s (p95 <= {args.slo:.1f}s, <= 1% errors)")
+    finally:
+        await handler.ingress.stop(drain_timeout=1)
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pattern", choices=["steady", "poisson", "bursty"], default="steady")
+    parser.add_argument("--rate", type=float, default=10, help="average events per second (starting rate with --ramp)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of arrivals per run")
+    parser.add_argument("--burst", type=int, default=20, help="events per burst for --pattern bursty")
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--retrieval-latency", type=float, default=0.05)
+    parser.add_argument("--slack-latency", type=float, default=0.02)
+    parser.add_argument("--stream", action="store_true", help="stream answers with chat.update")
+    parser.add_argument("--ramp", action="store_true", help="double the rate until the SLO breaks")
+    parser.add_argument("--max-rate", type=float, default=1000)
+    parser.add_argument("--slo", type=float, default=5.0, help="p95 end-to-end seconds for --ramp")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+#benchmarks/startup.py
+
+"""Cold-start cost of the bot process.
+
+Each run starts a fresh interpreter, times `import server.slack_handler`, then
+times handling a first Slack event end to end with OpenAI and pgvector replaced
+by the local fakes. It also lists the service clients built by then, which
+should be none for a knowledge question now that they are built on first use.
+
+Run: python -m benchmarks.startup [runs] [--importtime]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUERY = "How do I sell on Amazon?"
+
+def child():
+    """Runs inside the fresh interpreter; prints one JSON line of timings."""
+    import time
+    start = time.perf_counter()
+    import server.slack_handler as handler
+    imported = time.perf_counter()
+
+    import asyncio
+    import core.agents as agents
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore
+    from server.services import service_registry
+
+    store = FakeVectorStore(latency=0)
+    agents.get_async_vector_store = lambda: store
+    agents.agent.llm = FakeChatModel(latency=0)
+    handler.answer_cache.embeddings = FakeEmbeddings(latency=0)
+    handler.answer_cache.version_fn = None
+    handler.bot_user_id = "U_BOT"
+    replies = []
+
+    async def say(text):
+        replies.append(text)
+
+    event = {"text": f"<@U_BOT> {QUERY}", "user": "U_BENCH", "ts": "1.0"}
+    ready = time.perf_counter()
+    asyncio.run(handler.process_message(event, say))
+    handled = time.perf_counter()
+    print(json.dumps({
+        "import_s": imported - start,
+        "first_event_s": handled - ready,
+        "total_s": handled - start,
+        "built": service_registry.built(),
+        "reply": replies[-1] if replies else None,
+    }))
+
+def run_child(extra_args=()) -> subprocess.CompletedProcess:
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        "SLACK_BOT_TOKEN": os.environ.get("SLACK_BOT_TOKEN", "xoxb-benchmark"),
+        "INTENT_ROUTER_ENABLED": "false",
+        "RATE_LIMIT_OPENAI_RPM": "0",
+        "RATE_LIMIT_OPENAI_TPM": "0",
+        "RATE_LIMIT_OPENAI_EMBEDDINGS_RPM": "0",
+        "RATE_LIMIT_OPENAI_EMBEDDINGS_TPM": "0",
+    }
+    result = subprocess.run(
+        [sys.executable, *extra_args, "-m", "benchmarks.startup", "--child"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"startup run failed:\n{result.stderr[-2000:]}")
+    return result
+
+def slowest_imports(stderr: str, top: int = 10):
+    """Top-level packages by cumulative import time from -X importtime output."""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        package = name.split(".")[0]
+        packages[package] = max(packages.get(package, 0), int(cumulative))
+    return sorted(packages.items(), key=lambda item: -item[1])[:top]
+
+def main(runs: int = 3, importtime: bool = False):
+    results = [json.loads(run_child().stdout.strip().splitlines()[-1]) for _ in range(runs)]
+    print(f"{runs} cold starts of server.slack_handler (medians)")
+    for key, label in (("import_s", "import"), ("first_event_s", "first event"), ("total_s", "total")):
+        print(f"  {label:<14}{statistics.median(r[key] for r in results) * 1000:>8.0f} ms")
+    print(f"  services built after first event: {', '.join(results[-1]['built']) or 'none'}")
+    print(f"  reply: {results[-1]['reply']}")
+    if importtime:
+        print("\nslowest top-level imports (cumulative ms)")
+        for package, micros in slowest_imports(run_child(["-X", "importtime"]).stderr):
+            print(f"  {package:<28}{micros / 1000:>8.0f}")
+
+if __name__ == "__main__":
+    if "--child" in sys.argv:
+        child()
+    else:
+        args = [a for a in sys.argv[1:] if not a.startswith("--")]
+        main(int(args[0]) if args else 3, "--importtime" in sys.argv)
@@ -0,0 +1,229 @@
+#benchmarks/workers.py
+
+"""Throughput of supervised Slack worker processes sharing state.
+
+A local dispatcher stands in for Slack: each worker process runs the real
+slack_handler (dedup, ingress queue, answer cache, workflow) with the local
+fakes for OpenAI and pgvector, pulls events the way a socket-mode connection
+receives them, and posts replies back. Some events are delivered a second time
+shortly after, as Slack does when an ack is slow, usually to another worker.
+
+Workers coordinate through SQLite by default; pass --backend postgres to use DB_URL.
+
+Run: python -m benchmarks.workers [events] [--workers 1,2,4] [--backend sqlite|postgres] [--llm-rpm N]
+"""
+
+import os
+import sys
+
+# Add project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import functools
+import json
+import logging
+import random
+import tempfile
+import time
+import uuid
+from collections import Counter, deque
+import aiohttp
+import numpy as np
+from aiohttp import web
+from server.supervisor import Supervisor
+
+LLM_LATENCY = 0.05
+RETRIEVAL_LATENCY = 0.02
+DUPLICATE_RATE = 0.1
+
+async def worker_main():
+    """Runs inside each supervised worker process."""
+    from benchmarks.fakes import FakeChatModel, FakeEmbeddings, FakeVectorStore, install_stub_services
+    install_stub_services()
+    import core.agents as agents
+    import server.slack_handler as handler
+    from core.tools import tool_cache
+    from server.rate_limiter import get_rate_limiter
+    from server.shared_state import close_shared_state
+    logging.getLogger().setLevel(logging.WARNING)
+
+    store = FakeVectorStore(latency=RETRIEVAL_LATENCY)
+    agents.get_async_vector_store = lambda: store
+    llm = agents.agent.llm = FakeChatModel(latency=LLM_LATENCY)
+    handler.answer_cache.embeddings = FakeEmbeddings(latency=0.005)
+    handler.answer_cache.version_fn = None
+    handler.bot_user_id = "U_BOT"
+    url = os.environ["BENCH_DISPATCHER_URL"]
+    worker = int(os.environ["WORKER_INDEX"])
+
+    async with aiohttp.ClientSession() as session:
+        async def say(event_id, text):
+            await session.post(f"{url}/reply", json={"event_id": event_id, "worker": worker, "text": text})
+
+        handler.ingress.start()
+        await session.post(f"{url}/ready")
+        while True:
+            # Only pull what the ingress pool can start on, so events aren't hoarded by one worker
+            room = handler.ingress.workers - handler.ingress.metrics()["depth"]
+            if room <= 0:
+                await asyncio.sleep(0.005)
+                continue
+            async with session.get(f"{url}/next", params={"n": room}) as response:
+                batch = await response.json()
+            if batch["done"]:
+                break
+            for body in batch["events"]:
+                await handler.handle_message(body, body["event"], functools.partial(say, body["event_id"]))
+            if not batch["events"]:
+                await asyncio.sleep(0.01)
+        await handler.ingress.stop()
+        await session.post(f"{url}/stats", json={
+            "worker": worker,
+            "llm_calls": llm.calls,
+            "dedup_skipped": handler.event_dedup.duplicates,
+            "answer_cache": handler.answer_cache.stats(),
+            "tool_cache": tool_cache.stats(),
+            "llm_limiter": get_rate_limiter("openai").stats(),
+        })
+    await close_shared_state()
+
+class Dispatcher:
+    """Hands out events once every worker is ready and records when each is answered."""
+
+    def __init__(self, bodies, workers: int):
+        self.queue = deque(bodies)
+        self.workers = workers
+        self.ready = 0
+        self.sent_at = {}
+        self.answered_at = {}
+        self.replies = Counter()
+        self.stats = []
+        self.started = None
+        self.app = web.Application()
+        self.app.router.add_post("/ready", self.on_ready)
+        self.app.router.add_get("/next", self.on_next)
+        self.app.router.add_post("/reply", self.on_reply)
+        self.app.router.add_post("/stats", self.on_stats)
+
+    async def on_ready(self, request):
+        self.ready += 1
+        return web.json_response({})
+
+    async def on_next(self, request):
+        if self.ready < self.workers:
+            return web.json_response({"events": [], "done": False})
+        if self.started is None:
+            self.started = time.perf_counter()
+        batch = [self.queue.popleft() for _ in range(min(int(request.query.get("n", 8)), len(self.queue)))]
+        for body in batch:
+            self.sent_at.setdefault(body["event_id"], time.perf_counter())
+        return web.json_response({"events": batch, "done": not batch and not self.queue})
+
+    async def on_reply(self, request):
+        reply = await request.json()
+        self.replies[reply["event_id"]] += 1
+        self.answered_at.setdefault(reply["event_id"], time.perf_counter())
+        return web.json_response({})
+
+    async def on_stats(self, request):
+        self.stats.append(await request.json())
+        return web.json_response({})
+
+def build_events(count: int, distinct: int, seed: int = 7, run_id: str = ""):
+    """Event bodies over `distinct` queries, with some delivered twice a few places apart"""
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "intent_examples.jsonl")) as f:
+        corpus = [json.loads(line)["query"] for line in f if line.strip()]
+    rng = random.Random(seed)
+    bodies = []
+    for i in range(count):
+        q = i % distinct
+        query = f"{corpus[q % len(corpus)]} (case {q})"
+        bodies.append({
+            "event_id": f"Ev{run_id}{i:06d}",
+            "event": {"text": f"<@U_BOT> {query}", "user": f"U{i % 50:03d}", "ts": f"{i}.0"},
+        })
+    for body in [b for b in bodies if rng.random() < DUPLICATE_RATE]:
+        position = bodies.index(body) + rng.randint(1, 20)
+        bodies.insert(min(position, len(bodies)), body)
+    return bodies
+
+async def run(workers: int, events: int, distinct: int, backend: str, llm_rpm: float) -> dict:
+    # Postgres keeps event claims between runs, so each run needs its own event ids
+    bodies = build_events(events, distinct, run_id=uuid.uuid4().hex[:8])
+    dispatcher = Dispatcher(bodies, workers)
+    runner = web.AppRunner(dispatcher.app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    state_dir = tempfile.mkdtemp(prefix="bot-shared-")
+    os.environ.update({
+        "BENCH_DISPATCHER_URL": f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}",
+        "SHARED_STATE_BACKEND": backend,
+        "SHARED_STATE_PATH": os.path.join(state_dir, "shared_state.sqlite3"),
+        "RATE_LIMIT_OPENAI_RPM": str(llm_rpm),
+        "RATE_LIMIT_BURST_SECONDS": "1",
+    })
+    supervisor = Supervisor("benchmarks.workers:worker_main", workers=workers)
+    supervisor.start()
+    try:
+        while len(dispatcher.stats) < workers:
+            await asyncio.sleep(0.1)
+    finally:
+        await asyncio.to_thread(supervisor.stop)
+        await runner.cleanup()
+
+    elapsed = max(dispatcher.answered_at.values()) - dispatcher.started
+    latencies = [dispatcher.answered_at[e] - dispatcher.sent_at[e] for e in dispatcher.answered_at]
+    unique = len({body["event_id"] for body in bodies})
+    llm_calls = sum(s["llm_calls"] for s in dispatcher.stats)
+    return {
+        "events/s": len(dispatcher.answered_at) / elapsed,
+        "p50 s": float(np.percentile(latencies, 50)),
+        "p95 s": float(np.percentile(latencies, 95)),
+        "answered": f"{len(dispatcher.answered_at)}/{unique}",
+        "double answers": sum(1 for count in dispatcher.replies.values() if count > 1),
+        "retries": len(bodies) - unique,
+        "answer hits": sum(s["answer_cache"]["hits"] for s in dispatcher.stats),
+        "llm calls/s": llm_calls / elapsed,
+        # Round trips to the shared store per LLM budget booking; leases keep this well below 1
+        "budget trips": (sum(s["llm_limiter"].get("budget_bookings", 0) for s in dispatcher.stats)
+                         / max(1, sum(s["llm_limiter"].get("budget_bookings", 0) + s["llm_limiter"].get("budget_local", 0)
+                                      for s in dispatcher.stats))),
+    }
+
+async def main(events: int, worker_counts, backend: str, llm_rpm: float):
+    distinct = max(1, events // 4)
+    os.environ.update({
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "benchmark"),
+        "SLACK_BOT_TOKEN": os.environ.get("SLACK_BOT_TOKEN", "xoxb-benchmark"),
+        "INTENT_ROUTER_ENABLED": "false",
+        "METRICS_PORT": "0",
+        # Enough concurrency per process that the CPU, not the pool, is the limit
+        "INGRESS_WORKERS": os.environ.get("INGRESS_WORKERS", "32"),
+        "INGRESS_QUEUE_SIZE": os.environ.get("INGRESS_QUEUE_SIZE", "256"),
+    })
+    print(f"{events} events over {distinct} distinct queries, ~{DUPLICATE_RATE:.0%} redelivered, "
+          f"{backend} shared state, {os.cpu_count()} CPUs"
+          + (f", shared LLM budget {llm_rpm / 60:.0f} req/s" if llm_rpm else ""))
+    print(f"{'workers':>8}{'events/s':>10}{'speedup':>9}{'p50 s':>8}{'p95 s':>8}{'answered':>10}"
+          f"{'retries':>9}{'double answers':>16}{'answer hits':>13}{'llm calls/s':>13}{'budget trips':>14}")
+    baseline = None
+    for workers in worker_counts:
+        r = await run(workers, events, distinct, backend, llm_rpm)
+        baseline = baseline or r["events/s"]
+        print(f"{workers:>8}{r['events/s']:>10.1f}{r['events/s'] / baseline:>8.2f}x{r['p50 s']:>8.2f}{r['p95 s']:>8.2f}"
+              f"{r['answered']:>10}{r['retries']:>9}{r['double answers']:>16}{r['answer hits']:>13}{r['llm calls/s']:>13.1f}"
+              f"{r['budget trips']:>14.2f}")
+
+def option(name: str, default: str) -> str:
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+if __name__ == "__main__":
+    positional = [a for i, a in enumerate(sys.argv[1:], 1) if not a.startswith("--") and not sys.argv[i - 1].startswith("--")]
+    asyncio.run(main(
+        int(positional[0]) if positional else 400,
+        [int(n) for n in option("--workers", "1,2,4").split(",")],
+        option("--backend", "sqlite"),
+        float(option("--llm-rpm", "0")),
+    ))
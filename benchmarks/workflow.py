@@ -0,0 +1,193 @@
+#benchmarks/workflow.py
+
+"""End-to-end benchmark of the compiled workflow against local stand-ins.
+
+Runs every query of a JSONL corpus through the workflow with fake chat and
+embedding models, stub tool services and an in-memory vector store, then
+reports per-node p50/p95/p99 latency, throughput at several concurrency
+levels and memory allocated per request. Results are saved as JSON keyed by
+the current commit so runs can be compared.
+
+Run: python -m benchmarks.workflow [corpus.jsonl] [--llm-latency=0.3] [--retrieval-latency=0.15]
+         [--tool-latency=0.1] [--concurrency=1,4,16,64] [--compare=benchmarks/results/<commit>.json]
+"""
+
+import os
+
+# Tool results would otherwise be served from cache after the first pass
+os.environ.setdefault("TOOL_CACHE_TTL_GET_WEATHER", "0")
+os.environ.setdefault("TOOL_CACHE_TTL_WEB_SEARCH", "0")
+
+import asyncio
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from collections import defaultdict
+from langchain_core.callbacks import AsyncCallbackHandler
+from benchmarks.fakes import build_agent
+
+CORPUS_PATH = os.path.join("data", "intent_examples.jsonl")
+RESULTS_DIR = os.path.join("benchmarks", "results")
+PERCENTILES = (50, 95, 99)
+
+class NodeTimer(AsyncCallbackHandler):
+    """Records wall time per LangGraph node from chain start/end callbacks."""
+
+    def __init__(self):
+        self.started = {}
+        self.timings = defaultdict(list)
+
+    async def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node is not None and kwargs.get("name") == node:
+            self.started[run_id] = (node, time.perf_counter())
+
+    async def on_chain_end(self, outputs, *, run_id, **kwargs):
+        started = self.started.pop(run_id, None)
+        if started is not None:
+            self.timings[started[0]].append((time.perf_counter() - started[1]) * 1000)
+
+    async def on_chain_error(self, error, *, run_id, **kwargs):
+        self.started.pop(run_id, None)
+
+def percentiles(values) -> dict:
+    if not values:
+        return {f"p{p}": 0.0 for p in PERCENTILES}
+    return {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+
+def load_corpus(path: str):
+    with open(path) as f:
+        return [json.loads(line)["query"] for line in f if line.strip()]
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def initial_state(query: str, i: int) -> dict:
+    return {"query": query, "user_id": f"U_BENCH{i % 8}"}
+
+async def run_level(workflow, queries, concurrency: int) -> dict:
+    """Push the whole corpus through the workflow with at most `concurrency` requests in flight."""
+    timer = NodeTimer()
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i, query):
+        nonlocal errors
+        async with slots:
+            start = time.perf_counter()
+            try:
+                await workflow.ainvoke(initial_state(query, i), config={"callbacks": [timer]})
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i, q) for i, q in enumerate(queries)))
+    elapsed = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": errors,
+        "throughput_rps": len(queries) / elapsed,
+        "latency_ms": percentiles(latencies),
+        "nodes_ms": {node: percentiles(values) for node, values in sorted(timer.timings.items())},
+    }
+
+async def measure_allocations(workflow, queries) -> dict:
+    """Mean traced bytes allocated at peak and retained after each request, run one at a time."""
+    tracemalloc.start()
+    peaks, retained = [], []
+    try:
+        for i, query in enumerate(queries):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            await workflow.ainvoke(initial_state(query, i))
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    return {"peak_kib": float(np.mean(peaks)) / 1024, "retained_kib": float(np.mean(retained)) / 1024}
+
+def print_report(report: dict, baseline: dict = None):
+    def delta(value, old):
+        return f" ({value - old:+.1f})" if old is not None else ""
+
+    base_levels = {level["concurrency"]: level for level in (baseline or {}).get("levels", [])}
+    print(f"commit {report['commit']}, {report['requests']} queries, latencies {report['latencies']}")
+    print(f"{'concurrency':>11}{'req/s':>16}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'errors':>8}")
+    for level in report["levels"]:
+        old = base_levels.get(level["concurrency"])
+        cells = [f"{level['throughput_rps']:.1f}{delta(level['throughput_rps'], old and old['throughput_rps'])}"]
+        for p in PERCENTILES:
+            value = level["latency_ms"][f"p{p}"]
+            cells.append(f"{value:.1f}{delta(value, old and old['latency_ms'][f'p{p}'])}")
+        print(f"{level['concurrency']:>11}" + "".join(f"{c:>18}" for c in cells)[2:] + f"{level['errors']:>8}")
+
+    first = report["levels"][0]
+    old_nodes = (base_levels.get(first["concurrency"]) or {}).get("nodes_ms", {})
+    print(f"\nper-node latency at concurrency {first['concurrency']}:")
+    print(f"{'node':<22}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}")
+    for node, values in first["nodes_ms"].items():
+        old = old_nodes.get(node)
+        cells = [f"{values[f'p{p}']:.1f}{delta(values[f'p{p}'], old and old[f'p{p}'])}" for p in PERCENTILES]
+        print(f"{node:<22}" + "".join(f"{c:>18}" for c in cells))
+
+    allocations = report["allocations"]
+    old = (baseline or {}).get("allocations", {})
+    print(
+        f"\nallocations per request: peak {allocations['peak_kib']:.1f} KiB{delta(allocations['peak_kib'], old.get('peak_kib'))}, "
+        f"retained {allocations['retained_kib']:.1f} KiB{delta(allocations['retained_kib'], old.get('retained_kib'))}"
+    )
+
+async def main(corpus_path: str, llm_latency: float, retrieval_latency: float, tool_latency: float,
+               levels, compare: str = None):
+    queries = load_corpus(corpus_path)
+    agent, _ = build_agent(llm_latency=llm_latency, retrieval_latency=retrieval_latency)
+    from server.services import get_service
+    for name in ("weather", "calendar", "web_search"):
+        get_service(name).latency = tool_latency
+    workflow = agent.workflow.compile()
+
+    # One untimed pass so imports, prompt compilation and first-call setup don't skew the numbers
+    await run_level(workflow, queries, max(levels))
+    report = {
+        "commit": current_commit(),
+        "corpus": corpus_path,
+        "requests": len(queries),
+        "latencies": {"llm": llm_latency, "retrieval": retrieval_latency, "tool": tool_latency},
+        "levels": [await run_level(workflow, queries, level) for level in levels],
+        "allocations": await measure_allocations(workflow, queries),
+    }
+
+    baseline = None
+    if compare:
+        with open(compare) as f:
+            baseline = json.load(f)
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{report['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print_report(report, baseline)
+    print(f"\nsaved {path}" + (f", compared with {compare}" if compare else ""))
+
+if __name__ == "__main__":
+    options = dict(arg[2:].split("=", 1) for arg in sys.argv[1:] if arg.startswith("--") and "=" in arg)
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    asyncio.run(main(
+        args[0] if args else CORPUS_PATH,
+        llm_latency=float(options.get("llm-latency", "0.3")),
+        retrieval_latency=float(options.get("retrieval-latency", "0.15")),
+        tool_latency=float(options.get("tool-latency", "0.1")),
+        levels=[int(level) for level in options.get("concurrency", "1,4,16,64").split(",")],
+        compare=options.get("compare"),
+    ))
@@ -1,19 +1,24 @@
 #core/agents.py
 from langgraph.graph import StateGraph, END
+from langgraph.config import get_config, get_stream_writer
 from typing import TypedDict, List, Optional
 from langchain_openai import ChatOpenAI
-from langchain.agents import create_tool_calling_agent
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.agents import AgentActionMessageLog, AgentFinish
-from langchain_core.messages import AIMessage
+from langchain_core.prompts import ChatPromptTemplate
 from .tools import SUPPORT_TOOLS, ToolExecutor, escalate_to_human
-from server.database import get_vector_store
+from server.database import get_async_vector_store, get_embeddings
+from server.metrics import metrics, current_trace_id
+from server.rate_limiter import get_rate_limiter, estimate_tokens
+from core.router import IntentRouter
 from core.evaluator import evaluate_response
+from core.deadline import GENERATION_RESERVE, stage_budget, record_miss
 from dotenv import load_dotenv
 import os
 import logging
 import asyncio
 import json
+import inspect
+import time
+import uuid
 from datetime import datetime, timedelta
 import pytz
 
@@ -31,6 +36,11 @@ class AgentState(TypedDict):
     tool_outputs: List[str]
     escalation_reason: Optional[str]
     tool_calls: Optional[List[dict]]
+    intent: Optional[str]
+    trace_id: Optional[str]
+    deadline: Optional[float]
+    # True only when generate_response produced the answer with the LLM (not a fallback or error text)
+    generated: bool
 
 # Helper function to merge updates into an existing state.
 def merge_state(old: AgentState, updates: dict) -> AgentState:
@@ -45,7 +55,11 @@ def merge_state(old: AgentState, updates: dict) -> AgentState:
        "needs_escalation": False,
        "tool_outputs": [],
        "escalation_reason": None,
-       "tool_calls": None
+       "tool_calls": None,
+       "intent": None,
+       "trace_id": None,
+       "deadline": None,
+       "generated": False
     }
     for key, value in defaults.items():
         if key not in new_state or new_state[key] is None:
@@ -53,25 +67,47 @@ def merge_state(old: AgentState, updates: dict) -> AgentState:
     return new_state
 
 class SupportAgent:
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3)
+    def __init__(self, parallel_intent: Optional[bool] = None):
+        # Fan-out mode: run retrieval speculatively alongside intent analysis
+        if parallel_intent is None:
+            parallel_intent = os.getenv("WORKFLOW_PARALLEL_INTENT", "true").lower() == "true"
+        self.parallel_intent = parallel_intent
+        # Retries, 429 backoff and concurrency are owned by the shared OpenAI rate limiter
+        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.3, stream_usage=True, max_retries=0)
+        self.llm_limiter = get_rate_limiter("openai")
+        self.expected_output_tokens = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "256"))
+        self.llm_timeout = float(os.getenv("LLM_TIMEOUT", "30"))
+        self.retrieval_timeout = float(os.getenv("RETRIEVAL_TIMEOUT", "5"))
+        # Emit answer tokens on the graph's "custom" stream as they arrive
+        self.stream_responses = os.getenv("STREAM_RESPONSES", "false").lower() == "true"
         self.tool_executor = ToolExecutor(SUPPORT_TOOLS)
+        # Local fast path for obvious intents; the LLM only sees what it can't resolve
+        self.router = None
+        if os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true":
+            self.router = IntentRouter.from_env(get_embeddings())
+        self.tool_semaphore = asyncio.Semaphore(int(os.getenv("TOOL_MAX_CONCURRENCY", "4")))
         self.workflow = StateGraph(AgentState)
         self._build_workflow()
 
     def _build_workflow(self):
-        self.workflow.add_node("init", self.initialize_state)
-        self.workflow.add_node("retrieve_context", self.retrieve_context)
-        self.workflow.add_node("analyze_intent", self.analyze_intent)
-        self.workflow.add_node("execute_tools", self.execute_tools)
-        self.workflow.add_node("generate_response", self.generate_response)
-        self.workflow.add_node("evaluate_escalation", self.evaluate_escalation)
-        self.workflow.add_node("escalate", self.escalate)
+        self.workflow.add_node("init", self._instrument("init", self.initialize_state))
+        if self.parallel_intent:
+            self.workflow.add_node("analyze_intent", self._instrument("analyze_intent", self.retrieve_and_analyze))
+        else:
+            self.workflow.add_node("retrieve_context", self._instrument("retrieve_context", self.retrieve_context))
+            self.workflow.add_node("analyze_intent", self._instrument("analyze_intent", self.analyze_intent))
+        self.workflow.add_node("execute_tools", self._instrument("execute_tools", self.execute_tools))
+        self.workflow.add_node("generate_response", self._instrument("generate_response", self.generate_response))
+        self.workflow.add_node("evaluate_escalation", self._instrument("evaluate_escalation", self.evaluate_escalation))
+        self.workflow.add_node("escalate", self._instrument("escalate", self.escalate))
 
         # Set up the workflow edges
         self.workflow.set_entry_point("init")
-        self.workflow.add_edge("init", "retrieve_context")
-        self.workflow.add_edge("retrieve_context", "analyze_intent")
+        if self.parallel_intent:
+            self.workflow.add_edge("init", "analyze_intent")
+        else:
+            self.workflow.add_edge("init", "retrieve_context")
+            self.workflow.add_edge("retrieve_context", "analyze_intent")
         
         # Add conditional edges from analyze_intent
         self.workflow.add_conditional_edges(
@@ -94,6 +130,40 @@ class SupportAgent:
         )
         self.workflow.add_edge("escalate", END)
 
+    def compile(self, checkpointer=None):
+        """Compile the workflow, optionally checkpointing every node into checkpointer."""
+        return self.workflow.compile(checkpointer=checkpointer)
+
+    def _instrument(self, name: str, node):
+        """Time a graph node and expose the request's trace id to everything it calls."""
+        if inspect.iscoroutinefunction(node):
+            async def run(state: AgentState) -> AgentState:
+                token = current_trace_id.set(state.get("trace_id") or uuid.uuid4().hex)
+                try:
+                    with metrics.timer("node_seconds", node=name):
+                        return await node(state)
+                finally:
+                    current_trace_id.reset(token)
+        else:
+            def run(state: AgentState) -> AgentState:
+                token = current_trace_id.set(state.get("trace_id") or uuid.uuid4().hex)
+                try:
+                    with metrics.timer("node_seconds", node=name):
+                        return node(state)
+                finally:
+                    current_trace_id.reset(token)
+        run.__name__ = name
+        return run
+
+    def _booked_tokens(self, messages) -> int:
+        """Tokens to reserve before a call; reconciled against the reported usage afterwards."""
+        return estimate_tokens(messages.to_string()) + self.expected_output_tokens
+
+    def _record_usage(self, usage: Optional[dict]):
+        if usage:
+            metrics.inc("openai_tokens_total", usage.get("input_tokens", 0), type="input")
+            metrics.inc("openai_tokens_total", usage.get("output_tokens", 0), type="output")
+
     def initialize_state(self, state: AgentState) -> AgentState:
         updates = {
             "intermediate_steps": [],
@@ -104,27 +174,116 @@ class SupportAgent:
             "needs_escalation": False,
             "tool_outputs": [],
             "escalation_reason": None,
-            "tool_calls": None
+            "tool_calls": None,
+            "intent": None,
+            "trace_id": state.get("trace_id") or current_trace_id.get() or uuid.uuid4().hex,
+            "generated": False
         }
         new_state = merge_state(state, updates)
         logger.info(f"Initialized state: {new_state}")
         return new_state
 
     async def retrieve_context(self, state: AgentState) -> AgentState:
+        timeout = stage_budget(state, self.retrieval_timeout, reserve=GENERATION_RESERVE)
+        if timeout is None:
+            record_miss("retrieve_context")
+            return merge_state(state, {"context": []})
         try:
-            store = get_vector_store()
-            # Run the blocking similarity search in a separate thread.
-            docs = await asyncio.to_thread(lambda query: store.similarity_search(query, k=3), state["query"])
+            store = get_async_vector_store()
+            with metrics.timer("vector_search_seconds", backend=type(store).__name__):
+                docs = await asyncio.wait_for(store.asimilarity_search(state["query"], k=3), timeout=timeout)
             context = [f"{d.metadata.get('source', '')}: {d.page_content}" for d in docs]
             logger.info(f"Retrieved {len(context)} context items.")
             return merge_state(state, {"context": context})
+        except asyncio.TimeoutError:
+            record_miss("retrieve_context")
+            return merge_state(state, {"context": []})
         except Exception as e:
             logger.error(f"Vector search error: {str(e)}")
             return merge_state(state, {"context": []})
 
-    def analyze_intent(self, state: AgentState) -> AgentState:
+    async def retrieve_and_analyze(self, state: AgentState) -> AgentState:
+        """Classify intent while retrieval runs; keep the context only for RAG queries."""
+        retrieval = asyncio.create_task(self.retrieve_context(state))
+        try:
+            new_state = await self.analyze_intent(state)
+        except BaseException:
+            retrieval.cancel()
+            raise
+
+        # A failed classification (no intent) falls through to generate_response, which can use context
+        if new_state.get("intent") in (None, "rag"):
+            retrieved = await retrieval
+            return merge_state(new_state, {"context": retrieved["context"]})
+
+        retrieval.cancel()
+        logger.info(f"Dropped speculative retrieval for intent: {new_state.get('intent')}")
+        return new_state
+
+    async def _call_llm(self, messages, timeout: Optional[float] = None):
+        """Invoke the chat model through the OpenAI rate limiter with a per-call timeout.
+
+        timeout, when given, bounds the whole call including time queued in the limiter.
+        """
+        async def invoke():
+            with metrics.timer("provider_request_seconds", provider="openai", operation="chat"):
+                return await asyncio.wait_for(self.llm.ainvoke(messages), timeout=self.llm_timeout)
+
+        response = await asyncio.wait_for(self.llm_limiter.call(
+            invoke,
+            tokens=self._booked_tokens(messages),
+            usage=lambda r: (getattr(r, "usage_metadata", None) or {}).get("total_tokens")
+        ), timeout=timeout)
+        self._record_usage(getattr(response, "usage_metadata", None))
+        return response
+
+    async def _stream_llm(self, messages, timeout: Optional[float] = None) -> str:
+        """Stream the chat model, forwarding each token to the graph's custom stream."""
+        writer = get_stream_writer()
+
+        async def consume(permit):
+            parts = []
+            first_token = None
+            async for chunk in self.llm.astream(messages):
+                if chunk.content:
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                        metrics.observe("openai_first_token_seconds", first_token - start)
+                    parts.append(chunk.content)
+                    writer({"token": chunk.content})
+                # With stream_usage the final chunk carries the token counts
+                usage = getattr(chunk, "usage_metadata", None)
+                if usage:
+                    self._record_usage(usage)
+                    permit.tokens_used = usage.get("total_tokens")
+            return "".join(parts)
+
+        async def run():
+            # Not retried: tokens may already be on their way to Slack
+            nonlocal start
+            async with self.llm_limiter.slot(tokens=self._booked_tokens(messages)) as permit:
+                start = time.perf_counter()
+                with metrics.timer("provider_request_seconds", provider="openai", operation="chat_stream"):
+                    return await asyncio.wait_for(consume(permit), timeout=self.llm_timeout)
+
+        start = time.perf_counter()
+        return await asyncio.wait_for(run(), timeout=timeout)
+
+    async def analyze_intent(self, state: AgentState) -> AgentState:
         try:
             new_state = merge_state(state, {})
+            if self.router is not None:
+                routed = await self.router.route(new_state["query"])
+                if routed is not None:
+                    logger.info(f"Intent resolved locally: {routed}")
+                    return self._apply_intent(new_state, routed)
+
+            timeout = stage_budget(new_state, self.llm_timeout, reserve=GENERATION_RESERVE)
+            if timeout is None:
+                # Unclassified queries fall through to generate_response with whatever context arrives
+                record_miss("analyze_intent")
+                return new_state
+
             current_time = datetime.now(pytz.UTC)
             tomorrow = current_time + timedelta(days=1)
             
@@ -153,6 +312,9 @@ For escalation:
 For general conversation:
 {{"action": "direct", "response": "<YOUR_RESPONSE>"}}
 
+For queries that need several independent tools at once:
+{{"action": "tools", "tool_calls": [{{"tool_name": "<TOOL_NAME>", "tool_args": {{...}}}}, ...]}}
+
 Current time (PKT): {current_time}
 Tomorrow (PKT): {tomorrow}
 
@@ -164,10 +326,11 @@ RESPOND WITH VALID JSON ONLY. NO OTHER TEXT."""),
             )
 
             logger.info(f"Processing query: {new_state['query']}")
-            response = self.llm.invoke(
+            response = await self._call_llm(
                 prompt.invoke({
                     "query": new_state["query"]
-                })
+                }),
+                timeout=timeout
             )
 
             try:
@@ -182,36 +345,7 @@ RESPOND WITH VALID JSON ONLY. NO OTHER TEXT."""),
                 logger.info(f"Raw LLM response: {content}")
                 parsed = json.loads(content)
                 logger.info(f"Parsed intent: {parsed}")
-
-                if parsed["action"] == "tool":
-                    if parsed["tool_name"] == "schedule_event":
-                        start_time = parsed["tool_args"].get("start_time", "")
-                        if not start_time.endswith('Z'):
-                            local_tz = pytz.timezone('Asia/Karachi')
-                            local_dt = datetime.fromisoformat(start_time)
-                            if local_dt.tzinfo is None:
-                                local_dt = local_tz.localize(local_dt)
-                            utc_dt = local_dt.astimezone(pytz.UTC)
-                            parsed["tool_args"]["start_time"] = utc_dt.isoformat()
-
-                    new_state["tool_calls"] = [{
-                        "name": parsed["tool_name"],
-                        "args": parsed["tool_args"]
-                    }]
-                    logger.info(f"Tool call configured: {parsed['tool_name']}")
-                    
-                elif parsed["action"] == "escalate":
-                    new_state["needs_escalation"] = True
-                    new_state["escalation_reason"] = parsed.get("reason")
-                    logger.info(f"Escalation needed: {parsed.get('reason')}")
-                    
-                elif parsed["action"] == "rag":
-                    new_state["response"] = "Let me search our documentation..."
-                    
-                else:
-                    new_state["response"] = parsed.get("response", "")
-
-                return new_state
+                return self._apply_intent(new_state, parsed)
 
             except json.JSONDecodeError as e:
                 logger.error(f"JSON parsing error: {str(e)}")
@@ -220,10 +354,51 @@ RESPOND WITH VALID JSON ONLY. NO OTHER TEXT."""),
                 new_state["escalation_reason"] = "Failed to parse response"
                 return new_state
 
+        except asyncio.TimeoutError:
+            logger.error("Intent analysis timed out")
+            record_miss("analyze_intent")
+            return state
         except Exception as e:
             logger.error(f"Intent analysis failed: {str(e)}")
             return state
 
+    def _apply_intent(self, new_state: AgentState, parsed: dict) -> AgentState:
+        """Apply a classified intent (from the router or the LLM) to the state."""
+        new_state["intent"] = parsed["tool_name"] if parsed["action"] == "tool" else parsed["action"]
+
+        if parsed["action"] in ("tool", "tools"):
+            requested = parsed["tool_calls"] if parsed["action"] == "tools" else [parsed]
+            new_state["tool_calls"] = []
+            for call in requested:
+                if call["tool_name"] == "schedule_event":
+                    start_time = call["tool_args"].get("start_time", "")
+                    if not start_time.endswith('Z'):
+                        local_tz = pytz.timezone('Asia/Karachi')
+                        local_dt = datetime.fromisoformat(start_time)
+                        if local_dt.tzinfo is None:
+                            local_dt = local_tz.localize(local_dt)
+                        utc_dt = local_dt.astimezone(pytz.UTC)
+                        call["tool_args"]["start_time"] = utc_dt.isoformat()
+
+                new_state["tool_calls"].append({
+                    "name": call["tool_name"],
+                    "args": call["tool_args"]
+                })
+            logger.info(f"Tool calls configured: {[c['name'] for c in new_state['tool_calls']]}")
+            
+        elif parsed["action"] == "escalate":
+            new_state["needs_escalation"] = True
+            new_state["escalation_reason"] = parsed.get("reason")
+            logger.info(f"Escalation needed: {parsed.get('reason')}")
+            
+        elif parsed["action"] == "rag":
+            new_state["response"] = "Let me search our documentation..."
+            
+        else:
+            new_state["response"] = parsed.get("response", "")
+
+        return new_state
+
     def decide_next_step(self, state: AgentState) -> str:
         """Determine the next step based on the current state."""
         if state.get("needs_escalation"):
@@ -236,29 +411,56 @@ RESPOND WITH VALID JSON ONLY. NO OTHER TEXT."""),
         return "direct_response"
 
     async def execute_tools(self, state: AgentState) -> AgentState:
-        """Execute tool calls and update state with results."""
+        """Execute tool calls concurrently and update state with results."""
         new_state = state.copy()
-        outputs = []
-        
-        try:
-            for tool_call in new_state.get("tool_calls", []):
+
+        async def run(tool_call):
+            async with self.tool_semaphore:
                 logger.info(f"Executing tool: {tool_call['name']}")
-                output = await self.tool_executor.execute(
-                    tool_call["name"],
-                    tool_call["args"]
-                )
-                outputs.append(f"{tool_call['name']}: {output}")
-                logger.info(f"Tool execution successful: {output}")
-            
-            new_state["tool_outputs"] = outputs
-        except Exception as e:
-            logger.error(f"Tool execution failed: {str(e)}")
-            new_state["tool_outputs"] = [f"Error processing request: {str(e)}"]
-        
+                return await self.tool_executor.execute(tool_call["name"], tool_call["args"], deadline=deadline)
+
+        # Tools must finish in time to leave generate_response its reserve
+        deadline = state["deadline"] - GENERATION_RESERVE if state.get("deadline") else None
+        tool_calls = new_state.get("tool_calls") or []
+        results = await asyncio.gather(*(run(call) for call in tool_calls), return_exceptions=True)
+
+        # Timeouts and failures come back as messages, so partial results still reach the response
+        outputs = []
+        for tool_call, result in zip(tool_calls, results):
+            if isinstance(result, Exception):
+                logger.error(f"Tool execution failed: {str(result)}")
+                result = f"Error processing request: {str(result)}"
+            outputs.append(f"{tool_call['name']}: {result}")
+        new_state["tool_outputs"] = outputs
+        logger.info(f"Executed {len(outputs)} tool call(s)")
+        return new_state
+
+    def _fallback_response(self, new_state: AgentState) -> AgentState:
+        """Best answer without the LLM: raw tool results or the top document, else hand off to a human."""
+        if new_state.get("tool_outputs"):
+            new_state["response"] = "Here's what I found so far:\n" + "\n".join(new_state["tool_outputs"])
+        elif new_state.get("context"):
+            new_state["response"] = "This part of our documentation should help:\n" + new_state["context"][0][:1000]
+        else:
+            new_state["response"] = "I'm sorry, this is taking longer than expected. I'm passing your question to our support team. 🙏"
+            new_state["needs_escalation"] = True
+            new_state["escalation_reason"] = "Deadline exceeded"
         return new_state
 
-    def generate_response(self, state: AgentState) -> AgentState:
+    def _retry_pending(self) -> bool:
+        """True when ResumableWorkflow will rerun a failed generation from its checkpoint"""
+        try:
+            return bool(get_config().get("configurable", {}).get("retry_pending"))
+        except RuntimeError:
+            # Called outside a graph run
+            return False
+
+    async def generate_response(self, state: AgentState) -> AgentState:
         new_state = state.copy()
+        timeout = stage_budget(new_state, self.llm_timeout)
+        if timeout is None:
+            record_miss("generate_response")
+            return self._fallback_response(new_state)
         try:
             # Prepare prompt with context and tool outputs
             prompt = ChatPromptTemplate.from_messages([
@@ -275,20 +477,34 @@ RESPOND WITH VALID JSON ONLY. NO OTHER TEXT."""),
                 "tool_outputs": "\n".join(new_state["tool_outputs"]) if new_state["tool_outputs"] else "No tool outputs"
             })
 
-            new_state["response"] = self.llm.invoke(response).content
+            if self.stream_responses:
+                new_state["response"] = await self._stream_llm(response, timeout=timeout)
+            else:
+                new_state["response"] = (await self._call_llm(response, timeout=timeout)).content
+            new_state["generated"] = True
             logger.info("Generated response successfully")
+        except asyncio.TimeoutError:
+            logger.error(f"Response generation timed out after {timeout:.1f}s")
+            record_miss("generate_response")
+            return self._fallback_response(new_state)
         except Exception as e:
             logger.error(f"Response generation failed: {str(e)}")
+            if self._retry_pending():
+                raise
             new_state["response"] = "I apologize, but I'm having trouble generating a response. 😅"
         return new_state
 
     def evaluate_escalation(self, state: AgentState) -> AgentState:
         # Use dynamic evaluation based on the query and generated response.
         eval_result = evaluate_response(state["query"], state["response"])
-        update = {
-            "needs_escalation": eval_result.needs_escalation,
-            "escalation_reason": "High urgency" if eval_result.needs_escalation else None
-        }
+        if state.get("needs_escalation"):
+            # Already handed off by generate_response (e.g. the deadline ran out)
+            update = {}
+        else:
+            update = {
+                "needs_escalation": eval_result.needs_escalation,
+                "escalation_reason": "High urgency" if eval_result.needs_escalation else None
+            }
         new_state = merge_state(state, update)
         logger.info(f"Evaluation complete. Needs escalation: {new_state['needs_escalation']}")
         return new_state
@@ -0,0 +1,40 @@
+#core/deadline.py
+
+from typing import Optional
+from server.metrics import metrics
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Wall-clock seconds from acknowledging a Slack event to posting the answer
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "20"))
+# Time held back for generate_response while earlier stages run
+GENERATION_RESERVE = float(os.getenv("DEADLINE_GENERATION_RESERVE", "4"))
+# A stage with less than this left is skipped rather than started
+MIN_STAGE_BUDGET = float(os.getenv("DEADLINE_MIN_STAGE_BUDGET", "0.25"))
+
+def new_deadline(seconds: Optional[float] = None) -> float:
+    """Absolute deadline (epoch seconds), so it survives being stored in AgentState"""
+    return time.time() + (REQUEST_DEADLINE if seconds is None else seconds)
+
+def remaining(state) -> Optional[float]:
+    """Seconds left before the request's deadline, or None when it has no deadline"""
+    deadline = state.get("deadline")
+    return None if deadline is None else deadline - time.time()
+
+def stage_budget(state, cap: float, reserve: float = 0.0) -> Optional[float]:
+    """Timeout for a stage: cap, shortened to fit the deadline less a reserve for later stages.
+
+    Returns None when the stage should be skipped because the remaining time is too short.
+    """
+    left = remaining(state)
+    if left is None:
+        return cap
+    budget = min(cap, left - reserve)
+    return budget if budget >= MIN_STAGE_BUDGET else None
+
+def record_miss(stage: str):
+    metrics.inc("deadline_miss_total", stage=stage)
+    logger.warning(f"Deadline: {stage} skipped or cut short")
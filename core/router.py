@@ -0,0 +1,254 @@
+#core/router.py
+
+import sys
+import os
+
+# Add project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collections import Counter
+from typing import List, Optional
+import asyncio
+import json
+import logging
+import re
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+EXAMPLES_PATH = os.path.join(DATA_DIR, "intent_examples.jsonl")
+# Labelled queries the centroids are not fit on; "multi" marks queries with several intents
+HOLDOUT_PATH = os.path.join(DATA_DIR, "intent_holdout.jsonl")
+
+# Keywords that point at an intent. A query showing more than one is multi-intent and
+# goes to the LLM, which can return several tool calls; one that shows an intent the
+# strict patterns below can't fully parse also goes to the LLM.
+INTENT_SIGNALS = {
+    "get_weather": re.compile(r"\b(?:weather|temperature|forecast|rain(?:ing)?|snow(?:ing)?)\b", re.IGNORECASE),
+    "schedule_event": re.compile(
+        r"\b(?:schedule|book|meeting|appointment|calendar|remind(?:er)?|call with)\b", re.IGNORECASE
+    ),
+    "web_search": re.compile(r"\b(?:search|google|look up|latest|news|today's)\b", re.IGNORECASE),
+    "check_order_status": re.compile(
+        r"\border\s*(?:#|number|no\.?|id)?\s*\d+|\b(?:track|tracking)\b|\bstatus of (?:my |an |the )?order\b",
+        re.IGNORECASE
+    ),
+    "escalate": re.compile(
+        r"\b(?:human|person|someone|representative|agent|manager|supervisor|complaint|support staff)\b",
+        re.IGNORECASE
+    ),
+}
+# Whole-query patterns: a rule only fires when the query is nothing but the request
+WEATHER_PATTERN = re.compile(
+    r"^(?:(?:what(?:'s| is)|how(?:'s| is)|tell me|show me|get|check)\s+)?(?:the\s+)?(?:current\s+)?"
+    r"(?:weather|temperature|forecast)(?:\s+like)?\s+(?:in|for|at)\s+"
+    r"(?P<city>[a-z][a-z.'-]*(?:\s+[a-z][a-z.'-]*){0,2}?)"
+    r"(?:\s+(?:today|now|right now|tomorrow|this week))?\s*[?.!]*$",
+    re.IGNORECASE
+)
+# Words that never name a city; their presence means the pattern swallowed part of a sentence
+NOT_CITY_WORDS = {
+    "which", "what", "where", "when", "who", "how", "the", "my", "our", "your", "and", "also", "or", "of",
+    "for", "in", "at", "to", "with", "is", "are", "it", "this", "that", "me", "please",
+}
+ESCALATE_TARGET = r"(?:a |an |your |some(?:one)? )?(?:human|real person|person|someone|agent|live agent|representative|manager|supervisor|support staff)"
+ESCALATE_PATTERN = re.compile(
+    # An optional complaint clause first: "This is unacceptable, I need your manager"
+    r"^(?:[^.?!,]{0,60}[.!,]\s*)?(?:please\s+)?(?:"
+    rf"(?:i(?: want| need| would like|'d like) to |let me |can i |could i |may i )?(?:talk|speak|chat) (?:to|with) {ESCALATE_TARGET}"
+    rf"|(?:(?:can|could|would) you )?(?:get|connect|transfer|put) me (?:through )?(?:to |with )?{ESCALATE_TARGET}"
+    rf"|i (?:want|need) {ESCALATE_TARGET}"
+    r")(?:,? (?:please|now|right now))*\s*[?.!]*$",
+    re.IGNORECASE
+)
+SMALL_TALK_WORDS = {
+    "hi", "hello", "hey", "yo", "there", "thanks", "thank", "thx", "you", "so", "much", "good", "morning",
+    "afternoon", "evening", "how", "are", "doing", "today", "bye", "goodbye", "ok", "okay", "cool", "great",
+    "nice", "awesome", "bot", "buddy", "friend", "whats", "what's", "up", "sup",
+}
+RAG_PATTERN = re.compile(
+    r"\b(?:sell(?:ing|er)?|amazon|listing|fba|product|fees?|policy|policies|guidelines?|category|categories|account)\b",
+    re.IGNORECASE
+)
+# Catalogue keywords only mean rag in a how-to or policy question; "Cancel my account" or
+# "Tell me a joke about amazon" mention them too
+RAG_QUESTION_PATTERN = re.compile(
+    r"^(?:how (?:do|does|can|long|much|many|to|should)|what(?:'s| is| are| does| do| happens| documents| kind)"
+    r"|which|can (?:i|we)|are there|is there|is it|do (?:i|we)|does|should (?:i|we)|when (?:do|does|can|will))\b",
+    re.IGNORECASE
+)
+# Questions about the asker's own records need their data, not the documentation
+PERSONAL_PATTERN = re.compile(r"^(?:what(?:'s| is| are)|where(?:'s| is| are)) (?:my|our)\b", re.IGNORECASE)
+# Intents the centroid classifier may resolve on its own; tool intents need arguments
+CENTROID_INTENTS = {"rag", "escalate", "direct"}
+
+def load_examples(path: str) -> List[dict]:
+    """Read labelled {"query", "intent"} lines from a JSONL file."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def intent_signals(text: str) -> set:
+    """Intents whose keywords appear in text"""
+    return {intent for intent, pattern in INTENT_SIGNALS.items() if pattern.search(text)}
+
+class IntentRouter:
+    """Resolves obvious intents locally so only ambiguous queries pay for the LLM call."""
+
+    def __init__(self, embeddings=None, examples: Optional[List[dict]] = None, threshold: float = 0.08,
+                 min_similarity: float = 0.5):
+        self.embeddings = embeddings
+        self.examples = examples or []
+        self.threshold = threshold
+        self.min_similarity = min_similarity
+        self.labels: List[str] = []
+        self.centroids = None
+        self._training = None
+        self.counts = Counter()
+
+    @classmethod
+    def from_env(cls, embeddings=None):
+        path = os.getenv("INTENT_ROUTER_EXAMPLES", EXAMPLES_PATH)
+        examples = load_examples(path) if os.path.exists(path) else []
+        return cls(
+            embeddings,
+            examples,
+            threshold=float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.08")),
+            min_similarity=float(os.getenv("INTENT_ROUTER_MIN_SIMILARITY", "0.5")),
+        )
+
+    def match_rules(self, query: str) -> Optional[dict]:
+        """Keyword and pattern rules; returns an intent in the LLM's JSON format."""
+        text = query.strip()
+        signals = intent_signals(text)
+        if len(signals) > 1:
+            return None
+        if "get_weather" in signals:
+            weather = WEATHER_PATTERN.match(text)
+            city = weather.group("city").strip() if weather else ""
+            if not city or set(city.lower().split()) & NOT_CITY_WORDS:
+                return None
+            return {"action": "tool", "tool_name": "get_weather", "tool_args": {"city": city.title()}}
+        if "escalate" in signals:
+            if ESCALATE_PATTERN.match(text):
+                return {"action": "escalate", "reason": "User asked for a human agent"}
+            return None
+        if signals:
+            # Scheduling, searches and order lookups need arguments only the LLM extracts
+            return None
+        words = re.findall(r"[a-z']+", text.lower())
+        if words and all(word in SMALL_TALK_WORDS for word in words):
+            return {"action": "direct", "response": ""}
+        if RAG_QUESTION_PATTERN.match(text) and not PERSONAL_PATTERN.match(text) and RAG_PATTERN.search(text):
+            return {"action": "rag", "context_needed": True}
+        return None
+
+    async def train(self):
+        """Embed the labelled examples and build one normalized centroid per intent."""
+        examples = [e for e in self.examples if e["intent"] in CENTROID_INTENTS]
+        if self.embeddings is None or not examples:
+            return
+        vectors = np.asarray(await self.embeddings.aembed_documents([e["query"] for e in examples]), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        labels = sorted({e["intent"] for e in examples})
+        centroids = np.stack([
+            vectors[[i for i, e in enumerate(examples) if e["intent"] == label]].mean(axis=0)
+            for label in labels
+        ])
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+        self.labels = labels
+        logger.info(f"Intent router trained on {len(examples)} examples: {labels}")
+
+    async def match_centroid(self, query: str) -> Optional[dict]:
+        if self.embeddings is None or not self.examples:
+            return None
+        if self._training is None:
+            self._training = asyncio.ensure_future(self.train())
+        await self._training
+        if self.centroids is None:
+            return None
+        vector = np.asarray(await self.embeddings.aembed_query(query), dtype=np.float32)
+        scores = self.centroids @ (vector / np.linalg.norm(vector))
+        order = np.argsort(scores)[::-1]
+        best = scores[order[0]]
+        margin = best - scores[order[1]] if len(order) > 1 else best
+        if best < self.min_similarity or margin < self.threshold:
+            return None
+        intent = self.labels[order[0]]
+        if intent == "escalate":
+            return {"action": "escalate", "reason": "User asked for a human agent"}
+        if intent == "rag":
+            return {"action": "rag", "context_needed": True}
+        return {"action": "direct", "response": ""}
+
+    async def route(self, query: str) -> Optional[dict]:
+        """Return a confident intent, or None to fall back to the LLM classifier."""
+        parsed = self.match_rules(query)
+        source = "rules"
+        # The centroids only know rag, escalate and direct; a query that hinted at anything else goes to the LLM
+        if parsed is None and not intent_signals(query):
+            try:
+                parsed = await self.match_centroid(query)
+            except Exception as e:
+                logger.error(f"Intent centroid match failed: {str(e)}")
+                parsed = None
+            source = "centroid"
+        self.counts[source if parsed is not None else "llm"] += 1
+        return parsed
+
+    def stats(self) -> dict:
+        total = sum(self.counts.values())
+        handled = self.counts["rules"] + self.counts["centroid"]
+        return {
+            "total": total,
+            "rules": self.counts["rules"],
+            "centroid": self.counts["centroid"],
+            "llm": self.counts["llm"],
+            "handled_fraction": handled / total if total else 0.0,
+        }
+
+def intent_of(parsed: dict) -> str:
+    return parsed["tool_name"] if parsed["action"] == "tool" else parsed["action"]
+
+async def evaluate(path: str, use_embeddings: bool = True) -> dict:
+    """Coverage and accuracy of the router against a labelled JSONL file it was not fit on."""
+    if os.path.abspath(path) == os.path.abspath(os.getenv("INTENT_ROUTER_EXAMPLES", EXAMPLES_PATH)):
+        logger.warning(f"Evaluating on the router's own training examples ({path}); accuracy will be inflated")
+    embeddings = None
+    if use_embeddings:
+        from server.database import get_embeddings
+        embeddings = get_embeddings()
+    router = IntentRouter.from_env(embeddings)
+    labelled = load_examples(path)
+    correct = 0
+    mistakes = []
+    rule_seconds = 0.0
+    for example in labelled:
+        start = time.perf_counter()
+        rules_before = router.counts["rules"]
+        parsed = await router.route(example["query"])
+        if router.counts["rules"] > rules_before:
+            rule_seconds += time.perf_counter() - start
+        if parsed is None:
+            continue
+        if intent_of(parsed) == example["intent"]:
+            correct += 1
+        else:
+            mistakes.append({"query": example["query"], "expected": example["intent"], "got": intent_of(parsed)})
+    stats = router.stats()
+    handled = stats["rules"] + stats["centroid"]
+    return {
+        **stats,
+        "accuracy": correct / handled if handled else 0.0,
+        "avg_rule_ms": rule_seconds * 1000 / stats["rules"] if stats["rules"] else 0.0,
+        "mistakes": mistakes,
+    }
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    target = args[0] if args else HOLDOUT_PATH
+    report = asyncio.run(evaluate(target, use_embeddings="--rules-only" not in sys.argv))
+    print(json.dumps(report, indent=2))
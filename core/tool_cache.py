@@ -0,0 +1,125 @@
+#core/tool_cache.py
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import json
+import logging
+import os
+import time
+from server.embedding_cache import normalize_text
+from server.shared_state import get_shared_state
+
+logger = logging.getLogger(__name__)
+
+# Seconds to keep a result per tool. 0 marks a tool as uncacheable: its calls
+# have side effects, so they are never served from cache or coalesced.
+TOOL_CACHE_TTLS = {
+    "get_weather": 300,
+    "web_search": 3600,
+    "schedule_event": 0,
+    "escalate_to_human": 0,
+}
+
+class ToolResultCache:
+    """TTL cache for idempotent tool calls that also coalesces identical in-flight calls.
+
+    With shared state, a local miss checks the results other workers stored before calling the tool.
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, max_entries: int = 1000, shared=None):
+        self.ttls = dict(TOOL_CACHE_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.shared = shared
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls):
+        ttls = dict(TOOL_CACHE_TTLS)
+        for tool_name in ("get_weather", "web_search"):
+            override = os.getenv(f"TOOL_CACHE_TTL_{tool_name.upper()}")
+            if override is not None:
+                ttls[tool_name] = float(override)
+        return cls(ttls, max_entries=int(os.getenv("TOOL_CACHE_SIZE", "1000")), shared=get_shared_state())
+
+    @staticmethod
+    def make_key(tool_name: str, args: dict) -> str:
+        normalized = {k: normalize_text(v) if isinstance(v, str) else v for k, v in args.items()}
+        return f"{tool_name}:{json.dumps(normalized, sort_keys=True)}"
+
+    async def get_or_call(
+        self,
+        tool_name: str,
+        args: dict,
+        call: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda result: True,
+    ) -> Any:
+        """Return a fresh cached result, join an identical in-flight call, or run call()."""
+        ttl = self.ttls.get(tool_name, 0)
+        if ttl <= 0:
+            return await call()
+
+        key = self.make_key(tool_name, args)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return (await asyncio.shield(inflight))[0]
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._fetch(key, ttl, call, cacheable))
+        self._inflight[key] = task
+
+        def on_done(done: asyncio.Future):
+            self._inflight.pop(key, None)
+            if done.cancelled() or done.exception() is not None:
+                return
+            result, ttl_left = done.result()
+            if cacheable(result):
+                self._entries[key] = (time.monotonic() + ttl_left, result)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        task.add_done_callback(on_done)
+        # Shielded so a cancelled caller doesn't abort the call other waiters share
+        return (await asyncio.shield(task))[0]
+
+    async def _fetch(self, key: str, ttl: float, call, cacheable):
+        """(result, seconds it stays fresh), from another worker's stored result or from call()"""
+        if self.shared is not None:
+            try:
+                stored = await self.shared.cache_get("tool", key)
+            except Exception as e:
+                logger.error(f"Shared tool cache lookup failed: {str(e)}")
+                stored = None
+            if stored is not None:
+                self.shared_hits += 1
+                return stored
+        result = await call()
+        if self.shared is not None and cacheable(result):
+            try:
+                await self.shared.cache_set("tool", key, result, ttl)
+            except Exception as e:
+                logger.error(f"Shared tool cache store failed: {str(e)}")
+        return result, ttl
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self._entries),
+        }
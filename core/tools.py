@@ -2,19 +2,22 @@
 
 from langchain.tools import tool, StructuredTool
 from pydantic import BaseModel, Field
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import logging
 import asyncio
-from server.services import WeatherService, CalendarService, WebSearchService
+import os
+import time
+from server.services import CalendarConflictError, get_service, aget_service
+from core.tool_cache import ToolResultCache
+from server.metrics import metrics
+from core.deadline import MIN_STAGE_BUDGET, record_miss
 from datetime import datetime
 import pytz
 
 logger = logging.getLogger(__name__)
 
-# Initialize services
-weather_service = WeatherService()
-calendar_service = CalendarService()
-web_search_service = WebSearchService()
+# Service clients are built lazily by the shared registry on first use
+tool_cache = ToolResultCache.from_env()
 
 # Input schemas
 class GetWeatherInput(BaseModel):
@@ -40,7 +43,11 @@ async def get_weather(city: str) -> str:
     """Get current weather for a city."""
     try:
         logger.info(f"🌤️ Getting weather for: {city}")
-        weather_data = await weather_service.get_weather(city)
+        weather_data = await tool_cache.get_or_call(
+            "get_weather",
+            {"city": city},
+            lambda: get_service("weather").get_weather(city)
+        )
         return f"""🌡️ Weather in {city}:
 Temperature: {weather_data['main']['temp']}°C
 Feels like: {weather_data['main']['feels_like']}°C
@@ -54,7 +61,7 @@ Conditions: {weather_data['weather'][0]['description']}"""
 async def schedule_event(title: str, start_time: str, duration: int) -> str:
     """Schedule an event in Google Calendar."""
     try:
-        event = await calendar_service.create_event(
+        event = await (await aget_service("calendar")).create_event(
             title=title,
             start_time=start_time,
             duration=duration
@@ -64,6 +71,8 @@ Title: {title}
 Start: {start_time}
 Duration: {duration} minutes
 Link: {event.get('htmlLink')}"""
+    except CalendarConflictError as e:
+        return f"⚠️ Could not schedule {title}: {str(e)}. Please pick another time."
     except Exception as e:
         logger.error(f"Calendar API error: {str(e)}")
         return "Failed to schedule event. Please try again later."
@@ -72,9 +81,11 @@ Link: {event.get('htmlLink')}"""
 async def web_search(query: str, max_results: int = 3) -> str:
     """Search the web using Tavily API."""
     try:
-        results = await web_search_service.search(
-            query=query,
-            max_results=max_results
+        results = await tool_cache.get_or_call(
+            "web_search",
+            {"query": query, "max_results": max_results},
+            lambda: get_service("web_search").search(query=query, max_results=max_results),
+            cacheable=lambda result: result.get("status") != "error"
         )
         formatted_results = []
         
@@ -116,23 +127,91 @@ SUPPORT_TOOLS = [
     escalate_to_human
 ]
 
+# Per-tool deadlines in seconds (override with TOOL_TIMEOUT_<NAME>); anything unlisted uses TOOL_TIMEOUT
+TOOL_TIMEOUTS = {
+    "get_weather": 5,
+    "web_search": 10,
+    "schedule_event": 15,
+    "escalate_to_human": 5,
+}
+
+# Tools with side effects. A started call is never cancelled, since a timed-out
+# booking can still land after the user was told it failed, and its timeout is
+# not shortened to fit the request deadline.
+WRITE_TOOLS = {"schedule_event"}
+
+def tool_timeouts_from_env() -> Dict[str, float]:
+    timeouts = dict(TOOL_TIMEOUTS)
+    for tool_name in TOOL_TIMEOUTS:
+        override = os.getenv(f"TOOL_TIMEOUT_{tool_name.upper()}")
+        if override is not None:
+            timeouts[tool_name] = float(override)
+    return timeouts
+
 class ToolExecutor:
-    def __init__(self, tools):
+    def __init__(self, tools, timeouts=None):
         self.tools = {tool.name: tool for tool in tools}
+        self.timeouts = tool_timeouts_from_env() if timeouts is None else timeouts
+        self.default_timeout = float(os.getenv("TOOL_TIMEOUT", "10"))
+        self._background = set()
         
-    async def execute(self, tool_name: str, args: dict) -> str:
+    async def execute(self, tool_name: str, args: dict, deadline: Optional[float] = None) -> str:
         logger.info(f"🔧 Executing tool: {tool_name}")
         if tool_name not in self.tools:
             logger.error(f"❌ Tool not found: {tool_name}")
             raise ValueError(f"Tool {tool_name} not found")
                 
         tool = self.tools[tool_name]
-        try:
-            # Validate and convert arguments using the tool's schema
-            validated_args = tool.args_schema(**args)
-            result = await tool.ainvoke(validated_args.dict())
-            logger.info(f"✅ Tool execution successful")
-            return result
-        except Exception as e:
-            logger.error(f"❌ Tool error in {tool_name}: {str(e)}")
-            return f"Error executing {tool_name}: {str(e)}"
\ No newline at end of file
+        timeout = self.timeouts.get(tool_name, self.default_timeout)
+        cut_short = False
+        if deadline is not None and deadline - time.time() < timeout:
+            if deadline - time.time() < MIN_STAGE_BUDGET:
+                # Nothing has been sent yet, so even a write tool can be skipped safely
+                record_miss(f"tool:{tool_name}")
+                return f"{tool_name} skipped: not enough time left to run it"
+            if tool_name not in WRITE_TOOLS:
+                timeout = deadline - time.time()
+                cut_short = True
+        with metrics.timer("tool_seconds", tool=tool_name) as labels:
+            try:
+                # Validate and convert arguments using the tool's schema
+                validated_args = tool.args_schema(**args)
+                if tool_name in WRITE_TOOLS:
+                    call = asyncio.ensure_future(tool.ainvoke(validated_args.dict()))
+                    try:
+                        # Shielded: a timeout or a cancelled request stops waiting, not the call
+                        result = await asyncio.wait_for(asyncio.shield(call), timeout=timeout)
+                    except (asyncio.TimeoutError, asyncio.CancelledError):
+                        self._finish_in_background(tool_name, call)
+                        raise
+                else:
+                    result = await asyncio.wait_for(tool.ainvoke(validated_args.dict()), timeout=timeout)
+                logger.info(f"✅ Tool execution successful")
+                return result
+            except asyncio.TimeoutError:
+                labels["status"] = "timeout"
+                if cut_short:
+                    record_miss(f"tool:{tool_name}")
+                logger.error(f"⏱️ Tool {tool_name} timed out after {timeout:.1f}s")
+                if tool_name in WRITE_TOOLS:
+                    return f"{tool_name} is taking longer than {timeout:g}s; it is still running and may complete"
+                return f"{tool_name} timed out after {timeout:g}s"
+            except Exception as e:
+                labels["status"] = "error"
+                logger.error(f"❌ Tool error in {tool_name}: {str(e)}")
+                return f"Error executing {tool_name}: {str(e)}"
+
+    def _finish_in_background(self, tool_name: str, call: asyncio.Future):
+        """Keep a write tool's call referenced until it settles, and log how it ended"""
+        self._background.add(call)
+
+        def done(finished: asyncio.Future):
+            self._background.discard(finished)
+            if finished.cancelled():
+                logger.warning(f"{tool_name} call was cancelled after its caller stopped waiting")
+            elif finished.exception() is not None:
+                logger.error(f"{tool_name} failed after its caller stopped waiting: {finished.exception()}")
+            else:
+                logger.warning(f"{tool_name} completed after its caller stopped waiting: {finished.result()}")
+
+        call.add_done_callback(done)
@@ -0,0 +1,236 @@
+# server/answer_cache.py
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+import numpy as np
+import asyncio
+import logging
+import os
+import time
+
+from server.embedding_cache import normalize_text
+from server.shared_state import get_shared_state
+
+logger = logging.getLogger(__name__)
+
+# Only answers that don't depend on live data are reusable; a TTL of 0 disables caching
+DEFAULT_INTENT_TTLS = {
+    "rag": 3600,
+    "direct": 3600,
+    "get_weather": 0,
+    "schedule_event": 0,
+    "web_search": 0,
+    "check_order_status": 0,
+    "tools": 0,
+    "escalate": 0,
+}
+
+def parse_intent_ttls(raw: str) -> Dict[str, float]:
+    """Parse "rag=3600,direct=600" into overrides of DEFAULT_INTENT_TTLS"""
+    ttls = dict(DEFAULT_INTENT_TTLS)
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        intent, _, ttl = item.partition("=")
+        ttls[intent.strip()] = float(ttl)
+    return ttls
+
+class SemanticAnswerCache:
+    """Serves stored workflow responses for queries close to previously answered ones.
+
+    With shared state, stored answers are published for the other workers, and each
+    worker pulls theirs into its local index at most once per shared_sync_interval.
+    """
+
+    def __init__(
+        self,
+        workflow,
+        embeddings,
+        threshold: float = 0.95,
+        max_entries: int = 1000,
+        intent_ttls: Optional[Dict[str, float]] = None,
+        version_fn: Optional[Callable[[], Awaitable[Optional[str]]]] = None,
+        version_check_interval: float = 30,
+        shared=None,
+        shared_sync_interval: float = 1.0,
+    ):
+        self.workflow = workflow
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.intent_ttls = intent_ttls or dict(DEFAULT_INTENT_TTLS)
+        self.version_fn = version_fn
+        self.version_check_interval = version_check_interval
+        self.version = None
+        self._version_checked_at = 0.0
+        # normalized query -> {"vector", "response", "intent", "expires_at"}
+        self._entries = OrderedDict()
+        self._keys = []
+        self._matrix = None
+        self.shared = shared
+        self.shared_sync_interval = shared_sync_interval
+        self._shared_version = 0
+        self._pulled_at = 0.0
+        self._tasks = set()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls, workflow, embeddings, version_fn=None):
+        return cls(
+            workflow,
+            embeddings,
+            threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+            max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+            intent_ttls=parse_intent_ttls(os.getenv("ANSWER_CACHE_INTENT_TTLS", "")),
+            version_fn=version_fn,
+            shared=get_shared_state(),
+            shared_sync_interval=float(os.getenv("ANSWER_CACHE_SYNC_INTERVAL", "1")),
+        )
+
+    async def ainvoke(self, state: dict, on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+                      config: Optional[dict] = None, on_reset: Optional[Callable[[], Awaitable[None]]] = None) -> dict:
+        """Drop-in replacement for compiled_workflow.ainvoke, optionally streaming answer tokens.
+
+        on_reset is awaited when a retried run discards the tokens streamed so far.
+        """
+        query = state.get("query", "")
+        try:
+            await self._check_version()
+            await self._pull_shared()
+            vector = await self._embed(query)
+            cached = self._lookup(vector)
+        except Exception as e:
+            logger.error(f"Answer cache lookup failed: {str(e)}")
+            vector, cached = None, None
+
+        if cached is not None:
+            self.hits += 1
+            logger.info(f"Answer cache hit for intent {cached['intent']}")
+            return {**state, "response": cached["response"], "intent": cached["intent"]}
+
+        self.misses += 1
+        if on_token is None:
+            result = await self.workflow.ainvoke(state, config)
+        else:
+            result = await self._stream(state, on_token, config, on_reset)
+        if vector is not None:
+            self._store(query, vector, result)
+        return result
+
+    async def _stream(self, state: dict, on_token, config: Optional[dict] = None, on_reset=None) -> dict:
+        result = state
+        async for mode, chunk in self.workflow.astream(state, config, stream_mode=["custom", "values"]):
+            if mode == "custom" and "token" in chunk:
+                await on_token(chunk["token"])
+            elif mode == "custom" and chunk.get("reset") and on_reset is not None:
+                await on_reset()
+            elif mode == "values":
+                result = chunk
+        return result
+
+    async def _check_version(self):
+        if self.version_fn is None:
+            return
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        version = await self.version_fn()
+        if version != self.version:
+            if self.version is not None:
+                logger.info(f"Knowledge version changed to {version}, clearing answer cache")
+            self.clear()
+            self.version = version
+
+    async def _embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(await self.embeddings.aembed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _lookup(self, vector: np.ndarray) -> Optional[dict]:
+        self._expire()
+        if not self._keys:
+            return None
+        if self._matrix is None:
+            self._matrix = np.stack([self._entries[k]["vector"] for k in self._keys])
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        key = self._keys[best]
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def _store(self, query: str, vector: np.ndarray, result: dict):
+        intent = result.get("intent")
+        ttl = self.intent_ttls.get(intent, 0)
+        # Fallbacks and apologies are not answers: serving one for the TTL would repeat the failure
+        if ttl <= 0 or result.get("needs_escalation") or not result.get("generated") or not result.get("response"):
+            return
+        key = normalize_text(query)
+        self._add(key, vector, result["response"], intent, ttl)
+        if self.shared is not None:
+            task = asyncio.create_task(self._publish(key, vector, result["response"], intent, ttl))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _add(self, key: str, vector: np.ndarray, response: str, intent: str, ttl: float):
+        self._entries.pop(key, None)
+        self._entries[key] = {
+            "vector": vector,
+            "response": response,
+            "intent": intent,
+            "expires_at": time.monotonic() + ttl,
+        }
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._reindex()
+
+    async def _publish(self, key: str, vector: np.ndarray, response: str, intent: str, ttl: float):
+        value = {"vector": vector.tolist(), "response": response, "intent": intent, "version": self.version}
+        try:
+            await self.shared.cache_set("answer", key, value, ttl)
+        except Exception as e:
+            logger.error(f"Publishing answer to shared cache failed: {str(e)}")
+
+    async def _pull_shared(self):
+        """Adopt answers other workers stored since the last pull"""
+        if self.shared is None:
+            return
+        now = time.monotonic()
+        if now - self._pulled_at < self.shared_sync_interval:
+            return
+        self._pulled_at = now
+        try:
+            entries, self._shared_version = await self.shared.cache_changes("answer", self._shared_version)
+        except Exception as e:
+            logger.error(f"Pulling shared answers failed: {str(e)}")
+            return
+        for key, value, ttl_left in entries:
+            # Answers stored against another knowledge version are stale here
+            if value.get("version") == self.version:
+                self._add(key, np.asarray(value["vector"], dtype=np.float32), value["response"], value["intent"], ttl_left)
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [k for k, entry in self._entries.items() if entry["expires_at"] <= now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._reindex()
+
+    def _reindex(self):
+        self._keys = list(self._entries)
+        self._matrix = None
+
+    def clear(self):
+        self._entries.clear()
+        self._reindex()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "version": self.version,
+        }
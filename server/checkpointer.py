@@ -0,0 +1,389 @@
+# server/checkpointer.py
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from sqlalchemy import text
+from core.deadline import new_deadline
+from core.tools import WRITE_TOOLS
+from server.metrics import metrics
+import asyncio
+import json
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Checkpoints of abandoned runs older than the TTL are deleted once every this many writes
+PRUNE_EVERY = 200
+# Sent on the "custom" stream before a retry: tokens streamed by the failed attempt are void
+STREAM_RESET = {"reset": True}
+# Sent instead of resuming a run that died while a write tool may already have run
+INTERRUPTED_WRITE_RESPONSE = (
+    "I'm sorry, I was interrupted while making that change and can't tell whether it went through. "
+    "Please check before asking me again, or I'll pass this to our support team. 🙏"
+)
+
+class PostgresCheckpointSaver(BaseCheckpointSaver):
+    """LangGraph checkpointer in the Postgres database the bot already uses.
+
+    Only the latest checkpoint of each thread is kept, as one msgpack snapshot of
+    the AgentState channels, together with the writes of tasks that finished in
+    the step after it. That is all a failed run needs to resume from its last
+    completed node; there is no history to replay or fork.
+    """
+
+    NOW = "EXTRACT(EPOCH FROM clock_timestamp())"
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS bot_checkpoints (
+            thread_id text NOT NULL, checkpoint_ns text NOT NULL, checkpoint_id text NOT NULL,
+            parent_id text, type text NOT NULL, checkpoint bytea NOT NULL, metadata jsonb NOT NULL,
+            updated_at double precision NOT NULL, resumes integer NOT NULL DEFAULT 0,
+            PRIMARY KEY (thread_id, checkpoint_ns))""",
+        "CREATE INDEX IF NOT EXISTS bot_checkpoints_updated ON bot_checkpoints (updated_at)",
+        """CREATE TABLE IF NOT EXISTS bot_checkpoint_writes (
+            thread_id text NOT NULL, checkpoint_ns text NOT NULL, checkpoint_id text NOT NULL,
+            task_id text NOT NULL, idx integer NOT NULL, channel text NOT NULL, type text NOT NULL,
+            value bytea NOT NULL, task_path text NOT NULL DEFAULT '',
+            PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))""",
+    ]
+
+    def __init__(self, engine, ttl: float = 3600, serde=None):
+        super().__init__(serde=serde)
+        self.engine = engine
+        self.ttl = ttl
+        self._ready = False
+        self._schema_lock = asyncio.Lock()
+        self._writes = 0
+
+    @classmethod
+    def from_env(cls):
+        from server.database import get_async_engine
+        return cls(get_async_engine(), ttl=float(os.getenv("CHECKPOINT_TTL", "3600")))
+
+    async def _ensure_schema(self):
+        if self._ready:
+            return
+        async with self._schema_lock:
+            if not self._ready:
+                async with self.engine.begin() as conn:
+                    # Workers start together; serialise the CREATEs so they don't race on the catalog
+                    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('bot_checkpoints'))"))
+                    for statement in self.SCHEMA:
+                        await conn.execute(text(statement))
+                self._ready = True
+
+    async def _execute(self, *statements: Tuple[str, Any]):
+        """Run (sql, params) pairs in one transaction; rows of the last one that returns any"""
+        await self._ensure_schema()
+        rows = None
+        async with self.engine.begin() as conn:
+            for sql, params in statements:
+                result = await conn.execute(text(sql.replace("{now}", self.NOW)), params)
+                if result.returns_rows:
+                    rows = result.fetchall()
+        return rows
+
+    async def _prune(self):
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            await self.prune()
+
+    async def prune(self):
+        """Delete checkpoints not written for ttl seconds, and writes whose checkpoint is gone"""
+        await self._execute(
+            ("DELETE FROM bot_checkpoints WHERE updated_at < {now} - :ttl", {"ttl": self.ttl}),
+            ("""DELETE FROM bot_checkpoint_writes w WHERE NOT EXISTS (
+                SELECT 1 FROM bot_checkpoints c WHERE c.thread_id = w.thread_id
+                AND c.checkpoint_ns = w.checkpoint_ns AND c.checkpoint_id = w.checkpoint_id)""", {}),
+        )
+
+    async def aget_tuple(self, config) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        rows = await self._execute(("""
+            SELECT checkpoint_id, parent_id, type, checkpoint, metadata FROM bot_checkpoints
+            WHERE thread_id = :thread_id AND checkpoint_ns = :ns""", {"thread_id": thread_id, "ns": checkpoint_ns}))
+        if not rows:
+            return None
+        checkpoint_id, parent_id, type_, blob, metadata = rows[0]
+        requested = get_checkpoint_id(config)
+        if requested and requested != checkpoint_id:
+            # Only the latest checkpoint is kept
+            return None
+        writes = await self._execute(("""
+            SELECT task_id, channel, type, value FROM bot_checkpoint_writes
+            WHERE thread_id = :thread_id AND checkpoint_ns = :ns AND checkpoint_id = :id
+            ORDER BY task_id, idx""", {"thread_id": thread_id, "ns": checkpoint_ns, "id": checkpoint_id}))
+        return self._tuple(thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, blob, metadata, writes)
+
+    def _tuple(self, thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, blob, metadata, writes):
+        def ref(id_):
+            return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": id_}}
+
+        return CheckpointTuple(
+            config=ref(checkpoint_id),
+            checkpoint=self.serde.loads_typed((type_, bytes(blob))),
+            metadata=metadata,
+            parent_config=ref(parent_id) if parent_id else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, bytes(value))))
+                for task_id, channel, value_type, value in writes or []
+            ],
+        )
+
+    async def alist(self, config, *, filter: Optional[Dict[str, Any]] = None, before=None,
+                    limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        """The latest checkpoint of the config's thread, or of every thread when config is None"""
+        if config is not None:
+            found = await self.aget_tuple(config)
+            candidates = [found] if found else []
+        else:
+            rows = await self._execute(("""
+                SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata
+                FROM bot_checkpoints ORDER BY updated_at DESC""", {}))
+            candidates = [self._tuple(*row, None) for row in rows or []]
+        for found in candidates[:limit]:
+            if filter and any(found.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            if before is not None and found.config["configurable"]["checkpoint_id"] >= get_checkpoint_id(before):
+                continue
+            yield found
+
+    async def aput(self, config, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, blob = self.serde.dumps_typed(checkpoint)
+        params = {
+            "thread_id": thread_id,
+            "ns": checkpoint_ns,
+            "id": checkpoint["id"],
+            "parent": config["configurable"].get("checkpoint_id"),
+            "type": type_,
+            "blob": blob,
+            "metadata": json.dumps(get_checkpoint_metadata(config, metadata), default=str),
+        }
+        await self._execute(
+            ("""INSERT INTO bot_checkpoints
+                (thread_id, checkpoint_ns, checkpoint_id, parent_id, type, checkpoint, metadata, updated_at)
+                VALUES (:thread_id, :ns, :id, :parent, :type, :blob, CAST(:metadata AS jsonb), {now})
+                ON CONFLICT (thread_id, checkpoint_ns) DO UPDATE SET checkpoint_id = EXCLUDED.checkpoint_id,
+                parent_id = EXCLUDED.parent_id, type = EXCLUDED.type, checkpoint = EXCLUDED.checkpoint,
+                metadata = bot_checkpoints.metadata || EXCLUDED.metadata,
+                updated_at = EXCLUDED.updated_at""", params),
+            # Metadata is merged so what the run started with (e.g. its Slack channel) survives
+            # state updates; writes of the previous step are folded into this checkpoint
+            ("""DELETE FROM bot_checkpoint_writes WHERE thread_id = :thread_id AND checkpoint_ns = :ns
+                AND checkpoint_id <> :id""", params),
+        )
+        await self._prune()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    async def aput_writes(self, config, writes: Sequence[Tuple[str, Any]], task_id: str, task_path: str = ""):
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, blob = self.serde.dumps_typed(value)
+            rows.append({
+                "thread_id": config["configurable"]["thread_id"],
+                "ns": config["configurable"].get("checkpoint_ns", ""),
+                "id": config["configurable"]["checkpoint_id"],
+                "task_id": task_id,
+                "idx": WRITES_IDX_MAP.get(channel, idx),
+                "channel": channel,
+                "type": type_,
+                "value": blob,
+                "task_path": task_path,
+            })
+        if not rows:
+            return
+        # Special writes (errors, interrupts) replace earlier ones; regular writes are kept as first written
+        conflict = ("DO UPDATE SET channel = EXCLUDED.channel, type = EXCLUDED.type, value = EXCLUDED.value"
+                    if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "DO NOTHING")
+        await self._execute((f"""INSERT INTO bot_checkpoint_writes
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path)
+            VALUES (:thread_id, :ns, :id, :task_id, :idx, :channel, :type, :value, :task_path)
+            ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id, task_id, idx) {conflict}""", rows))
+
+    async def adelete_thread(self, thread_id: str):
+        params = {"thread_id": thread_id}
+        await self._execute(
+            ("DELETE FROM bot_checkpoint_writes WHERE thread_id = :thread_id", params),
+            ("DELETE FROM bot_checkpoints WHERE thread_id = :thread_id", params),
+        )
+
+    async def claim_stale(self, idle: float, max_resumes: int, limit: int = 20) -> List[Tuple[str, dict]]:
+        """Claim up to limit runs not checkpointed for idle seconds, as (thread_id, metadata).
+
+        Claiming counts a resume and touches the row, so other workers skip it for another idle seconds.
+        """
+        rows = await self._execute(("""
+            UPDATE bot_checkpoints SET updated_at = {now}, resumes = resumes + 1
+            WHERE (thread_id, checkpoint_ns) IN (
+                SELECT thread_id, checkpoint_ns FROM bot_checkpoints
+                WHERE checkpoint_ns = '' AND resumes < :max_resumes
+                AND updated_at < {now} - :idle AND updated_at > {now} - :ttl
+                ORDER BY updated_at LIMIT :limit FOR UPDATE SKIP LOCKED)
+            RETURNING thread_id, metadata""",
+            {"idle": idle, "ttl": self.ttl, "max_resumes": max_resumes, "limit": limit}))
+        return [(thread_id, metadata) for thread_id, metadata in rows or []]
+
+class ResumableWorkflow:
+    """Runs a checkpointed compiled workflow so failed runs resume instead of restarting.
+
+    Each run is a checkpoint thread keyed by the state's trace_id. When a node
+    raises, the run is retried from the last completed node, so retrieval, intent
+    analysis and tool calls such as schedule_event are not repeated. Runs whose
+    worker died are claimed by recover() on any worker once they have been idle
+    for resume_after seconds. Finished runs delete their checkpoints.
+    """
+
+    def __init__(self, graph, retries: int = 1, durability: str = "async", resume_after: float = 120,
+                 max_resumes: int = 2):
+        self.graph = graph
+        self.checkpointer = graph.checkpointer
+        self.retries = retries
+        self.durability = durability
+        self.resume_after = resume_after
+        self.max_resumes = max_resumes
+        self.resumed = 0
+        self.recovered = 0
+
+    @classmethod
+    def from_env(cls, graph):
+        return cls(
+            graph,
+            retries=int(os.getenv("CHECKPOINT_RETRIES", "1")),
+            durability=os.getenv("CHECKPOINT_DURABILITY", "async"),
+            resume_after=float(os.getenv("CHECKPOINT_RESUME_AFTER", "120")),
+            max_resumes=int(os.getenv("CHECKPOINT_MAX_RESUMES", "2")),
+        )
+
+    def _config(self, state: dict, config: Optional[dict]) -> Tuple[dict, dict]:
+        state = {**state, "trace_id": state.get("trace_id") or uuid.uuid4().hex}
+        config = dict(config or {})
+        config["configurable"] = {**config.get("configurable", {}), "thread_id": state["trace_id"]}
+        return state, config
+
+    async def ainvoke(self, state: dict, config: Optional[dict] = None) -> dict:
+        result = None
+        async for result in self._run(state, config, "values"):
+            pass
+        return result
+
+    async def astream(self, state: dict, config: Optional[dict] = None, stream_mode="values"):
+        async for chunk in self._run(state, config, stream_mode):
+            yield chunk
+
+    async def _run(self, state: dict, config: Optional[dict], stream_mode):
+        state, config = self._config(state, config)
+        thread_id = config["configurable"]["thread_id"]
+        payload = state
+        for attempt in range(self.retries + 1):
+            # generate_response raises while a retry is left, and apologises on the last attempt
+            config["configurable"]["retry_pending"] = attempt < self.retries
+            try:
+                async for chunk in self.graph.astream(payload, config, stream_mode=stream_mode, durability=self.durability):
+                    yield chunk
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    await self._discard(thread_id)
+                    raise
+                self.resumed += 1
+                metrics.inc("workflow_resumes_total", reason="error")
+                logger.warning(f"Run {thread_id} failed ({str(e)}), resuming from its last checkpoint")
+                payload = None
+                if isinstance(stream_mode, (list, tuple)) and "custom" in stream_mode:
+                    yield ("custom", STREAM_RESET)
+                elif stream_mode == "custom":
+                    yield STREAM_RESET
+        await self._discard(thread_id)
+
+    async def _discard(self, thread_id: str):
+        try:
+            await self.checkpointer.adelete_thread(thread_id)
+        except Exception as e:
+            # Left for pruning after CHECKPOINT_TTL
+            logger.error(f"Failed to delete checkpoints of run {thread_id}: {str(e)}")
+
+    async def recover(self, on_result: Callable[[dict, dict], Awaitable[None]]) -> int:
+        """Resume runs whose worker died mid-way; on_result(state, metadata) delivers each answer"""
+        recovered = 0
+        for thread_id, metadata in await self.checkpointer.claim_stale(self.resume_after, self.max_resumes):
+            config = {"configurable": {"thread_id": thread_id}}
+            try:
+                snapshot = await self.graph.aget_state(config)
+                if not snapshot.next:
+                    # Finished before its checkpoints were deleted; the answer went out
+                    await self._discard(thread_id)
+                    continue
+                writes = [
+                    call["name"] for call in snapshot.values.get("tool_calls") or []
+                    if call.get("name") in WRITE_TOOLS
+                ]
+                if "execute_tools" in snapshot.next and writes:
+                    # execute_tools has no checkpoint of its own, so rerunning it could book twice
+                    logger.warning(f"Not resuming run {thread_id}: interrupted during write tool(s) {writes}")
+                    await self._discard(thread_id)
+                    metrics.inc("workflow_resumes_total", reason="write_interrupted")
+                    await on_result({
+                        **snapshot.values,
+                        "response": INTERRUPTED_WRITE_RESPONSE,
+                        "needs_escalation": True,
+                        "escalation_reason": "Interrupted during a write tool",
+                    }, metadata)
+                    continue
+                logger.info(f"Resuming interrupted run {thread_id} before {snapshot.next}")
+                # The original request's deadline has passed; give the rest of the run a fresh one
+                await self.graph.aupdate_state(config, {"deadline": new_deadline()})
+                result = await self.graph.ainvoke(None, config, durability=self.durability)
+            except Exception as e:
+                # Claimed again after resume_after, up to max_resumes times
+                logger.error(f"Resuming run {thread_id} failed: {str(e)}")
+                continue
+            await self._discard(thread_id)
+            recovered += 1
+            self.recovered += 1
+            metrics.inc("workflow_resumes_total", reason="recovered")
+            await on_result(result, metadata)
+        return recovered
+
+    async def recover_loop(self, on_result, interval: float = 30):
+        while True:
+            try:
+                await self.recover(on_result)
+            except Exception as e:
+                logger.error(f"Checkpoint recovery failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {"resumed": self.resumed, "recovered": self.recovered}
+
+# CHECKPOINT_BACKEND picks one; "none" runs the workflow without checkpoints
+CHECKPOINT_BACKENDS = {
+    "postgres": PostgresCheckpointSaver.from_env,
+}
+
+_checkpointer: Optional[BaseCheckpointSaver] = None
+
+def get_checkpointer() -> Optional[BaseCheckpointSaver]:
+    """Get the process-wide workflow checkpointer, or None when checkpointing is off"""
+    global _checkpointer
+    backend = os.getenv("CHECKPOINT_BACKEND", "none").lower()
+    if backend == "none":
+        return None
+    if _checkpointer is None:
+        if backend not in CHECKPOINT_BACKENDS:
+            raise ValueError(f"Unknown CHECKPOINT_BACKEND {backend!r}; expected none or one of {sorted(CHECKPOINT_BACKENDS)}")
+        _checkpointer = CHECKPOINT_BACKENDS[backend]()
+        logger.info(f"Checkpointing workflow runs in {backend}")
+    return _checkpointer
@@ -0,0 +1,67 @@
+# server/embedding_batcher.py
+from typing import Awaitable, Callable, List
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-text embeddings into one embed_documents call"""
+
+    def __init__(self, embed_documents: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 max_batch: int = 64, max_wait: float = 0.005):
+        self.embed_documents = embed_documents
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        # Waiters cancelled while queued are dropped; repeated texts share one slot
+        batch = [(text, future) for text, future in batch if not future.done()]
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        if not texts:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            vectors = dict(zip(texts, await self.embed_documents(texts)))
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(texts)} failed: {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for text, future in batch:
+            if not future.done():
+                future.set_result(vectors[text])
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": self.items / self.batches if self.batches else 0.0,
+        }
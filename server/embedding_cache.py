@@ -0,0 +1,282 @@
+# server/embedding_cache.py
+from langchain_core.embeddings import Embeddings
+from server.metrics import metrics
+from server.rate_limiter import estimate_tokens
+from server.embedding_batcher import EmbeddingBatcher
+from collections import OrderedDict
+from contextlib import contextmanager
+from array import array
+from typing import List, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+def normalize_text(text: str) -> str:
+    """Canonical form used as the cache key: NFKC, lower-case, single spaces"""
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+class EmbeddingCache:
+    """Two-tier (memory LRU + optional SQLite file) cache of embedding vectors.
+
+    The file may be shared by several worker processes. Writes are queued and
+    flushed in batches off the event loop; a failing disk tier only logs, it
+    never fails an embedding.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400, path: Optional[str] = None,
+                 flush_wait: float = 0.05, busy_timeout: float = 5.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.flush_wait = flush_wait
+        self._entries = OrderedDict()  # key -> (created_at, array('f'))
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.write_errors = 0
+        self._pending: List[Tuple[str, float, bytes]] = []
+        self._flush_task = None
+        self._db = None
+        self._writer = None
+        self._write_lock = threading.Lock()
+        if path:
+            # Separate connections so a read on the event loop never queues behind a write waiting on the file lock
+            self._writer = self._connect(path, busy_timeout)
+            self._writer.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, created REAL NOT NULL, vector BLOB NOT NULL)"
+            )
+            self._writer.commit()
+            self._db = self._connect(path, busy_timeout)
+
+    @staticmethod
+    def _connect(path: str, busy_timeout: float) -> sqlite3.Connection:
+        db = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        # WAL lets readers in every worker proceed while one of them writes
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(f"PRAGMA busy_timeout={int(busy_timeout * 1000)}")
+        return db
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, vector = entry
+                if not self._expired(created):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector.tolist()
+                self._evict(key)
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT created, vector FROM embeddings WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"Embedding cache read failed: {str(e)}")
+                    row = None
+                if row is not None and not self._expired(row[0]):
+                    vector = array("f")
+                    vector.frombytes(row[1])
+                    self._insert(key, row[0], vector)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector.tolist()
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, embedding: List[float]):
+        self.put_many([(key, embedding)])
+
+    def put_many(self, items: Sequence[Tuple[str, List[float]]]):
+        """Store in memory now; queue the disk writes for the next batched flush"""
+        created = time.time()
+        with self._lock:
+            for key, embedding in items:
+                vector = array("f", embedding)
+                self._insert(key, created, vector)
+                if self._writer is not None:
+                    self._pending.append((key, created, vector.tobytes()))
+        if self._writer is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to defer the flush on, so write straight away
+            self.flush()
+            return
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_soon())
+
+    async def _flush_soon(self):
+        try:
+            await asyncio.sleep(self.flush_wait)
+            await asyncio.to_thread(self.flush)
+        finally:
+            self._flush_task = None
+
+    def flush(self):
+        """Write queued entries in one transaction; failures are logged and the entries dropped"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch or self._writer is None:
+            return
+        with self._write_lock:
+            try:
+                self._writer.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, created, vector) VALUES (?, ?, ?)", batch
+                )
+                self._writer.commit()
+            except sqlite3.Error as e:
+                self.write_errors += 1
+                logger.warning(f"Embedding cache write of {len(batch)} entries failed: {str(e)}")
+                try:
+                    self._writer.rollback()
+                except sqlite3.Error:
+                    pass
+
+    def _insert(self, key: str, created: float, vector: array):
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = (created, vector)
+        self._bytes += vector.itemsize * len(vector)
+        while len(self._entries) > self.max_entries:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str):
+        _, vector = self._entries.pop(key)
+        self._bytes -= vector.itemsize * len(vector)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._pending = []
+        if self._writer is not None:
+            with self._write_lock:
+                try:
+                    self._writer.execute("DELETE FROM embeddings")
+                    self._writer.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Embedding cache clear failed: {str(e)}")
+
+    def close(self):
+        if self._writer is not None:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "write_errors": self.write_errors,
+        }
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated texts from an EmbeddingCache"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, model: str, provider: str = "openai",
+                 limiter=None, batch_size: int = 0, batch_wait: float = 0.005):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model
+        self.provider = provider
+        self.limiter = limiter
+        # Concurrent query misses are coalesced into one embed_documents call when batch_size > 1
+        self.batcher = None
+        if batch_size > 1:
+            self.batcher = EmbeddingBatcher(
+                lambda texts: self._acall(lambda: self.embeddings.aembed_documents(texts), texts),
+                max_batch=batch_size,
+                max_wait=batch_wait
+            )
+
+    @contextmanager
+    def _timed(self, count: int):
+        """Record provider latency and text volume for calls that miss the cache"""
+        metrics.inc("embedding_texts_total", count, provider=self.provider)
+        with metrics.timer("provider_request_seconds", provider=self.provider, operation="embedding"):
+            yield
+
+    async def _acall(self, call, texts: List[str]):
+        """Run an async provider call, timed, through the rate limiter if one is configured"""
+        async def timed():
+            with self._timed(len(texts)):
+                return await call()
+
+        if self.limiter is None:
+            return await timed()
+        return await self.limiter.call(timed, tokens=sum(estimate_tokens(t) for t in texts))
+
+    def _lookup(self, texts: List[str]):
+        keys = [self.cache.make_key(self.model, t) for t in texts]
+        vectors = [self.cache.get(k) for k in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        return keys, vectors, missing
+
+    def _store(self, keys, vectors, missing, embedded):
+        for i, embedding in zip(missing, embedded):
+            vectors[i] = embedding
+        self.cache.put_many([(keys[i], embedding) for i, embedding in zip(missing, embedded)])
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        embedded = []
+        if missing:
+            with self._timed(len(missing)):
+                embedded = self.embeddings.embed_documents([texts[i] for i in missing])
+        return self._store(keys, vectors, missing, embedded)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self.cache.make_key(self.model, text)
+        vector = self.cache.get(key)
+        if vector is None:
+            with self._timed(1):
+                vector = self.embeddings.embed_query(text)
+            self.cache.put(key, vector)
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, vectors, missing = self._lookup(texts)
+        embedded = []
+        if missing:
+            pending = [texts[i] for i in missing]
+            embedded = await self._acall(lambda: self.embeddings.aembed_documents(pending), pending)
+        return self._store(keys, vectors, missing, embedded)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.cache.make_key(self.model, text)
+        vector = self.cache.get(key)
+        if vector is None:
+            if self.batcher is not None:
+                vector = await self.batcher.embed(text)
+            else:
+                vector = await self._acall(lambda: self.embeddings.aembed_query(text), [text])
+            self.cache.put(key, vector)
+        return vector
@@ -0,0 +1,113 @@
+# server/http_client.py
+from typing import Any, Optional, Tuple
+from urllib.parse import urlsplit
+from server.metrics import metrics
+from server.rate_limiter import Permit, get_rate_limiter, parse_retry_after
+from contextlib import nullcontext
+import aiohttp
+import asyncio
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class HttpClient:
+    """Shared keep-alive aiohttp session with timeouts, jittered retries and per-host latency metrics"""
+
+    def __init__(self, connect_timeout: float = 5, read_timeout: float = 20, max_retries: int = 2,
+                 backoff_base: float = 0.25, pool_size: int = 100, pool_per_host: int = 20,
+                 dns_ttl: int = 300):
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.pool_size = pool_size
+        self.pool_per_host = pool_per_host
+        self.dns_ttl = dns_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            connect_timeout=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("HTTP_READ_TIMEOUT", "20")),
+            max_retries=int(os.getenv("HTTP_MAX_RETRIES", "2")),
+            pool_size=int(os.getenv("HTTP_POOL_SIZE", "100")),
+            pool_per_host=int(os.getenv("HTTP_POOL_PER_HOST", "20")),
+        )
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.pool_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=60
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def request_json(self, method: str, url: str, retries: Optional[int] = None,
+                           provider: Optional[str] = None, **kwargs) -> Tuple[int, Any]:
+        """Send a request and return (status, decoded JSON body or text)
+
+        With a provider name, every attempt goes through that provider's rate limiter.
+        """
+        session = await self.start()
+        host = urlsplit(url).netloc
+        retries = self.max_retries if retries is None else retries
+        limiter = get_rate_limiter(provider) if provider else None
+        attempt = 0
+        while True:
+            retry_after = None
+            try:
+                async with (limiter.slot() if limiter else nullcontext(Permit())) as permit:
+                    start = time.perf_counter()
+                    async with session.request(method, url, **kwargs) as response:
+                        if response.content_type == "application/json":
+                            body = await response.json()
+                        else:
+                            body = await response.text()
+                        status = response.status
+                        if status == 429:
+                            retry_after = parse_retry_after(response.headers)
+                            permit.throttle(retry_after)
+                self._observe(host, start, status)
+                if status not in RETRY_STATUSES or attempt >= retries:
+                    return status, body
+                logger.warning(f"HTTP {status} from {host}, retrying ({attempt + 1}/{retries})")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                self._observe(host, start, "error")
+                if attempt >= retries:
+                    raise
+                logger.warning(f"HTTP error from {host}: {str(e) or type(e).__name__}, retrying ({attempt + 1}/{retries})")
+            attempt += 1
+            # Full jitter keeps retry storms from synchronising across conversations;
+            # a Retry-After from the server is honoured as the minimum wait
+            await asyncio.sleep(max(retry_after or 0.0, random.uniform(0, self.backoff_base * 2 ** attempt)))
+
+    def _observe(self, host: str, start: float, status):
+        metrics.observe("http_request_seconds", time.perf_counter() - start, host=host, status=status)
+
+_http_client: Optional[HttpClient] = None
+
+def get_http_client() -> HttpClient:
+    """Get the process-wide HTTP client shared by all external services"""
+    global _http_client
+    if _http_client is None:
+        _http_client = HttpClient.from_env()
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.close()
+    _http_client = None
@@ -0,0 +1,157 @@
+# server/ingress.py
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+class EventDeduplicator:
+    """Remembers recently seen Slack event ids so retried deliveries run once.
+
+    With shared state, ids are also claimed across worker processes, since Slack
+    may deliver a retry to a different socket-mode connection.
+    """
+
+    def __init__(self, ttl: float = 600, shared=None):
+        self.ttl = ttl
+        self.shared = shared
+        self._seen: Dict[str, float] = {}
+        self.duplicates = 0
+
+    def seen(self, event_id: Optional[str]) -> bool:
+        """Record event_id and report whether it was already seen inside the window"""
+        if not event_id:
+            return False
+        now = time.monotonic()
+        if len(self._seen) > 1000:
+            self._seen = {k: t for k, t in self._seen.items() if now - t < self.ttl}
+        seen_at = self._seen.get(event_id)
+        if seen_at is not None and now - seen_at < self.ttl:
+            self.duplicates += 1
+            return True
+        self._seen[event_id] = now
+        return False
+
+    async def claim(self, event_id: Optional[str]) -> bool:
+        """True when this worker should handle event_id: unseen here and not claimed by another worker"""
+        if self.seen(event_id):
+            return False
+        if self.shared is None or not event_id:
+            return True
+        try:
+            claimed = await self.shared.claim_event(event_id, self.ttl)
+        except Exception as e:
+            # Handling a rare duplicate beats dropping events while the shared store is down
+            logger.error(f"Shared event claim failed, handling {event_id} locally: {str(e)}")
+            return True
+        if not claimed:
+            self.duplicates += 1
+        return claimed
+
+class IngressQueue:
+    """Bounded work queue drained by a worker pool, serialised per user.
+
+    Each user has their own FIFO of jobs; the shared queue holds users with work
+    waiting, and each user is on it at most once. A worker runs one job for the
+    user it dequeues, then puts the user back at the end if more are waiting, so
+    one user's events run in order without parking workers other users need.
+    """
+
+    def __init__(self, max_size: int = 100, workers: int = 8):
+        self.max_size = max_size
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._user_jobs: Dict[str, deque] = {}  # user_id -> deque of (job, enqueued_at), while queued or running
+        self._pending = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.queue_wait_total = 0.0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_size=int(os.getenv("INGRESS_QUEUE_SIZE", "100")),
+            workers=int(os.getenv("INGRESS_WORKERS", "8")),
+        )
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Ingress queue started with {self.workers} workers, capacity {self.max_size}")
+
+    async def stop(self, drain_timeout: float = 10):
+        """Let queued work finish for up to drain_timeout seconds, then cancel the workers"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Ingress queue stopped with {self._pending} events undrained")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._user_jobs.clear()
+        self._pending = 0
+        logger.info(f"Ingress queue stopped. Metrics: {self.metrics()}")
+
+    def submit(self, user_id: str, job: Callable[[], Awaitable[None]]) -> bool:
+        """Enqueue job without waiting; returns False when the queue is saturated"""
+        if self._queue is None:
+            self.start()
+        if self._pending >= self.max_size:
+            self.rejected += 1
+            logger.warning(f"Ingress queue full ({self.max_size}), rejecting event from {user_id}")
+            return False
+        jobs = self._user_jobs.get(user_id)
+        if jobs is None:
+            # The user has nothing queued or running, so nobody will pick the job up unless they're scheduled
+            jobs = self._user_jobs[user_id] = deque()
+            self._queue.put_nowait(user_id)
+        jobs.append((job, time.monotonic()))
+        self._pending += 1
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self._pending)
+        return True
+
+    async def _worker(self, index: int):
+        while True:
+            user_id = await self._queue.get()
+            jobs = self._user_jobs[user_id]
+            job, enqueued_at = jobs.popleft()
+            self._pending -= 1
+            try:
+                self.queue_wait_total += time.monotonic() - enqueued_at
+                await job()
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ingress worker {index} job failed: {str(e)}", exc_info=True)
+            finally:
+                if jobs:
+                    # Back of the line, so a chatty user takes turns with everyone else
+                    self._queue.put_nowait(user_id)
+                else:
+                    del self._user_jobs[user_id]
+                self._queue.task_done()
+
+    def metrics(self) -> dict:
+        return {
+            "depth": self._pending,
+            "capacity": self.max_size,
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_queue_wait": self.queue_wait_total / self.processed if self.processed else 0.0,
+        }
@@ -0,0 +1,177 @@
+# server/metrics.py
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+from aiohttp import web
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+METRIC_PREFIX = "support_bot_"
+
+# Set per workflow node from AgentState["trace_id"]; tasks spawned inside the node inherit it
+current_trace_id: ContextVar[Optional[str]] = ContextVar("current_trace_id", default=None)
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+class JsonlTraceExporter:
+    """Appends finished spans to a JSON Lines file, flushing in batches"""
+
+    def __init__(self, path: str, batch_size: int = 100):
+        self.path = path
+        self.batch_size = batch_size
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def export(self, span: dict):
+        with self._lock:
+            self._buffer.append(span)
+            if len(self._buffer) < self.batch_size:
+                return
+            spans, self._buffer = self._buffer, []
+        self._write(spans)
+
+    def flush(self):
+        with self._lock:
+            spans, self._buffer = self._buffer, []
+        self._write(spans)
+
+    def _write(self, spans):
+        if not spans:
+            return
+        try:
+            with open(self.path, "a") as f:
+                f.writelines(json.dumps(span) + "\n" for span in spans)
+        except OSError as e:
+            logger.error(f"Trace export failed: {str(e)}")
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+class MetricsRegistry:
+    """In-process counters and latency histograms rendered in the Prometheus text format"""
+
+    def __init__(self, exporter: Optional[JsonlTraceExporter] = None):
+        self.exporter = exporter
+        self.histograms: Dict[LabelKey, Histogram] = {}
+        self.counters: Dict[LabelKey, float] = {}
+        self.collectors: Dict[str, Callable[[], dict]] = {}
+
+    @classmethod
+    def from_env(cls):
+        path = os.getenv("TRACE_EXPORT_PATH")
+        return cls(exporter=JsonlTraceExporter(path) if path else None)
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def register_collector(self, name: str, collect: Callable[[], dict]):
+        """Expose the numeric values of collect() as gauges named <prefix><name>_<key>"""
+        self.collectors[name] = collect
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Time a block into histogram `name`; callers may set labels["status"] before it exits"""
+        labels.setdefault("status", "ok")
+        start = time.perf_counter()
+        try:
+            yield labels
+        except BaseException:
+            labels["status"] = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(name, elapsed, **labels)
+            if self.exporter is not None:
+                self.exporter.export({
+                    "trace_id": current_trace_id.get(),
+                    "name": name,
+                    "start": time.time() - elapsed,
+                    "duration_ms": elapsed * 1000,
+                    "labels": labels,
+                })
+
+    def render(self) -> str:
+        lines = []
+        seen = set()
+
+        def header(metric, kind):
+            if metric not in seen:
+                seen.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            metric = METRIC_PREFIX + name
+            header(metric, "histogram")
+            cumulative = 0
+            for bound, count in zip(list(histogram.bounds) + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f"{metric}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{metric}_sum{fmt(labels)} {histogram.sum}")
+            lines.append(f"{metric}_count{fmt(labels)} {histogram.count}")
+        for (name, labels), value in sorted(self.counters.items()):
+            metric = METRIC_PREFIX + name
+            header(metric, "counter")
+            lines.append(f"{metric}{fmt(labels)} {value}")
+        for name, collect in sorted(self.collectors.items()):
+            try:
+                values = collect()
+            except Exception as e:
+                logger.error(f"Metrics collector {name} failed: {str(e)}")
+                continue
+            for key, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric = f"{METRIC_PREFIX}{name}_{key}"
+                    header(metric, "gauge")
+                    lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry.from_env()
+
+async def start_metrics_server(port: int, host: str = "127.0.0.1") -> web.AppRunner:
+    """Serve GET /metrics for a local Prometheus scraper"""
+    async def handle(request):
+        return web.Response(text=metrics.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+    return runner
+
+async def stop_metrics_server(runner: Optional[web.AppRunner]):
+    if runner is not None:
+        await runner.cleanup()
+    if metrics.exporter is not None:
+        metrics.exporter.flush()
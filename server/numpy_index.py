@@ -0,0 +1,208 @@
+# server/numpy_index.py
+from langchain_core.documents import Document
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+import asyncio
+import json
+import logging
+import os
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.npy"
+OFFSETS_FILE = "offsets.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+# Knowledge version of the export, so the answer cache needn't ask Postgres
+MANIFEST_FILE = "manifest.json"
+
+def write_numpy_index(path: str, rows: Iterable[Tuple[str, str, dict, np.ndarray]], count: int, dimensions: int,
+                      version: Optional[str] = None):
+    """Write (id, document, metadata, embedding) rows as a memory-mappable index directory.
+
+    Files are built in a sibling temp directory and swapped in, so readers never see a partial index.
+    """
+    tmp_path = f"{path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    vectors = np.lib.format.open_memmap(
+        os.path.join(tmp_path, VECTORS_FILE), mode="w+", dtype=np.float32, shape=(count, dimensions)
+    )
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    written = 0
+    with open(os.path.join(tmp_path, DOCUMENTS_FILE), "wb") as documents:
+        for i, (doc_id, text, metadata, embedding) in enumerate(rows):
+            vector = np.asarray(embedding, dtype=np.float32)
+            vectors[i] = vector / (np.linalg.norm(vector) or 1.0)
+            line = json.dumps({"id": doc_id, "document": text, "metadata": metadata}).encode("utf-8") + b"\n"
+            documents.write(line)
+            offsets[i + 1] = offsets[i] + len(line)
+            written = i + 1
+    if written != count:
+        raise ValueError(f"Expected {count} rows for the vector index, got {written}")
+    vectors.flush()
+    del vectors
+    np.save(os.path.join(tmp_path, OFFSETS_FILE), offsets)
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w") as f:
+        json.dump({"version": version, "count": count, "dimensions": dimensions}, f)
+
+    old_path = f"{path}.old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, old_path)
+    os.rename(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+class IndexGeneration:
+    """One export's vectors, offsets and documents, opened together so they always agree.
+
+    write_numpy_index swaps directories, so a reader holding an older
+    generation keeps reading the old (unlinked) files until it lets go.
+    """
+
+    def __init__(self, path: str):
+        vectors_path = os.path.join(path, VECTORS_FILE)
+        self.mtime = os.stat(vectors_path).st_mtime_ns
+        # mmap_mode="r" maps the file instead of reading it, so worker processes share one copy
+        self.vectors = np.load(vectors_path, mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        self.documents = open(os.path.join(path, DOCUMENTS_FILE), "rb")
+        # A swap between the opens above would pair files from two exports
+        if (len(self.offsets) != self.vectors.shape[0] + 1
+                or os.fstat(self.documents.fileno()).st_size != int(self.offsets[-1])):
+            self.documents.close()
+            raise OSError(f"Vector index {path} changed while it was being opened")
+        try:
+            with open(os.path.join(path, MANIFEST_FILE)) as f:
+                self.version = json.load(f).get("version")
+        except (OSError, ValueError):
+            # Exports written before the manifest existed
+            self.version = None
+
+    def read(self, row: int) -> Document:
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        # pread doesn't move a shared file position, so concurrent searches can share the handle
+        record = json.loads(os.pread(self.documents.fileno(), end - start, start))
+        return Document(id=record["id"], page_content=record["document"], metadata=record["metadata"])
+
+class NumpyVectorStore:
+    """Read-only, memory-mapped exact-search index shared through the OS page cache.
+
+    Queries that arrive while a scan is running are searched together in the
+    next scan, so concurrent requests share one pass over the matrix.
+    """
+
+    def __init__(self, path: str, embeddings, block_rows: int = 65536, reload_interval: float = 30,
+                 max_batch: int = 64):
+        self.path = path
+        self.embeddings = embeddings
+        self.block_rows = block_rows
+        self.reload_interval = reload_interval
+        self.max_batch = max_batch
+        self._checked_at = 0.0
+        self._generation = None
+        self._pending = []
+        self._drainer = None
+        self.batches = 0
+        self.queries = 0
+        try:
+            self._load()
+        except OSError as e:
+            # Searches return nothing until an export appears and the next reload picks it up
+            logger.warning(f"No vector index at {self.path} yet: {str(e)}")
+
+    @property
+    def vectors(self):
+        return self._generation.vectors if self._generation else None
+
+    @property
+    def version(self) -> Optional[str]:
+        """Knowledge version of the generation searches currently read"""
+        self._maybe_reload()
+        return self._generation.version if self._generation else None
+
+    def _load(self):
+        self._generation = IndexGeneration(self.path)
+        logger.info(f"Mapped vector index {self.path}: {self.vectors.shape[0]} x {self.vectors.shape[1]}")
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        self._checked_at = now
+        try:
+            loaded = self._generation.mtime if self._generation else None
+            if os.stat(os.path.join(self.path, VECTORS_FILE)).st_mtime_ns != loaded:
+                self._load()
+        except OSError as e:
+            logger.error(f"Vector index reload failed: {str(e)}")
+
+    def search_by_vectors(self, queries: np.ndarray, k: int, generation: IndexGeneration = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact cosine top-k for a batch of queries, scanning the matrix block by block"""
+        vectors = (generation or self._generation).vectors
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        total = vectors.shape[0]
+        k = min(k, total)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, total, self.block_rows):
+            block = vectors[start:start + self.block_rows]
+            scores = np.concatenate([best_scores, queries @ block.T], axis=1)
+            ids = np.concatenate([best_ids, np.broadcast_to(np.arange(start, start + len(block)), (len(queries), len(block)))], axis=1)
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if scores.shape[1] > k else np.argsort(-scores, axis=1)
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_ids = np.take_along_axis(ids, top, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_ids, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def get_documents(self, rows: Iterable[int], generation: IndexGeneration = None) -> List[Document]:
+        generation = generation or self._generation
+        return [generation.read(int(row)) for row in rows]
+
+    def _search_batch(self, vectors: list, k: int) -> List[List[Document]]:
+        # Vectors and documents both come from the generation current when the scan starts
+        generation = self._generation
+        ids, _ = self.search_by_vectors(np.asarray(vectors, dtype=np.float32), k, generation)
+        return [self.get_documents(row_ids, generation) for row_ids in ids]
+
+    async def _drain(self):
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            # Waiters cancelled while queued (retrieval timeout) are dropped
+            batch = [entry for entry in batch if not entry[2].done()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.queries += len(batch)
+            try:
+                # The scan is CPU-bound; keep it off the event loop
+                results = await asyncio.to_thread(self._search_batch, [vector for vector, _, _ in batch],
+                                                  max(k for _, k, _ in batch))
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, k, future), documents in zip(batch, results):
+                if not future.done():
+                    future.set_result(documents[:k])
+
+    async def asimilarity_search(self, query: str, k: int = 3) -> List[Document]:
+        self._maybe_reload()
+        if self._generation is None or self.vectors.shape[0] == 0:
+            return []
+        vector = await self.embeddings.aembed_query(query)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((vector, k, future))
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain())
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries": self.queries,
+            "avg_batch": self.queries / self.batches if self.batches else 0.0,
+        }
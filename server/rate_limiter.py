@@ -0,0 +1,336 @@
+# server/rate_limiter.py
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Dict, Optional
+from openai import APIConnectionError
+from server.metrics import metrics
+from server.shared_state import BudgetLeases, get_shared_state
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+TRANSIENT_STATUSES = {500, 502, 503, 504}
+# Provider clients run with their own retries off, so connection failures are retried here
+TRANSIENT_ERRORS = (APIConnectionError,)
+
+# Slack traffic runs at the default; ingestion marks its context as BACKGROUND
+request_priority: ContextVar[int] = ContextVar("request_priority", default=INTERACTIVE)
+
+# Per-provider defaults, overridable with RATE_LIMIT_<PROVIDER>_{RPM,TPM,CONCURRENCY}; 0 means unlimited
+PROVIDER_DEFAULTS = {
+    "openai": {"rpm": 500, "tpm": 200000, "concurrency": int(os.getenv("LLM_MAX_CONCURRENCY", "16"))},
+    "openai_embeddings": {"rpm": 3000, "tpm": 1000000, "concurrency": 16},
+    "tavily": {"rpm": 100, "tpm": 0, "concurrency": 8},
+    "openweather": {"rpm": 60, "tpm": 0, "concurrency": 8},
+    "google_calendar": {"rpm": 600, "tpm": 0, "concurrency": 8},
+}
+
+def estimate_tokens(text: str) -> int:
+    """Rough OpenAI token count (about four characters per token) used to pre-book budget"""
+    return len(text) // 4 + 1
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait from Retry-After (seconds or HTTP date) or OpenAI's retry-after-ms header"""
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def status_of(error: BaseException) -> Optional[int]:
+    return getattr(error, "status_code", None)
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 per second up to burst_seconds worth of budget"""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, reserve: float = 0.0) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        # Requests larger than the bucket wait for a full bucket and then run into debt
+        needed = min(amount, self.capacity - reserve) + reserve
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate
+
+    def take(self, amount: float):
+        self._refill(time.monotonic())
+        self.level -= amount
+
+class Permit:
+    """Handed to callers inside ProviderLimiter.slot to report throttling and actual usage"""
+
+    def __init__(self):
+        self.retry_after: Optional[float] = None
+        self.tokens_used: Optional[int] = None
+
+    def throttle(self, retry_after: Optional[float] = None):
+        self.retry_after = retry_after if retry_after is not None else 1.0
+
+class ProviderLimiter:
+    """Token-bucket budgets, AIMD concurrency and priority ordering for one upstream provider.
+
+    With shared state the request and token budgets are booked in buckets every worker
+    process draws from, so the deployment as a whole stays inside the provider's quota.
+    Concurrency limits stay per process.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_concurrency: int = 16, min_concurrency: int = 1, background_share: float = 0.5,
+                 burst_seconds: float = 10, max_retries: int = 3, latency_tolerance: float = 2.0,
+                 shared=None, lease_seconds: float = 1.0):
+        self.name = name
+        self.shared = shared
+        # Shared budget is booked a lease at a time, not once per call
+        self.leases = BudgetLeases(shared, lease_seconds) if shared is not None else None
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.burst_seconds = burst_seconds
+        local = shared is None
+        self.requests = TokenBucket(requests_per_minute, burst_seconds) if requests_per_minute and local else None
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds) if tokens_per_minute and local else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        # Background work may only drain the buckets down to this fraction, keeping headroom for Slack
+        self.background_reserve = 1.0 - background_share
+        self.max_retries = max_retries
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.throttled = 0
+        self.completed = 0
+        self._latency_short: Optional[float] = None
+        self._latency_long: Optional[float] = None
+        self._blocked_until = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    @classmethod
+    def from_env(cls, name: str, shared=None):
+        defaults = PROVIDER_DEFAULTS.get(name, {"rpm": 0, "tpm": 0, "concurrency": 16})
+        prefix = f"RATE_LIMIT_{name.upper()}"
+        return cls(
+            name,
+            requests_per_minute=float(os.getenv(f"{prefix}_RPM", str(defaults["rpm"]))),
+            tokens_per_minute=float(os.getenv(f"{prefix}_TPM", str(defaults["tpm"]))),
+            max_concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", str(defaults["concurrency"]))),
+            background_share=float(os.getenv("RATE_LIMIT_BACKGROUND_SHARE", "0.5")),
+            burst_seconds=float(os.getenv("RATE_LIMIT_BURST_SECONDS", "10")),
+            max_retries=int(os.getenv("RATE_LIMIT_MAX_RETRIES", "3")),
+            shared=shared,
+            lease_seconds=float(os.getenv("RATE_LIMIT_LEASE_SECONDS", "1")),
+        )
+
+    def _wait_time(self, priority: int, tokens: int) -> float:
+        wait = self._blocked_until - time.monotonic()
+        share = self.background_reserve if priority == BACKGROUND else 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, share * self.requests.capacity))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.wait_time(tokens, share * self.tokens.capacity))
+        return wait
+
+    def _dispatch(self):
+        """Grant waiters in priority order while concurrency and budget allow"""
+        while self._waiters and self.in_flight < max(1, int(self.limit)):
+            priority, _, future, tokens = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = self._wait_time(priority, tokens)
+            if wait > 0:
+                # A newly queued, higher-priority waiter may be due sooner than the pending wake-up
+                loop = asyncio.get_running_loop()
+                due = loop.time() + wait
+                if self._timer is None or due < self._timer.when() - 0.001:
+                    if self._timer is not None:
+                        self._timer.cancel()
+                    self._timer = loop.call_at(due, self._wake)
+                return
+            heapq.heappop(self._waiters)
+            if self.requests is not None:
+                self.requests.take(1)
+            if self.tokens is not None and tokens:
+                self.tokens.take(tokens)
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    async def _book_shared(self, tokens: int, priority: int):
+        """Book the call against the deployment-wide budgets and wait until they cover it"""
+        reserve_share = self.background_reserve if priority == BACKGROUND else 0.0
+        try:
+            wait = 0.0
+            if self.requests_per_minute:
+                wait = await self.leases.take(f"{self.name}:requests", 1, self.requests_per_minute,
+                                              self.burst_seconds, reserve_share)
+            if self.tokens_per_minute and tokens:
+                wait = max(wait, await self.leases.take(f"{self.name}:tokens", tokens, self.tokens_per_minute,
+                                                        self.burst_seconds, reserve_share))
+        except Exception as e:
+            # AIMD and Retry-After handling still protect the provider while the store is down
+            logger.error(f"{self.name} shared budget unavailable, continuing without it: {str(e)}")
+            return
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _share_outcome(self, retry_after: Optional[float], token_delta: int):
+        try:
+            if retry_after is not None:
+                await self.shared.pause(f"{self.name}:requests", retry_after)
+            if token_delta and self.tokens_per_minute:
+                await self.leases.take(f"{self.name}:tokens", token_delta, self.tokens_per_minute,
+                                       self.burst_seconds)
+        except Exception as e:
+            logger.error(f"{self.name} shared budget update failed: {str(e)}")
+
+    async def acquire(self, tokens: int = 0, priority: Optional[int] = None):
+        priority = request_priority.get() if priority is None else priority
+        start = time.monotonic()
+        if self.shared is not None:
+            await self._book_shared(tokens, priority)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future, tokens))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted just before the caller was cancelled: hand the slot back
+            if future.done() and not future.cancelled():
+                self.release(0.0)
+            raise
+        metrics.observe("rate_limit_wait_seconds", time.monotonic() - start,
+                        provider=self.name, priority=PRIORITY_NAMES.get(priority, str(priority)))
+
+    def release(self, latency: float, retry_after: Optional[float] = None, booked_tokens: int = 0,
+                tokens_used: Optional[int] = None):
+        self.in_flight -= 1
+        if tokens_used is not None and self.tokens is not None:
+            self.tokens.take(tokens_used - booked_tokens)
+        if self.leases is not None and retry_after is not None:
+            # The provider disagrees with the leased budget; book afresh and see other workers' pauses
+            self.leases.drop(f"{self.name}:requests")
+        if self.shared is not None and (retry_after is not None or tokens_used is not None):
+            # Other workers stop on this worker's 429, and actual token usage corrects the booking
+            self._spawn(self._share_outcome(retry_after, (tokens_used or booked_tokens) - booked_tokens))
+        if retry_after is not None:
+            # Multiplicative decrease on 429, and hold every caller until the provider's Retry-After
+            self.throttled += 1
+            now = time.monotonic()
+            # Concurrent 429s from the same burst only halve the limit once
+            if now >= self._blocked_until:
+                self.limit = max(self.min_concurrency, self.limit / 2)
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+            metrics.inc("rate_limit_throttled_total", provider=self.name)
+            logger.warning(f"{self.name} throttled; concurrency limit now {self.limit:.1f}, pausing {retry_after:.1f}s")
+        elif latency > 0:
+            self.completed += 1
+            # Fast vs. slow latency averages: a mix of short and long calls keeps them level,
+            # while upstream queueing pushes the fast one up first
+            if self._latency_short is None:
+                self._latency_short = self._latency_long = latency
+            self._latency_short += 0.2 * (latency - self._latency_short)
+            self._latency_long += 0.02 * (latency - self._latency_long)
+            if self._latency_short > self._latency_long * self.latency_tolerance:
+                self.limit = max(self.min_concurrency, self.limit * 0.95)
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0, priority: Optional[int] = None):
+        """Hold one request slot; 429-shaped exceptions are reported to the limiter automatically"""
+        await self.acquire(tokens, priority)
+        permit = Permit()
+        start = time.monotonic()
+        try:
+            yield permit
+        except Exception as e:
+            if status_of(e) == 429:
+                permit.throttle(parse_retry_after(getattr(getattr(e, "response", None), "headers", None)))
+            raise
+        finally:
+            self.release(time.monotonic() - start, permit.retry_after, tokens, permit.tokens_used)
+
+    async def call(self, fn: Callable[[], Awaitable], tokens: int = 0, priority: Optional[int] = None,
+                   usage: Optional[Callable] = None, retry_on=TRANSIENT_ERRORS):
+        """Run fn under the limiter, retrying throttled and transient failures"""
+        attempt = 0
+        while True:
+            try:
+                async with self.slot(tokens, priority) as permit:
+                    result = await fn()
+                    if usage is not None:
+                        permit.tokens_used = usage(result)
+                    return result
+            except Exception as e:
+                throttled = status_of(e) == 429
+                transient = status_of(e) in TRANSIENT_STATUSES or isinstance(e, retry_on)
+                if not (throttled or transient) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                logger.warning(f"{self.name} request failed ({str(e) or type(e).__name__}), retry {attempt}/{self.max_retries}")
+                if transient:
+                    await asyncio.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+
+    def stats(self) -> dict:
+        stats = {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": sum(1 for _, _, future, _ in self._waiters if not future.done()),
+            "throttled": self.throttled,
+            "completed": self.completed,
+        }
+        if self.leases is not None:
+            stats.update({f"budget_{name}": value for name, value in self.leases.stats().items()})
+        return stats
+
+_limiters: Dict[str, ProviderLimiter] = {}
+
+def get_rate_limiter(provider: str) -> ProviderLimiter:
+    """Get the process-wide limiter for a provider, configured from the environment"""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        limiter = _limiters[provider] = ProviderLimiter.from_env(provider, shared=get_shared_state())
+        metrics.register_collector(f"rate_limit_{provider}", limiter.stats)
+    return limiter
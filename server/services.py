@@ -1,17 +1,20 @@
 #server/services.py
 
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from tavily import Client
+from server.http_client import get_http_client
+from server.metrics import metrics
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
 import os
 import pickle
-from datetime import datetime, timedelta
-import aiohttp
+from datetime import datetime, timedelta, timezone
 import pytz
 import logging
 import asyncio
+import json
+import re
+import threading
+import time
+import uuid
 # Configure logger
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.ERROR)
@@ -28,17 +31,61 @@ class WeatherService:
             "appid": self.api_key,
             "units": "metric"
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.get(self.base_url, params=params) as response:
-                if response.status == 200:
-                    return await response.json()
-                raise Exception(f"Weather API error: {response.status}")
+        status, data = await get_http_client().request_json(
+            "GET", self.base_url, provider="openweather", params=params
+        )
+        if status == 200:
+            return data
+        raise Exception(f"Weather API error: {status}")
+
+class CalendarConflictError(Exception):
+    """The requested time overlaps something already on the calendar"""
+
+def _encode_batch(boundary: str, requests: List[Tuple[str, str, dict]]) -> bytes:
+    """multipart/mixed body for Google's batch endpoint, one application/http part per request"""
+    parts = []
+    for i, (method, path, body) in enumerate(requests):
+        parts.append(
+            f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <item{i}>\r\n\r\n"
+            f"{method} {path} HTTP/1.1\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n"
+            f"{json.dumps(body)}\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n")
+    return "".join(parts).encode("utf-8")
+
+def _decode_batch(body: str) -> Dict[int, Tuple[int, Any]]:
+    """Split a batch response into {request index: (status, decoded body)}"""
+    body = body.replace("\r\n", "\n").lstrip()
+    delimiter = body.split("\n", 1)[0].strip()
+    results = {}
+    for part in body.split(delimiter)[1:]:
+        if part.startswith("--"):
+            break
+        headers, _, response = part.strip().partition("\n\n")
+        match = re.search(r"Content-ID:\s*<response-item(\d+)>", headers, re.IGNORECASE)
+        if match is None:
+            continue
+        status_line, _, rest = response.partition("\n")
+        _, _, payload = rest.partition("\n\n")
+        payload = payload.strip()
+        results[int(match.group(1))] = (int(status_line.split()[1]), json.loads(payload) if payload else None)
+    return results
 
 class CalendarService:
+    """Google Calendar over the shared aiohttp client.
+
+    Inserts arriving within batch_wait of each other go out as one batch request,
+    each insert is checked against a cached free/busy view of its day first, and
+    the OAuth token is refreshed in a worker thread ahead of expiry.
+    """
     SCOPES = ['https://www.googleapis.com/auth/calendar.events']
     PORT = 58408  # Set fixed port
-    
-    def __init__(self):
+    # Retried one by one when a batch item fails with these
+    ITEM_RETRY_STATUSES = {403, 429, 500, 502, 503, 504}
+
+    def __init__(self, creds=None, base_url: str = "https://www.googleapis.com", calendar_id: str = "primary",
+                 batch_size: int = 50, batch_wait: float = 0.02, freebusy_ttl: float = 60,
+                 refresh_margin: float = 300, check_conflicts: bool = False):
         self.credentials_path = os.path.join(
             os.path.dirname(os.path.dirname(__file__)), 
             'credentials',
@@ -49,10 +96,43 @@ class CalendarService:
             'credentials',
             'token.pickle'
         )
-        self.creds = self._load_credentials()
-        self.service = build('calendar', 'v3', credentials=self.creds)
+        # Credentials passed in (tests, service accounts) are not written back to token.pickle
+        self.persist_credentials = creds is None
+        self.creds = self._load_credentials() if creds is None else creds
+        self.base_url = base_url.rstrip("/")
+        self.calendar_id = calendar_id
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.freebusy_ttl = freebusy_ttl
+        self.refresh_margin = refresh_margin
+        self.check_conflicts = check_conflicts
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self._busy: Dict[str, Tuple[float, list]] = {}
+        self._busy_fetches: Dict[str, asyncio.Task] = {}
+        self._refreshing: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.inserts = 0
+        self.refreshes = 0
+        self.conflicts = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            base_url=os.getenv("GOOGLE_CALENDAR_API_URL", "https://www.googleapis.com"),
+            calendar_id=os.getenv("GOOGLE_CALENDAR_ID", "primary"),
+            batch_size=int(os.getenv("CALENDAR_BATCH_SIZE", "50")),
+            batch_wait=float(os.getenv("CALENDAR_BATCH_WAIT_MS", "20")) / 1000,
+            freebusy_ttl=float(os.getenv("CALENDAR_FREEBUSY_TTL", "60")),
+            refresh_margin=float(os.getenv("CALENDAR_TOKEN_REFRESH_MARGIN", "300")),
+            check_conflicts=os.getenv("CALENDAR_CHECK_CONFLICTS", "false").lower() == "true",
+        )
 
     def _load_credentials(self):
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.transport.requests import Request
         creds = None
         
         try:
@@ -88,10 +168,120 @@ class CalendarService:
             logger.error(f"Calendar authentication failed: {str(e)}")
             raise
 
+    def _refresh_credentials(self):
+        """Blocking token refresh; only ever called through asyncio.to_thread"""
+        from google.auth.transport.requests import Request
+        self.creds.refresh(Request())
+        if self.persist_credentials:
+            with open(self.token_path, 'wb') as token:
+                pickle.dump(self.creds, token)
+
+    def _expires_in(self) -> float:
+        expiry = getattr(self.creds, "expiry", None)
+        if expiry is None:
+            return float("inf")
+        # google-auth keeps expiry as naive UTC
+        return (expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+
+    async def _refresh(self):
+        """Refresh the token off the event loop; concurrent callers share one refresh"""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._run_refresh())
+        await asyncio.shield(self._refreshing)
+
+    async def _run_refresh(self):
+        start = time.perf_counter()
+        await asyncio.to_thread(self._refresh_credentials)
+        self.refreshes += 1
+        metrics.observe("calendar_token_refresh_seconds", time.perf_counter() - start)
+        logger.info(f"Calendar token refreshed, valid for {self._expires_in():.0f}s")
+
+    async def _refresh_loop(self):
+        """Keep the token fresh ahead of expiry so requests never wait on a refresh"""
+        while getattr(self.creds, "refresh_token", None) and self._expires_in() != float("inf"):
+            await asyncio.sleep(max(self._expires_in() - self.refresh_margin, 1))
+            try:
+                await self._refresh()
+            except Exception as e:
+                logger.error(f"Calendar token refresh failed: {str(e)}")
+                await asyncio.sleep(30)
+
+    async def _access_token(self, force_refresh: bool = False) -> str:
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+        if force_refresh or not self.creds.token or self._expires_in() <= 0:
+            await self._refresh()
+        return self.creds.token
+
+    async def _request(self, method: str, path: str, **kwargs):
+        """Authorized call to the Calendar API; a 401 refreshes the token and retries once"""
+        headers = kwargs.pop("headers", {})
+        for attempt in range(2):
+            token = await self._access_token(force_refresh=attempt > 0)
+            status, body = await get_http_client().request_json(
+                method, f"{self.base_url}{path}", provider="google_calendar",
+                headers={**headers, "Authorization": f"Bearer {token}"}, **kwargs
+            )
+            if status != 401:
+                break
+        return status, body
+
+    async def _busy_for_day(self, day: str) -> list:
+        cached = self._busy.get(day)
+        if cached is not None and time.monotonic() - cached[0] < self.freebusy_ttl:
+            metrics.inc("calendar_freebusy_total", result="hit")
+            return cached[1]
+        fetch = self._busy_fetches.get(day)
+        if fetch is None:
+            metrics.inc("calendar_freebusy_total", result="miss")
+            fetch = self._busy_fetches[day] = asyncio.create_task(self._fetch_busy(day))
+            fetch.add_done_callback(lambda _: self._busy_fetches.pop(day, None))
+        return await asyncio.shield(fetch)
+
+    async def _fetch_busy(self, day: str) -> list:
+        start = datetime.fromisoformat(day).replace(tzinfo=timezone.utc)
+        status, body = await self._request("POST", "/calendar/v3/freeBusy", json={
+            "timeMin": start.isoformat(),
+            "timeMax": (start + timedelta(days=1)).isoformat(),
+            "items": [{"id": self.calendar_id}],
+        })
+        if status != 200:
+            raise Exception(f"Calendar free/busy error: {status}")
+        busy = [
+            (datetime.fromisoformat(b["start"].replace('Z', '+00:00')), datetime.fromisoformat(b["end"].replace('Z', '+00:00')))
+            for b in body["calendars"][self.calendar_id].get("busy", [])
+        ]
+        self._busy[day] = (time.monotonic(), busy)
+        return busy
+
+    async def _reserve(self, start: datetime, end: datetime) -> list:
+        """Check the slot against free/busy and hold it in the cache; returns the lists holding it"""
+        days = sorted({(start + timedelta(days=i)).date().isoformat() for i in range((end - start).days + 1)}
+                      | {(end - timedelta(microseconds=1)).date().isoformat()})
+        try:
+            views = [await self._busy_for_day(day) for day in days]
+        except Exception as e:
+            logger.warning(f"Free/busy lookup failed, scheduling without a conflict check: {str(e)}")
+            return []
+        # No await between the check and the hold, so concurrent requests for one slot can't both pass
+        for busy in views:
+            for busy_start, busy_end in busy:
+                if busy_start < end and start < busy_end:
+                    self.conflicts += 1
+                    metrics.inc("calendar_conflicts_total")
+                    raise CalendarConflictError(
+                        f"{start:%Y-%m-%d %H:%M}-{end:%H:%M} UTC overlaps an existing event"
+                    )
+        for busy in views:
+            busy.append((start, end))
+        return views
+
     async def create_event(self, title: str, start_time: str, duration: int):
         try:
             # Parse the start time
             start = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
+            if start.tzinfo is None:
+                start = start.replace(tzinfo=timezone.utc)
             
             # Calculate end time using timedelta
             end = start + timedelta(minutes=duration)
@@ -111,33 +301,145 @@ class CalendarService:
                 }
             }
             
-            result = await asyncio.to_thread(
-                self.service.events().insert,
-                calendarId='primary',
-                body=event,
-                sendUpdates='all'
-            )
-            return result.execute()
+            held = await self._reserve(start, end) if self.check_conflicts else []
+            inserted = False
+            try:
+                result = await self._insert(event)
+                inserted = True
+                return result
+            finally:
+                # Also on cancellation, which `except Exception` would not see
+                if not inserted:
+                    for busy in held:
+                        busy.remove((start, end))
             
+        except CalendarConflictError as e:
+            logger.info(f"Not scheduling {title}: {str(e)}")
+            raise
         except Exception as e:
             logger.error(f"Failed to create calendar event: {str(e)}")
             raise
 
+    def _events_path(self) -> str:
+        return f"/calendar/v3/calendars/{quote(self.calendar_id)}/events?sendUpdates=all"
+
+    async def _insert(self, event: dict) -> dict:
+        if self.batch_size <= 1:
+            return await self._insert_one(event)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((event, future))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_wait, self._flush)
+        return await future
+
+    async def _insert_one(self, event: dict) -> dict:
+        status, body = await self._request("POST", self._events_path(), json=event)
+        if status != 200:
+            raise Exception(f"Calendar API error: {status}")
+        self.inserts += 1
+        return body
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch):
+        batch = [(event, future) for event, future in batch if not future.done()]
+        if not batch:
+            return
+        if len(batch) == 1:
+            results = [await self._settle(self._insert_one(batch[0][0]))]
+        else:
+            results = await self._send_batch([event for event, _ in batch])
+        for (_, future), (result, error) in zip(batch, results):
+            if not future.done():
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+    async def _settle(self, coro) -> Tuple[Any, Optional[Exception]]:
+        try:
+            return await coro, None
+        except Exception as e:
+            return None, e
+
+    async def _send_batch(self, events: List[dict]) -> List[Tuple[Any, Optional[Exception]]]:
+        """One batch HTTP request for several inserts; returns (result, error) per event"""
+        self.batches += 1
+        metrics.observe("calendar_batch_size", len(events))
+        boundary = f"batch_{uuid.uuid4().hex}"
+        path = self._events_path()
+        try:
+            status, body = await self._request(
+                "POST", "/batch/calendar/v3",
+                headers={"Content-Type": f"multipart/mixed; boundary={boundary}"},
+                data=_encode_batch(boundary, [("POST", path, event) for event in events]),
+            )
+            if status != 200:
+                raise Exception(f"Calendar batch error: {status}")
+            items = _decode_batch(body)
+        except Exception as e:
+            logger.error(f"Calendar batch of {len(events)} failed: {str(e)}")
+            return [(None, e)] * len(events)
+
+        results = []
+        for i, event in enumerate(events):
+            item_status, item_body = items.get(i, (None, None))
+            if item_status == 200:
+                self.inserts += 1
+                results.append((item_body, None))
+            elif item_status in self.ITEM_RETRY_STATUSES:
+                # Per-item quota or server errors go through the single-request path and its retries
+                results.append(await self._settle(self._insert_one(event)))
+            else:
+                results.append((None, Exception(f"Calendar API error: {item_status}")))
+        return results
+
+    async def close(self):
+        for task in (self._refresher, self._refreshing, *self._tasks):
+            if task is not None and not task.done():
+                task.cancel()
+        self._refresher = None
+
+    def stats(self) -> dict:
+        return {
+            "inserts": self.inserts,
+            "batches": self.batches,
+            "refreshes": self.refreshes,
+            "conflicts": self.conflicts,
+        }
+
 class WebSearchService:
     def __init__(self):
-        from tavily import TavilyClient
-        self.client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+        self.api_key = os.getenv("TAVILY_API_KEY")
+        self.base_url = "https://api.tavily.com/search"
 
     async def search(self, query: str, max_results: int = 3, search_depth="basic"):
         try:
-            # Note: Tavily's search might be synchronous
-            result = await asyncio.to_thread(
-                self.client.search,
-                query=query,
-                search_depth=search_depth,
-                # Remove max_results from here as it's not supported by Tavily API
+            # Call the Tavily REST API directly over the shared async HTTP client
+            status, result = await get_http_client().request_json(
+                "POST",
+                self.base_url,
+                provider="tavily",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={
+                    "query": query,
+                    "search_depth": search_depth,
+                }
             )
-            # Instead, limit results after receiving them
+            if status != 200:
+                raise Exception(f"Tavily API error: {status}")
+            # Limit results after receiving them
             if 'results' in result:
                 result['results'] = result['results'][:max_results]
             return result
@@ -147,4 +449,63 @@ class WebSearchService:
                 'status': 'error',
                 'message': str(e),
                 'results': []
-            }
\ No newline at end of file
+            }
+
+class ServiceRegistry:
+    """Builds each external service client once, on first use"""
+
+    def __init__(self, factories: Dict[str, Callable[[], Any]]):
+        self._factories = dict(factories)
+        self._instances: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Replace the factory for a service, dropping any instance already built"""
+        with self._lock:
+            self._factories[name] = factory
+            self._instances.pop(name, None)
+
+    def get(self, name: str):
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    start = time.perf_counter()
+                    instance = self._instances[name] = self._factories[name]()
+                    logger.info(f"Built {name} service in {(time.perf_counter() - start) * 1000:.0f}ms")
+        return instance
+
+    async def aget(self, name: str):
+        instance = self._instances.get(name)
+        if instance is None:
+            instance = await asyncio.to_thread(self.get, name)
+        return instance
+
+    def built(self) -> list:
+        return sorted(self._instances)
+
+    async def close(self):
+        """Close every built client that holds background tasks or connections"""
+        for name in self.built():
+            close = getattr(self._instances[name], "close", None)
+            if close is not None:
+                await close()
+
+# Factories look the classes up at call time, so a replaced class is picked up too
+service_registry = ServiceRegistry({
+    "weather": lambda: WeatherService(),
+    "calendar": lambda: CalendarService.from_env(),
+    "web_search": lambda: WebSearchService(),
+})
+
+def get_service(name: str):
+    """Get the shared client for "weather", "calendar" or "web_search", building it on first use"""
+    return service_registry.get(name)
+
+async def aget_service(name: str):
+    """Like get_service, but a first build (OAuth, discovery) runs off the event loop"""
+    return await service_registry.aget(name)
+
+async def close_services():
+    await service_registry.close()
@@ -0,0 +1,377 @@
+# server/shared_state.py
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import text
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Expired rows are deleted once every this many writes
+PRUNE_EVERY = 500
+
+class SharedState(ABC):
+    """State the worker processes of one deployment coordinate through.
+
+    Backs the cross-process parts of event dedup, the answer and tool caches and
+    provider rate-limit budgets. Times are epoch seconds from the backend's clock.
+    """
+
+    @abstractmethod
+    async def claim_event(self, event_id: str, ttl: float) -> bool:
+        """Claim a Slack event id; False when another worker claimed it inside ttl"""
+
+    @abstractmethod
+    async def cache_get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        """(value, seconds left) for a live entry, else None"""
+
+    @abstractmethod
+    async def cache_set(self, namespace: str, key: str, value: Any, ttl: float):
+        """Store value under namespace/key for ttl seconds"""
+
+    @abstractmethod
+    async def cache_changes(self, namespace: str, since: int, limit: int = 500) -> Tuple[List[Tuple[str, Any, float]], int]:
+        """Live entries written after version `since` as (key, value, seconds left), and the newest version"""
+
+    @abstractmethod
+    async def take_budget(self, bucket: str, amount: float, per_minute: float, burst_seconds: float,
+                          reserve_share: float = 0.0) -> float:
+        """Book amount from a shared token bucket; returns seconds to wait before using it.
+
+        Bookings always succeed and may run the bucket into debt, so the wait is
+        how long the bucket needs to refill back to reserve_share of its capacity.
+        A negative amount hands budget back.
+        """
+
+    @abstractmethod
+    async def pause(self, bucket: str, seconds: float):
+        """Hold every booking from bucket for seconds, e.g. after a 429 with Retry-After"""
+
+    async def close(self):
+        pass
+
+class PostgresSharedState(SharedState):
+    """SharedState in the Postgres database the bot already uses"""
+
+    NOW = "EXTRACT(EPOCH FROM clock_timestamp())"
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS bot_event_claims (event_id text PRIMARY KEY, expires_at double precision NOT NULL)",
+        "CREATE SEQUENCE IF NOT EXISTS bot_cache_version",
+        """CREATE TABLE IF NOT EXISTS bot_cache (
+            namespace text NOT NULL, key text NOT NULL, value jsonb NOT NULL,
+            expires_at double precision NOT NULL, version bigint NOT NULL, PRIMARY KEY (namespace, key))""",
+        "CREATE INDEX IF NOT EXISTS bot_cache_changes ON bot_cache (namespace, version)",
+        """CREATE TABLE IF NOT EXISTS bot_rate_buckets (
+            name text PRIMARY KEY, tokens double precision NOT NULL, updated_at double precision NOT NULL,
+            blocked_until double precision NOT NULL DEFAULT 0)""",
+    ]
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._ready = False
+        self._schema_lock = asyncio.Lock()
+        self._writes = 0
+
+    async def _ensure_schema(self):
+        if self._ready:
+            return
+        async with self._schema_lock:
+            if not self._ready:
+                async with self.engine.begin() as conn:
+                    # Workers start together; serialise the CREATEs so they don't race on the catalog
+                    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('bot_shared_state'))"))
+                    for statement in self.SCHEMA:
+                        await conn.execute(text(statement))
+                self._ready = True
+
+    async def _execute(self, sql: str, **params):
+        await self._ensure_schema()
+        async with self.engine.begin() as conn:
+            result = await conn.execute(text(sql.replace("{now}", self.NOW)), params)
+            return result.fetchall() if result.returns_rows else None
+
+    async def _prune(self):
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            await self._execute("DELETE FROM bot_event_claims WHERE expires_at < {now}")
+            await self._execute("DELETE FROM bot_cache WHERE expires_at < {now}")
+
+    async def claim_event(self, event_id: str, ttl: float) -> bool:
+        rows = await self._execute(
+            """INSERT INTO bot_event_claims (event_id, expires_at) VALUES (:event_id, {now} + :ttl)
+               ON CONFLICT (event_id) DO UPDATE SET expires_at = EXCLUDED.expires_at
+               WHERE bot_event_claims.expires_at < {now}
+               RETURNING event_id""",
+            event_id=event_id, ttl=ttl,
+        )
+        await self._prune()
+        return bool(rows)
+
+    async def cache_get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        rows = await self._execute(
+            "SELECT value, expires_at - {now} FROM bot_cache WHERE namespace = :ns AND key = :key AND expires_at > {now}",
+            ns=namespace, key=key,
+        )
+        return (rows[0][0], rows[0][1]) if rows else None
+
+    async def cache_set(self, namespace: str, key: str, value: Any, ttl: float):
+        await self._execute(
+            """INSERT INTO bot_cache (namespace, key, value, expires_at, version)
+               VALUES (:ns, :key, CAST(:value AS jsonb), {now} + :ttl, nextval('bot_cache_version'))
+               ON CONFLICT (namespace, key) DO UPDATE
+               SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at, version = EXCLUDED.version""",
+            ns=namespace, key=key, value=json.dumps(value), ttl=ttl,
+        )
+        await self._prune()
+
+    async def cache_changes(self, namespace: str, since: int, limit: int = 500):
+        rows = await self._execute(
+            """SELECT key, value, expires_at - {now}, version FROM bot_cache
+               WHERE namespace = :ns AND version > :since AND expires_at > {now}
+               ORDER BY version LIMIT :limit""",
+            ns=namespace, since=since, limit=limit,
+        )
+        return [(key, value, left) for key, value, left, _ in rows], (rows[-1][3] if rows else since)
+
+    async def take_budget(self, bucket: str, amount: float, per_minute: float, burst_seconds: float,
+                          reserve_share: float = 0.0) -> float:
+        rate = per_minute / 60
+        capacity = max(1.0, rate * burst_seconds)
+        rows = await self._execute(
+            """INSERT INTO bot_rate_buckets AS b (name, tokens, updated_at) VALUES (:name, :capacity - :amount, {now})
+               ON CONFLICT (name) DO UPDATE
+               SET tokens = LEAST(:capacity, b.tokens + ({now} - b.updated_at) * :rate) - :amount, updated_at = {now}
+               RETURNING tokens, GREATEST(blocked_until - updated_at, 0)""",
+            name=bucket, amount=amount, capacity=capacity, rate=rate,
+        )
+        tokens, paused = rows[0]
+        reserve = reserve_share * capacity
+        return max(paused, (reserve - tokens) / rate if tokens < reserve else 0.0)
+
+    async def pause(self, bucket: str, seconds: float):
+        await self._execute(
+            "UPDATE bot_rate_buckets SET blocked_until = GREATEST(blocked_until, {now} + :seconds) WHERE name = :name",
+            name=bucket, seconds=seconds,
+        )
+
+class SqliteSharedState(SharedState):
+    """SharedState in a local SQLite file, for several workers on one host without Postgres"""
+
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS bot_event_claims (event_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)",
+        """CREATE TABLE IF NOT EXISTS bot_cache (
+            namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,
+            expires_at REAL NOT NULL, version INTEGER NOT NULL, PRIMARY KEY (namespace, key))""",
+        "CREATE INDEX IF NOT EXISTS bot_cache_changes ON bot_cache (namespace, version)",
+        """CREATE TABLE IF NOT EXISTS bot_rate_buckets (
+            name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, blocked_until REAL NOT NULL DEFAULT 0)""",
+    ]
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._conn = conn
+        return self._conn
+
+    def _run(self, sql: str, params: dict, write: bool) -> list:
+        with self._lock:
+            conn = self._connect()
+            params = {**params, "now": time.time()}
+            # Writers take the lock up front so concurrent read-modify-writes can't deadlock
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                rows = conn.execute(sql, params).fetchall()
+                if write:
+                    self._writes += 1
+                    if self._writes % PRUNE_EVERY == 0:
+                        conn.execute("DELETE FROM bot_event_claims WHERE expires_at < :now", params)
+                        conn.execute("DELETE FROM bot_cache WHERE expires_at < :now", params)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            return rows
+
+    async def _execute(self, sql: str, write: bool = False, **params) -> list:
+        return await asyncio.to_thread(self._run, sql, params, write)
+
+    async def claim_event(self, event_id: str, ttl: float) -> bool:
+        rows = await self._execute(
+            """INSERT INTO bot_event_claims (event_id, expires_at) VALUES (:event_id, :now + :ttl)
+               ON CONFLICT (event_id) DO UPDATE SET expires_at = excluded.expires_at
+               WHERE bot_event_claims.expires_at < :now
+               RETURNING event_id""",
+            write=True, event_id=event_id, ttl=ttl,
+        )
+        return bool(rows)
+
+    async def cache_get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        rows = await self._execute(
+            "SELECT value, expires_at - :now FROM bot_cache WHERE namespace = :ns AND key = :key AND expires_at > :now",
+            ns=namespace, key=key,
+        )
+        return (json.loads(rows[0][0]), rows[0][1]) if rows else None
+
+    async def cache_set(self, namespace: str, key: str, value: Any, ttl: float):
+        await self._execute(
+            """INSERT INTO bot_cache (namespace, key, value, expires_at, version)
+               VALUES (:ns, :key, :value, :now + :ttl, (SELECT COALESCE(MAX(version), 0) + 1 FROM bot_cache))
+               ON CONFLICT (namespace, key) DO UPDATE
+               SET value = excluded.value, expires_at = excluded.expires_at, version = excluded.version""",
+            write=True, ns=namespace, key=key, value=json.dumps(value), ttl=ttl,
+        )
+
+    async def cache_changes(self, namespace: str, since: int, limit: int = 500):
+        rows = await self._execute(
+            """SELECT key, value, expires_at - :now, version FROM bot_cache
+               WHERE namespace = :ns AND version > :since AND expires_at > :now
+               ORDER BY version LIMIT :limit""",
+            ns=namespace, since=since, limit=limit,
+        )
+        return [(key, json.loads(value), left) for key, value, left, _ in rows], (rows[-1][3] if rows else since)
+
+    async def take_budget(self, bucket: str, amount: float, per_minute: float, burst_seconds: float,
+                          reserve_share: float = 0.0) -> float:
+        rate = per_minute / 60
+        capacity = max(1.0, rate * burst_seconds)
+        rows = await self._execute(
+            """INSERT INTO bot_rate_buckets AS b (name, tokens, updated_at) VALUES (:name, :capacity - :amount, :now)
+               ON CONFLICT (name) DO UPDATE
+               SET tokens = MIN(:capacity, b.tokens + (:now - b.updated_at) * :rate) - :amount, updated_at = :now
+               RETURNING tokens, MAX(blocked_until - updated_at, 0)""",
+            write=True, name=bucket, amount=amount, capacity=capacity, rate=rate,
+        )
+        tokens, paused = rows[0]
+        reserve = reserve_share * capacity
+        return max(paused, (reserve - tokens) / rate if tokens < reserve else 0.0)
+
+    async def pause(self, bucket: str, seconds: float):
+        await self._execute(
+            "UPDATE bot_rate_buckets SET blocked_until = MAX(blocked_until, :now + :seconds) WHERE name = :name",
+            write=True, name=bucket, seconds=seconds,
+        )
+
+    async def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+class BudgetLeases:
+    """Books shared budget in chunks and serves calls from the local remainder.
+
+    A worker takes lease_seconds of a bucket's refill rate at a time, so only
+    about one call per lease pays the round trip to the shared store. A lease
+    is only good for lease_seconds: budget a worker stops using goes unused
+    rather than being held back from the others for long, and a pause another
+    worker sets is seen at the next booking.
+    """
+
+    def __init__(self, shared: SharedState, lease_seconds: float = 1.0):
+        self.shared = shared
+        self.lease_seconds = lease_seconds
+        # (bucket, reserve_share) -> [tokens left, usable from, expires at]
+        self._leases: Dict[Tuple[str, float], list] = {}
+        self._locks: Dict[Tuple[str, float], asyncio.Lock] = {}
+        self.bookings = 0
+        self.local = 0
+
+    async def take(self, bucket: str, amount: float, per_minute: float, burst_seconds: float,
+                   reserve_share: float = 0.0) -> float:
+        """take_budget with the same meaning, mostly answered without a round trip"""
+        if self.lease_seconds <= 0:
+            self.bookings += 1
+            return await self.shared.take_budget(bucket, amount, per_minute, burst_seconds, reserve_share)
+        key = (bucket, reserve_share)
+        wait = self._draw(key, amount)
+        if wait is not None:
+            return wait
+        if amount <= 0:
+            # A refund with no live lease to add it to goes straight back to the bucket
+            self.bookings += 1
+            return await self.shared.take_budget(bucket, amount, per_minute, burst_seconds, reserve_share)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another caller may have renewed the lease while this one waited for the lock
+            wait = self._draw(key, amount)
+            if wait is not None:
+                return wait
+            now = time.monotonic()
+            lease = self._leases.get(key)
+            # The unexpired remainder is netted into the new booking instead of handed back separately
+            left = lease[0] if lease is not None and lease[2] > now else 0.0
+            # A quarter of the burst at most, so one worker's lease can't drain the bucket for the others
+            rate = per_minute / 60
+            chunk = max(amount, min(rate * self.lease_seconds, max(1.0, rate * burst_seconds) / 4))
+            self.bookings += 1
+            wait = await self.shared.take_budget(bucket, chunk - left, per_minute, burst_seconds, reserve_share)
+            now = time.monotonic()
+            # Calls drawing on the lease wait out the same debt the booking reported
+            self._leases[key] = [chunk - amount, now + wait, now + wait + self.lease_seconds]
+            return wait
+
+    def _draw(self, key: Tuple[str, float], amount: float) -> Optional[float]:
+        lease = self._leases.get(key)
+        now = time.monotonic()
+        if lease is None or lease[2] <= now or lease[0] < amount:
+            return None
+        lease[0] -= amount
+        self.local += 1
+        return max(0.0, lease[1] - now)
+
+    def drop(self, bucket: str):
+        """Forget leases on bucket, e.g. after a 429 shows the shared view is stale"""
+        for key in [key for key in self._leases if key[0] == bucket]:
+            del self._leases[key]
+
+    def stats(self) -> dict:
+        return {"bookings": self.bookings, "local": self.local}
+
+def _postgres_backend() -> SharedState:
+    from server.database import get_async_engine
+    return PostgresSharedState(get_async_engine())
+
+def _sqlite_backend() -> SharedState:
+    return SqliteSharedState(os.getenv("SHARED_STATE_PATH", "data/shared_state.sqlite3"))
+
+# SHARED_STATE_BACKEND picks one; "local" keeps all state inside each process
+SHARED_STATE_BACKENDS = {
+    "postgres": _postgres_backend,
+    "sqlite": _sqlite_backend,
+}
+
+_shared_state: Optional[SharedState] = None
+
+def get_shared_state() -> Optional[SharedState]:
+    """Get the process-wide shared state, or None when the backend is local"""
+    global _shared_state
+    backend = os.getenv("SHARED_STATE_BACKEND", "local").lower()
+    if backend == "local":
+        return None
+    if _shared_state is None:
+        if backend not in SHARED_STATE_BACKENDS:
+            raise ValueError(f"Unknown SHARED_STATE_BACKEND {backend!r}; expected local or one of {sorted(SHARED_STATE_BACKENDS)}")
+        _shared_state = SHARED_STATE_BACKENDS[backend]()
+        logger.info(f"Sharing dedup, cache and rate-limit state through {backend}")
+    return _shared_state
+
+async def close_shared_state():
+    global _shared_state
+    if _shared_state is not None:
+        await _shared_state.close()
+    _shared_state = None
@@ -12,11 +12,24 @@ import os
 import logging
 from slack_bolt.async_app import AsyncApp
 from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
-from core.agents import workflow
+from core.agents import agent
+from core.tools import tool_cache
+from core.deadline import new_deadline, record_miss
 from dotenv import load_dotenv
 import asyncio
-from server.services import CalendarService
+from server.services import aget_service, close_services
+from server.database import init_vector_store, close_vector_store, get_embeddings, get_knowledge_version, embedding_cache_stats
+from server.metrics import metrics, start_metrics_server, stop_metrics_server
+from server.answer_cache import SemanticAnswerCache
+from server.slack_streaming import SlackMessageStreamer
+from server.ingress import EventDeduplicator, IngressQueue
+from server.http_client import get_http_client, close_http_client
+from server.shared_state import get_shared_state, close_shared_state
+from server.checkpointer import ResumableWorkflow, get_checkpointer
 import re
+import time
+import uuid
+from typing import Optional
 from datetime import datetime, timedelta
 import pytz
 
@@ -28,8 +41,35 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = AsyncApp(token=os.getenv("SLACK_BOT_TOKEN"))
-compiled_workflow = workflow.compile()
-calendar_service = CalendarService()
+checkpointer = get_checkpointer()
+compiled_workflow = agent.compile(checkpointer=checkpointer)
+if checkpointer is not None:
+    # Failed and interrupted runs resume from their last completed node
+    compiled_workflow = ResumableWorkflow.from_env(compiled_workflow)
+answer_cache = SemanticAnswerCache.from_env(compiled_workflow, get_embeddings(), version_fn=get_knowledge_version)
+stream_responses = os.getenv("STREAM_RESPONSES", "false").lower() == "true"
+event_dedup = EventDeduplicator(ttl=float(os.getenv("EVENT_DEDUP_TTL", "600")), shared=get_shared_state())
+ingress = IngressQueue.from_env()
+bot_user_id = None
+
+metrics.register_collector("ingress", ingress.metrics)
+metrics.register_collector("answer_cache", answer_cache.stats)
+metrics.register_collector("embedding_cache", embedding_cache_stats)
+metrics.register_collector("tool_cache", tool_cache.stats)
+if get_embeddings().batcher is not None:
+    metrics.register_collector("embedding_batcher", get_embeddings().batcher.stats)
+if agent.router is not None:
+    metrics.register_collector("intent_router", agent.router.stats)
+if checkpointer is not None:
+    metrics.register_collector("checkpoints", compiled_workflow.stats)
+
+async def get_bot_user_id() -> str:
+    """Resolve the bot's own user id once and reuse it for every mention."""
+    global bot_user_id
+    if bot_user_id is None:
+        auth_test_result = await app.client.auth_test()
+        bot_user_id = auth_test_result['user_id']
+    return bot_user_id
 
 def parse_time(time_str: str) -> datetime:
     """Parse time string to datetime."""
@@ -53,11 +93,26 @@ def parse_time(time_str: str) -> datetime:
     return datetime.strptime(time_str, '%H:%M')
 
 @app.event("app_mention")
-async def handle_message(event, say):
+async def handle_message(body, event, say):
+    """Ack fast: drop Slack retries, then hand the mention to the worker pool."""
+    if not await event_dedup.claim(body.get("event_id")):
+        logger.info(f"Skipping duplicate event {body.get('event_id')}")
+        return
+    # The clock starts at ack, so time spent queued counts against the answer's budget
+    deadline = new_deadline()
+    if not ingress.submit(event.get("user", ""), lambda: process_message(event, say, deadline)):
+        logger.warning(f"Ingress saturated: {ingress.metrics()}")
+        await say("⏳ I'm handling a lot of requests right now. Please try again in a moment.")
+
+async def process_message(event, say, deadline: Optional[float] = None):
+    if deadline is not None and time.time() >= deadline:
+        record_miss("queue")
+        await say("⏳ Sorry, I couldn't get to your message in time. Please try again.")
+        return
+    streamer = None
     try:
-        auth_test_result = await app.client.auth_test()
-        bot_user_id = auth_test_result['user_id']
-        text = event.get("text", "").replace(f"<@{bot_user_id}>", "").strip()
+        bot_id = await get_bot_user_id()
+        text = event.get("text", "").replace(f"<@{bot_id}>", "").strip()
         
         # Check for calendar-related commands
         if "schedule" in text.lower() and "meeting" in text.lower():
@@ -78,7 +133,7 @@ async def handle_message(event, say):
                     # Add timezone info
                     start_time = pytz.UTC.localize(start_time)
                     
-                    result = await calendar_service.create_event(
+                    result = await (await aget_service("calendar")).create_event(
                         title="Team Meeting",
                         start_time=start_time.isoformat(),
                         duration=duration
@@ -100,20 +155,72 @@ async def handle_message(event, say):
             "needs_escalation": False,
             "tool_outputs": [],
             "escalation_reason": None,
-            "tool_calls": None
+            "tool_calls": None,
+            "intent": None,
+            "trace_id": uuid.uuid4().hex,
+            "deadline": deadline,
+            "generated": False
         }
+        logger.info(f"Trace {initial_state['trace_id']} for message {event.get('ts')}")
+        start = time.perf_counter()
         
-        # Execute workflow
-        state = await compiled_workflow.ainvoke(initial_state)
+        # Checkpoints carry the channel so another worker can deliver the answer if this one dies
+        config = {"metadata": {"channel": event.get("channel", ""), "event_ts": event.get("ts", "")}}
+
+        # Execute workflow, reusing stored answers for near-identical knowledge queries
+        if stream_responses:
+            placeholder = await say("🤔 Thinking...")
+            streamer = SlackMessageStreamer.from_env(app.client, placeholder["channel"], placeholder["ts"])
+            state = await answer_cache.ainvoke(initial_state, on_token=streamer.add, config=config,
+                                               on_reset=streamer.reset)
+            await streamer.finish(state.get("response") or "No response generated.")
+            metrics.observe("request_seconds", time.perf_counter() - start, streamed="true")
+            return
+
+        state = await answer_cache.ainvoke(initial_state, config=config)
         await say(state.get("response", "No response generated."))
+        metrics.observe("request_seconds", time.perf_counter() - start, streamed="false")
     except Exception as e:
         logger.error(f"Error handling message: {str(e)}", exc_info=True)
-        await say("An error occurred while processing your request.")
+        if streamer is not None:
+            # Replace the "Thinking..." draft rather than leaving it behind a second message
+            await streamer.finish("An error occurred while processing your request.")
+        else:
+            await say("An error occurred while processing your request.")
+
+async def post_recovered(state, metadata):
+    """Deliver the answer of a run resumed after its worker died"""
+    if metadata.get("channel"):
+        await app.client.chat_postMessage(channel=metadata["channel"], text=state.get("response") or "No response generated.")
 
 async def main():
+    await init_vector_store()
+    await get_http_client().start()
+    await get_bot_user_id()
+    ingress.start()
+    metrics_port = int(os.getenv("METRICS_PORT", "9108"))
+    if metrics_port:
+        # Supervised workers each serve metrics on their own port: METRICS_PORT + worker index
+        metrics_port += int(os.getenv("WORKER_INDEX", "0"))
+    metrics_runner = await start_metrics_server(metrics_port, os.getenv("METRICS_HOST", "127.0.0.1")) if metrics_port else None
+    recovery = None
+    if checkpointer is not None:
+        recovery = asyncio.create_task(compiled_workflow.recover_loop(
+            post_recovered, interval=float(os.getenv("CHECKPOINT_RECOVERY_INTERVAL", "30"))))
     handler = AsyncSocketModeHandler(app, os.getenv("SLACK_APP_TOKEN"))
     logger.info("Starting Slack handler...")
-    await handler.start_async()
+    try:
+        await handler.start_async()
+    finally:
+        if recovery is not None:
+            recovery.cancel()
+        await handler.close_async()
+        await ingress.stop()
+        await close_services()
+        await close_shared_state()
+        await close_http_client()
+        await close_vector_store()
+        await stop_metrics_server(metrics_runner)
 
 if __name__ == "__main__":
     asyncio.run(main())
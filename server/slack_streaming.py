@@ -0,0 +1,63 @@
+# server/slack_streaming.py
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+class SlackMessageStreamer:
+    """Edits one placeholder message in throttled batches as answer tokens arrive"""
+
+    def __init__(self, client, channel: str, ts: str, min_interval: float = 1.0,
+                 min_tokens: int = 15, max_updates: int = 20):
+        self.client = client
+        self.channel = channel
+        self.ts = ts
+        self.min_interval = min_interval
+        self.min_tokens = min_tokens
+        self.max_updates = max_updates
+        self.text = ""
+        self.pending = 0
+        self.updates = 0
+        self._last_update = 0.0
+
+    @classmethod
+    def from_env(cls, client, channel: str, ts: str):
+        return cls(
+            client,
+            channel,
+            ts,
+            min_interval=float(os.getenv("SLACK_STREAM_INTERVAL", "1.0")),
+            min_tokens=int(os.getenv("SLACK_STREAM_MIN_TOKENS", "15")),
+            max_updates=int(os.getenv("SLACK_STREAM_MAX_UPDATES", "20")),
+        )
+
+    async def add(self, token: str):
+        self.text += token
+        self.pending += 1
+        # The first batch goes out immediately; later ones wait for both the token and time budget
+        if self.updates >= self.max_updates:
+            return
+        if self.updates and self.pending < self.min_tokens:
+            return
+        if time.monotonic() - self._last_update < self.min_interval:
+            return
+        await self._update(self.text + " ▌")
+
+    async def reset(self):
+        """Drop the draft of a failed attempt; the retry streams its answer from the start"""
+        self.text = ""
+        self.pending = 0
+
+    async def finish(self, text: str):
+        """Replace the streamed draft with the final workflow response"""
+        await self._update(text)
+
+    async def _update(self, text: str):
+        try:
+            await self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+        except Exception as e:
+            logger.error(f"Slack stream update failed: {str(e)}")
+        self.updates += 1
+        self.pending = 0
+        self._last_update = time.monotonic()
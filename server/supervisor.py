@@ -0,0 +1,149 @@
+# server/supervisor.py
+"""Runs several Slack socket-mode worker processes and restarts any that exit.
+
+Slack spreads events across all open socket-mode connections of an app (up to
+ten), so each worker is a full slack_handler process with its own event loop.
+Set SHARED_STATE_BACKEND=postgres so the workers share event dedup, caches and
+provider budgets.
+
+Run: BOT_WORKERS=4 python -m server.supervisor
+"""
+import sys
+import os
+
+# Add project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Dict
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+def run_worker(index: int, target: str = "server.slack_handler:main"):
+    """Process entry point: import "module:coroutine" fresh and run it until SIGTERM or SIGINT"""
+    os.environ["WORKER_INDEX"] = str(index)
+    module, _, name = target.partition(":")
+    main = getattr(importlib.import_module(module), name or "main")
+
+    async def serve():
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        signals = (signal.SIGTERM, signal.SIGINT)
+
+        def shutdown():
+            # Cancel once: main()'s finally block drains the ingress queue, and a
+            # second signal (Ctrl+C reaches the supervisor's SIGTERM too) must not cut it short
+            for sig in signals:
+                loop.remove_signal_handler(sig)
+            task.cancel()
+
+        for sig in signals:
+            loop.add_signal_handler(sig, shutdown)
+        await main()
+
+    try:
+        asyncio.run(serve())
+    except asyncio.CancelledError:
+        pass
+
+class Supervisor:
+    """Keeps `workers` processes of run_worker alive, restarting exits with exponential backoff"""
+
+    def __init__(self, target: str = "server.slack_handler:main", workers: int = 2, restart_backoff: float = 1.0,
+                 max_backoff: float = 30.0, stop_timeout: float = 15.0):
+        self.target = target
+        self.workers = workers
+        self.restart_backoff = restart_backoff
+        self.max_backoff = max_backoff
+        self.stop_timeout = stop_timeout
+        # spawn gives each worker a clean interpreter instead of a fork of this one's state
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._started_at: Dict[int, float] = {}
+        self._failures: Dict[int, int] = {}
+        self._restart_at: Dict[int, float] = {}
+        self._stopping = False
+        self.restarts = 0
+
+    @classmethod
+    def from_env(cls, target: str = "server.slack_handler:main"):
+        return cls(
+            target,
+            workers=int(os.getenv("BOT_WORKERS", "2")),
+            restart_backoff=float(os.getenv("BOT_WORKER_RESTART_BACKOFF", "1")),
+            stop_timeout=float(os.getenv("BOT_WORKER_STOP_TIMEOUT", "15")),
+        )
+
+    def _start(self, index: int):
+        process = self._context.Process(target=run_worker, args=(index, self.target), name=f"bot-worker-{index}")
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        logger.info(f"Started worker {index} (pid {process.pid})")
+
+    def start(self):
+        for index in range(self.workers):
+            self._start(index)
+
+    def check(self):
+        """Schedule restarts for workers that exited and start those whose backoff has passed"""
+        now = time.monotonic()
+        for index, process in list(self._processes.items()):
+            if process.is_alive():
+                # A worker that has stayed up for a minute has recovered
+                if now - self._started_at[index] > 60:
+                    self._failures[index] = 0
+                continue
+            if index not in self._restart_at:
+                failures = self._failures.get(index, 0) + 1
+                self._failures[index] = failures
+                delay = min(self.max_backoff, self.restart_backoff * 2 ** (failures - 1))
+                logger.warning(f"Worker {index} exited with code {process.exitcode}, restarting in {delay:.1f}s")
+                self._restart_at[index] = now + delay
+            elif now >= self._restart_at[index]:
+                del self._restart_at[index]
+                self.restarts += 1
+                self._start(index)
+
+    def stop(self):
+        """SIGTERM every worker, wait up to stop_timeout for them to drain, then kill the rest"""
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.stop_timeout
+        for index, process in self._processes.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"Worker {index} did not stop in {self.stop_timeout:.0f}s, killing it")
+                process.kill()
+                process.join()
+        self._processes.clear()
+
+    def run(self):
+        """Start the workers and supervise them until SIGTERM or SIGINT"""
+        def request_stop(signum, frame):
+            self._stopping = True
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+        self.start()
+        logger.info(f"Supervising {self.workers} workers running {self.target}")
+        try:
+            while not self._stopping:
+                self.check()
+                time.sleep(0.5)
+        finally:
+            self.stop()
+            logger.info(f"Supervisor stopped after {self.restarts} restarts")
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    Supervisor.from_env().run()
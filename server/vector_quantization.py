@@ -0,0 +1,103 @@
+# server/vector_quantization.py
+from langchain_core.documents import Document
+from sqlalchemy import text
+from typing import List
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# none: index full vectors; halfvec: index a truncated half-precision prefix;
+# binary: index the sign bits of a truncated prefix. Full vectors stay in the
+# table and are only read to re-rank the shortlisted candidates.
+COMPACT_MODES = ("none", "halfvec", "binary")
+# halfvec, binary_quantize and subvector arrived in pgvector 0.7.0
+COMPACT_MIN_VERSION = (0, 7, 0)
+EXTENSION_VERSION_SQL = text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+
+def check_compact_support(mode: str, extversion: str):
+    """Refuse a compact mode the installed pgvector can't evaluate"""
+    if mode == "none":
+        return
+    version = tuple(int(part) for part in re.findall(r"\d+", extversion or "")[:3])
+    if version < COMPACT_MIN_VERSION:
+        raise RuntimeError(
+            f"VECTOR_COMPACT={mode} needs pgvector 0.7.0 or newer, found {extversion or 'no extension'}; "
+            f"upgrade the image (pgvector/pgvector:pg16) or set VECTOR_COMPACT=none"
+        )
+
+def compact_expression(mode: str, dimensions: int, column: str = "embedding") -> str:
+    """SQL expression for the compact representation; the index and the query must match it.
+
+    The embedding column is shared by every collection and may be untyped, so
+    even full vectors are cast to the collection's dimension rather than the
+    column being retyped.
+    """
+    if mode == "halfvec":
+        return f"(subvector({column}, 1, {int(dimensions)})::halfvec({int(dimensions)}))"
+    if mode == "binary":
+        return f"(binary_quantize(subvector({column}, 1, {int(dimensions)}))::bit({int(dimensions)}))"
+    return f"({column}::vector({int(dimensions)}))"
+
+def compact_opclass(mode: str) -> str:
+    return {"halfvec": "halfvec_cosine_ops", "binary": "bit_hamming_ops"}.get(mode, "vector_cosine_ops")
+
+def compact_operator(mode: str) -> str:
+    return "<~>" if mode == "binary" else "<=>"
+
+class CompactVectorStore:
+    """Search through the collection's partial ANN index.
+
+    Compact modes shortlist on the compact index, then re-rank with full
+    vectors; "none" orders by the indexed full-vector expression directly.
+    """
+
+    def __init__(self, engine, embeddings, collection_name: str, mode: str, dimensions: int,
+                 candidates: int = 40):
+        if mode not in COMPACT_MODES:
+            raise ValueError(f"Unsupported compact mode: {mode}")
+        self.engine = engine
+        self.embeddings = embeddings
+        self.collection_name = collection_name
+        self.mode = mode
+        self.dimensions = dimensions
+        self.candidates = candidates
+        self._collection_id = None
+        query_compact = compact_expression(mode, dimensions, "CAST(:query AS vector)")
+        if mode == "none":
+            self._sql = text(
+                "SELECT id, document, cmetadata FROM langchain_pg_embedding "
+                "WHERE collection_id = CAST(:collection_id AS uuid) "
+                f"ORDER BY {compact_expression(mode, dimensions)} <=> {query_compact} LIMIT :k"
+            )
+            return
+        self._sql = text(
+            "SELECT id, document, cmetadata FROM ("
+            "SELECT id, document, cmetadata, embedding FROM langchain_pg_embedding "
+            "WHERE collection_id = CAST(:collection_id AS uuid) "
+            f"ORDER BY {compact_expression(mode, dimensions)} {compact_operator(mode)} {query_compact} "
+            "LIMIT :candidates"
+            ") shortlist ORDER BY embedding <=> CAST(:query AS vector) LIMIT :k"
+        )
+
+    async def _get_collection_id(self, conn) -> str:
+        if self._collection_id is None:
+            check_compact_support(self.mode, (await conn.execute(EXTENSION_VERSION_SQL)).scalar())
+            result = await conn.execute(
+                text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"),
+                {"name": self.collection_name}
+            )
+            self._collection_id = str(result.scalar_one())
+        return self._collection_id
+
+    async def asimilarity_search(self, query: str, k: int = 3) -> List[Document]:
+        vector = await self.embeddings.aembed_query(query)
+        async with self.engine.connect() as conn:
+            result = await conn.execute(self._sql, {
+                "collection_id": await self._get_collection_id(conn),
+                "query": "[" + ",".join(map(str, vector)) + "]",
+                "candidates": max(self.candidates, k),
+                "k": k,
+            })
+            rows = result.all()
+        return [Document(id=row.id, page_content=row.document, metadata=row.cmetadata or {}) for row in rows]